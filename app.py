@@ -1,5 +1,6 @@
-from flask import Flask, redirect, url_for, request, jsonify, session, render_template_string
-import os
+from flask import Flask, Response, redirect, url_for, request, jsonify, session, render_template, stream_with_context
+import json
+import hashlib
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -8,20 +9,76 @@ load_dotenv()
 # Import our custom modules
 from trello.api import (
     get_request_token, get_authorization_url, get_access_token,
-    get_trello_client, get_boards, get_board_details
+    get_trello_client, get_boards, track_upstream_calls, stop_tracking_upstream_calls,
+    member_cache, trello_sessions
 )
-from trello.templates import INDEX_TEMPLATE, DASHBOARD_TEMPLATE, BOARD_TEMPLATE
-from trello.agent import generate_board_report # Updated import for agent
+from trello.templates import install_templates, stream_page, TEMPLATE_VERSION
+from trello.pages import list_views, card_page, card_view, find_card, BOARD_PAGE_SIZE, CARD_DESC_PREVIEW
+from trello.agent import (
+    generate_board_report, start_board_report, start_board_report_stream, get_cached_board_report, report_cache,
+    report_backend_problem, report_backend_stats, warm_report_backends
+) # Updated import for agent
+from trello.jobs import report_jobs
+from trello.bulk import summarize_boards, resolve_board_ids, to_ndjson, BULK_MAX_BOARDS
+from trello.tokens import token_store
+from trello.ratelimit import limiter_stats
+from trello.metrics import compute_board_metrics
+from trello.snapshots import sync_board, sync_snapshot, snapshot_fingerprint, snapshot_store, index_stored_boards
+from trello.search import search_index, parse_due, FACETS
+from trello.webhooks import WEBHOOK_CALLBACK_URL, verify_signature, handle_webhook, ensure_board_webhook
+from trello.session_store import make_session_interface
+from trello.tracing import METRICS_TOKEN, install_tracing, render_metrics, metrics_authorized, span
+from trello.precompute import record_view, forget_viewer, use_session_store, precompute_stats
 
 app = Flask(__name__)
 app.secret_key = "fixed_secret_key_for_testing_123456789"  # Fixed key for testing
 
+# Page templates are compiled once here, and their CSS is served as a cached static file
+install_templates(app)
+# Per-stage latency of every request, exported at /metrics
+install_tracing(app)
+# A local report model starts loading now instead of on the first report
+warm_report_backends()
+
+# Pages are per user and must be revalidated, which is cheap thanks to their ETags
+PAGE_CACHE_CONTROL = "private, no-cache"
+SUMMARY_CACHE_CONTROL = "private, no-cache"
+
+def _etag(*parts):
+    """Strong ETag from the values a response is built from"""
+    return hashlib.sha256("\n".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+
+def _not_modified(etag, cache_control):
+    """A 304 response if the client already has this ETag, otherwise None"""
+    if etag not in request.if_none_match:
+        return None
+    response = Response(status=304)
+    return _with_validators(response, etag, cache_control)
+
+def _with_validators(response, etag, cache_control):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    response.vary.add("Cookie")
+    return response
+
+# Keep session data server side so the cookie only carries a session id
+session_interface = make_session_interface()
+if session_interface is not None:
+    app.session_interface = session_interface
+    # Background refreshes use a viewer's token only while their session lasts
+    use_session_store(session_interface.store)
+
+@app.teardown_request
+def stop_counting_upstream_calls(error=None):
+    """Request threads are reused, so a page's Trello call counter ends with its request"""
+    stop_tracking_upstream_calls()
+
 @app.route("/")
 def index():
     """Home page with login link"""
     if "access_token" in session:
         return redirect(url_for("dashboard"))
-    return render_template_string(INDEX_TEMPLATE)
+    return render_template("index.html")
 
 @app.route("/login")
 def login():
@@ -53,7 +110,9 @@ def callback():
         # Exchange request token for access token
         access_token, access_token_secret = get_access_token(oauth_token, oauth_verifier)
         
-        # Store access tokens in session
+        # Store access tokens in session, under a new server-side session id
+        if hasattr(session, "regenerate"):
+            session.regenerate()
         session["access_token"] = access_token
         session["access_token_secret"] = access_token_secret
         print(f"Stored access token in session: {access_token}")
@@ -71,14 +130,29 @@ def dashboard():
     
     try:
         # Get Trello client and fetch boards
+        calls = track_upstream_calls()
         trello = get_trello_client(session["access_token"], session["access_token_secret"])
         boards = get_boards(trello)
         print("Fetched boards:", [board["name"] for board in boards])
-        
-        return render_template_string(DASHBOARD_TEMPLATE, boards=boards)
+        print(f"Dashboard loaded with {calls.count} Trello API calls")
+        return _dashboard_response(boards)
     except Exception as e:
-        print(f"Dashboard error: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        return _dashboard_error(e)
+
+def _dashboard_error(e):
+    if getattr(getattr(e, "response", None), "status_code", None) == 429:
+        return _trello_error_response(e, "list")
+    print(f"Dashboard error: {str(e)}")
+    return jsonify({"error": str(e)}), 500
+
+def _dashboard_response(boards):
+    etag = _etag(TEMPLATE_VERSION, json.dumps(boards, sort_keys=True))
+    not_modified = _not_modified(etag, PAGE_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    with span("render dashboard.html"):
+        page = render_template("dashboard.html", boards=boards)
+    return _with_validators(app.make_response(page), etag, PAGE_CACHE_CONTROL)
 
 @app.route("/board/<board_id>")
 def view_board(board_id):
@@ -88,20 +162,50 @@ def view_board(board_id):
     
     try:
         # Get Trello client and fetch board details
+        calls = track_upstream_calls()
         trello = get_trello_client(session["access_token"], session["access_token_secret"])
-        board, lists = get_board_details(trello, board_id)
-        
-        # Generate board report using the agent
-        board_report = generate_board_report((board, lists))
-        
-        return render_template_string(BOARD_TEMPLATE, board=board, lists=lists, board_summary=board_report)
+        snapshot = sync_snapshot(trello, board_id)
+        ensure_board_webhook(trello, board_id)
+        # Often viewed boards are kept warm in the background
+        record_view(board_id, session["access_token"], session["access_token_secret"], getattr(session, "sid", None))
+        print(f"Board {board_id} loaded with {calls.count} Trello API calls")
+        return _board_page_response(board_id, snapshot)
     except Exception as e:
-        print(f"Board view error: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        return _board_view_error(e, board_id)
+
+def _board_page_response(board_id, snapshot):
+    board, lists = snapshot["board"], snapshot["lists"]
+    # Serve a cached report inline, otherwise the page streams it in from the summary stream
+    content = snapshot_fingerprint(snapshot)
+    board_report = get_cached_board_report((board, lists), content)
+    report_stream_url = None if board_report else url_for("api_board_summary_stream", board_id=board_id)
+
+    etag = _etag(TEMPLATE_VERSION, content, BOARD_PAGE_SIZE, CARD_DESC_PREVIEW, board_report)
+    not_modified = _not_modified(etag, PAGE_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+
+    # Lists go out with their first page of cards, the page fetches the rest as it scrolls
+    return _with_validators(stream_page(
+        "board.html",
+        board=board,
+        lists=list_views(lists),
+        board_summary=board_report,
+        report_stream_url=report_stream_url,
+        cards_url=url_for("api_board_cards", board_id=board_id)
+    ), etag, PAGE_CACHE_CONTROL)
+
+def _board_view_error(e, board_id):
+    if getattr(getattr(e, "response", None), "status_code", None) == 429:
+        return _trello_error_response(e, board_id)
+    print(f"Board view error: {str(e)}")
+    return jsonify({"error": str(e)}), 500
 
 @app.route("/logout")
 def logout():
     """Log out user by clearing session"""
+    if "access_token" in session:
+        forget_viewer(session["access_token"])
     session.clear()
     print("Session cleared")
     return redirect(url_for("index"))
@@ -112,41 +216,367 @@ def api_board_summary(board_id):
     if "access_token" not in session:
         return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
 
-    if not os.environ.get("GEMINI_API_KEY"):
-        # This check is important because the agent function relies on this environment variable.
-        print("Error: GEMINI_API_KEY environment variable is not set on the server.")
-        return jsonify({"error": "Gemini API key not configured on the server."}), 500
+    backend_error = _report_backend_error()
+    if backend_error is not None:
+        return backend_error
 
     try:
+        calls = track_upstream_calls()
         trello = get_trello_client(session["access_token"], session["access_token_secret"])
-        # get_board_details returns a tuple: (board_object, lists_with_cards)
-        board_data_tuple = get_board_details(trello, board_id)
-        
-        report = generate_board_report(board_data_tuple)
+        # sync_board returns a tuple: (board_object, lists_with_cards)
+        board_data_tuple = sync_board(trello, board_id)
+        print(f"Board {board_id} summary fetched with {calls.count} Trello API calls")
         
-        if report.startswith("Error:"):
-            # The agent encountered an issue (e.g., API key problem, network error with OpenRouter)
-            return jsonify({"error": "Failed to generate report from agent", "details": report}), 500
-            
-        return jsonify({"board_id": board_id, "report": report})
+        # ?refresh=1 regenerates the report instead of serving the cached copy
+        refresh = request.args.get("refresh") == "1"
+        not_modified = None if refresh else _summary_not_modified(board_id, board_data_tuple)
+        if not_modified is not None:
+            return not_modified
+        report = generate_board_report(board_data_tuple, refresh=refresh)
+        return _summary_response(board_id, report)
         
     except Exception as e:
-        # Handle potential errors from Trello API (e.g., board not found, Trello auth issue)
-        error_message = f"An unexpected error occurred: {str(e)}"
-        status_code = 500
-        if hasattr(e, 'response') and e.response is not None:
-            if e.response.status_code == 404:
-                error_message = "Trello board not found or access denied."
-                status_code = 404
-            elif e.response.status_code == 401:
-                error_message = "Trello authentication error. Your Trello token may be invalid. Please re-login via the web interface."
-                status_code = 401
-            else:
-                error_message = f"Trello API error: {e.response.status_code} - {e.response.text}"
-                status_code = e.response.status_code
-        
-        print(f"API board summary error for board {board_id}: {error_message}")
-        return jsonify({"error": error_message}), status_code
+        return _trello_error_response(e, board_id)
+
+def _report_backend_error():
+    """A 500 response if no report backend is configured, otherwise None"""
+    problem = report_backend_problem()
+    if problem is None:
+        return None
+    print(f"Error: {problem}")
+    return jsonify({"error": "Report backend not configured on the server.", "details": problem}), 500
+
+def _summary_not_modified(board_id, board_data_tuple, content=None):
+    """A 304 for a poller already holding the current report, without a Gemini call"""
+    cached_report = get_cached_board_report(board_data_tuple, content)
+    if cached_report is None:
+        return None
+    return _not_modified(_etag(board_id, cached_report), SUMMARY_CACHE_CONTROL)
+
+def _summary_response(board_id, report):
+    if report.startswith("Error:"):
+        # The agent encountered an issue (e.g., API key problem, network error with OpenRouter)
+        return jsonify({"error": "Failed to generate report from agent", "details": report}), 500
+
+    return _with_validators(jsonify({"board_id": board_id, "report": report}), _etag(board_id, report), SUMMARY_CACHE_CONTROL)
+
+@app.route("/api/boards/summary", methods=["GET", "POST"])
+def api_boards_summary():
+    """
+    API endpoint summarizing many boards at once, streamed as NDJSON with one line per board as it finishes.
+    Takes board ids as ?board_ids=a,b or a JSON body {"board_ids": [...]}, or all=1 / {"all": true} for every board.
+    """
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    body = request.get_json(silent=True)
+    if body is None:
+        body = {}
+    if not isinstance(body, dict):
+        return jsonify({"error": "The request body must be a JSON object."}), 400
+    if "board_ids" in body and not (isinstance(body["board_ids"], list) and all(isinstance(board_id, str) for board_id in body["board_ids"])):
+        return jsonify({"error": "board_ids must be a list of board id strings."}), 400
+    board_ids = body.get("board_ids") or [board_id for board_id in request.args.get("board_ids", "").split(",") if board_id]
+    all_boards = bool(body.get("all")) or request.args.get("all") == "1"
+    refresh = bool(body.get("refresh")) or request.args.get("refresh") == "1"
+    if not board_ids and not all_boards:
+        return jsonify({"error": "Give board_ids or all=1."}), 400
+
+    backend_error = _report_backend_error()
+    if backend_error is not None:
+        return backend_error
+
+    try:
+        trello = get_trello_client(session["access_token"], session["access_token_secret"])
+        board_ids = resolve_board_ids(trello, board_ids, all_boards)
+    except Exception as e:
+        return _trello_error_response(e, "all")
+    if len(board_ids) > BULK_MAX_BOARDS:
+        return jsonify({"error": f"At most {BULK_MAX_BOARDS} boards per request."}), 400
+
+    print(f"Bulk summary of {len(board_ids)} boards")
+    return Response(
+        stream_with_context(to_ndjson(summarize_boards(trello, board_ids, refresh=refresh))),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/api/board/<board_id>/metrics")
+def api_board_metrics(board_id):
+    """API endpoint with card counts, due dates, workload and label metrics for a board."""
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    try:
+        trello = get_trello_client(session["access_token"], session["access_token_secret"])
+        board, lists = sync_board(trello, board_id)
+        return jsonify(compute_board_metrics(board, lists))
+    except Exception as e:
+        return _trello_error_response(e, board_id)
+
+@app.route("/api/board/<board_id>/summary/stream")
+def api_board_summary_stream(board_id):
+    """API endpoint that streams a Trello board summary as server-sent events while Gemini writes it."""
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    backend_error = _report_backend_error()
+    if backend_error is not None:
+        return backend_error
+
+    try:
+        trello = get_trello_client(session["access_token"], session["access_token_secret"])
+        board_data_tuple = sync_board(trello, board_id)
+    except Exception as e:
+        return _trello_error_response(e, board_id)
+
+    # Generated by a report job that every stream of the same board content follows
+    report_job = start_board_report_stream(board_data_tuple)
+
+    def events():
+        sent = False
+        for text in report_job.follow():
+            sent = True
+            yield _sse_event("chunk", {"text": text})
+        if report_job.status == "error" or (report_job.result or "").startswith("Error:"):
+            error = report_job.error or report_job.result
+            print(f"Streaming summary error for board {board_id}: {error}")
+            yield _sse_event("failed", {"error": f"Could not generate the board report. {error}"})
+            return
+        if not sent and report_job.result:
+            # A cached report, or a job started by the polling endpoint, which doesn't publish its text
+            yield _sse_event("chunk", {"text": report_job.result})
+        yield _sse_event("done", {"board_id": board_id})
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+def _sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/api/board/<board_id>/summary/jobs", methods=["POST"])
+def api_board_summary_job(board_id):
+    """API endpoint that starts generating a board summary and returns its job id right away."""
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    backend_error = _report_backend_error()
+    if backend_error is not None:
+        return backend_error
+
+    try:
+        trello = get_trello_client(session["access_token"], session["access_token_secret"])
+        report_job = start_board_report(sync_board(trello, board_id))
+        return jsonify({
+            "board_id": board_id,
+            "job_id": report_job.id,
+            "status": report_job.status,
+            "status_url": url_for("api_job_status", job_id=report_job.id)
+        }), 202
+    except Exception as e:
+        return _trello_error_response(e, board_id)
+
+@app.route("/api/jobs/<job_id>")
+def api_job_status(job_id):
+    """API endpoint to poll a background report job."""
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    report_job = report_jobs.get(job_id)
+    if report_job is None:
+        return jsonify({"error": "Job not found or expired."}), 404
+
+    job_data = {"job_id": report_job.id, "status": report_job.status}
+    if report_job.status == "done":
+        if report_job.result.startswith("Error:"):
+            job_data["status"] = "error"
+            job_data["error"] = report_job.result
+        else:
+            job_data["report"] = report_job.result
+    elif report_job.status == "error":
+        job_data["error"] = report_job.error
+    return jsonify(job_data)
+
+def _trello_error_response(e, board_id):
+    """Turn an error from the Trello API into a JSON error response"""
+    # Handle potential errors from Trello API (e.g., board not found, Trello auth issue)
+    error_message = f"An unexpected error occurred: {str(e)}"
+    status_code = 500
+    if hasattr(e, 'response') and e.response is not None:
+        if e.response.status_code == 404:
+            error_message = "Trello board not found or access denied."
+            status_code = 404
+        elif e.response.status_code == 429:
+            # Still rate limited after retrying; tell the client when to come back
+            response = jsonify({"error": "Trello rate limit reached. Please try again shortly."})
+            response.headers["Retry-After"] = e.response.headers.get("Retry-After", "10")
+            print(f"API error for board {board_id}: rate limited by Trello")
+            return response, 429
+        elif e.response.status_code == 401:
+            error_message = "Trello authentication error. Your Trello token may be invalid. Please re-login via the web interface."
+            status_code = 401
+        else:
+            error_message = f"Trello API error: {e.response.status_code} - {e.response.text}"
+            status_code = e.response.status_code
+    
+    print(f"API error for board {board_id}: {error_message}")
+    return jsonify({"error": error_message}), status_code
+
+@app.route("/api/board/<board_id>/cards")
+def api_board_cards(board_id):
+    """API endpoint returning a page of one list's cards, used by the board page to load cards on demand."""
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    page_args, error = _card_page_args()
+    if error is not None:
+        return error
+
+    try:
+        trello = get_trello_client(session["access_token"], session["access_token_secret"])
+        _, lists = sync_board(trello, board_id)
+    except Exception as e:
+        return _trello_error_response(e, board_id)
+    return _card_page_response(board_id, lists, *page_args)
+
+def _card_page_args():
+    """((list_id, offset, limit), None) from the query string, or (None, error response)"""
+    list_id = request.args.get("list")
+    if not list_id:
+        return None, (jsonify({"error": "Missing list parameter."}), 400)
+    try:
+        offset = int(request.args.get("offset", "0"))
+        limit = int(request.args.get("limit", str(BOARD_PAGE_SIZE)))
+    except ValueError:
+        return None, (jsonify({"error": "offset and limit must be integers."}), 400)
+    return (list_id, offset, limit), None
+
+def _card_page_response(board_id, lists, list_id, offset, limit):
+    page = card_page(lists, list_id, offset, limit)
+    if page is None:
+        return jsonify({"error": f"List {list_id} is not on board {board_id}."}), 404
+    return jsonify(page)
+
+@app.route("/api/search")
+def api_search():
+    """
+    API endpoint searching the cards of the user's synced boards, answered from the search index without calling Trello.
+    Takes q (words in card names and descriptions), label, member, list and board (id or name),
+    due (overdue, soon, any or none), due_after and due_before (ISO dates), limit and offset.
+    """
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    search_args, error = _search_args()
+    if error is not None:
+        return error
+
+    try:
+        # The user's board list is cached, and limits results to boards they can read
+        trello = get_trello_client(session["access_token"], session["access_token_secret"])
+        board_ids = [board["id"] for board in get_boards(trello)]
+    except Exception as e:
+        return _trello_error_response(e, "all")
+
+    missing = index_stored_boards(board_ids)
+    try:
+        results = search_index.search(board_ids=board_ids, **search_args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Boards never synced aren't indexed; opening them adds them
+    results["unindexed_boards"] = missing
+    return jsonify(results)
+
+def _search_args():
+    """(search keyword arguments, None) from the query string, or (None, error response)"""
+    args = {
+        "query": request.args.get("q", ""),
+        "filters": {facet: request.args[facet] for facet in FACETS if request.args.get(facet)},
+        "due": request.args.get("due") or None
+    }
+    for name in ("due_after", "due_before"):
+        if request.args.get(name):
+            args[name] = parse_due(request.args[name])
+            if args[name] is None:
+                return None, (jsonify({"error": f"{name} must be an ISO date."}), 400)
+    try:
+        args["offset"] = max(int(request.args.get("offset", "0")), 0)
+        args["limit"] = int(request.args.get("limit", "50"))
+    except ValueError:
+        return None, (jsonify({"error": "offset and limit must be integers."}), 400)
+    return args, None
+
+@app.route("/api/board/<board_id>/cards/<card_id>")
+def api_board_card(board_id, card_id):
+    """API endpoint returning one card with its full description."""
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    try:
+        trello = get_trello_client(session["access_token"], session["access_token_secret"])
+        _, lists = sync_board(trello, board_id)
+    except Exception as e:
+        return _trello_error_response(e, board_id)
+
+    card = find_card(lists, card_id)
+    if card is None:
+        return jsonify({"error": f"Card {card_id} is not on board {board_id}."}), 404
+    return jsonify(card_view(card, desc_limit=None))
+
+@app.route("/webhooks/trello", methods=["HEAD", "POST"])
+def trello_webhook():
+    """Receive Trello webhook deliveries and apply them to cached board snapshots."""
+    # Trello checks the callback URL with a HEAD request before creating a webhook
+    if request.method == "HEAD":
+        return "", 200
+
+    body = request.get_data()
+    if not verify_signature(body, WEBHOOK_CALLBACK_URL or request.url, request.headers.get("X-Trello-Webhook")):
+        print("Rejected webhook delivery with an invalid signature")
+        return jsonify({"error": "Invalid webhook signature."}), 401
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return jsonify({"error": "Webhook body is not JSON."}), 400
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Webhook body must be a JSON object."}), 400
+
+    status = handle_webhook(payload)
+    print(f"Webhook {(payload.get('action') or {}).get('type')}: {status}")
+    return jsonify({"status": status})
+
+@app.route("/api/cache/stats")
+def api_cache_stats():
+    """API endpoint exposing hit/miss counters for the shared caches."""
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    return jsonify({
+        "members": member_cache.stats(),
+        "reports": report_cache.stats() if report_cache is not None else None,
+        "report_jobs": report_jobs.stats(),
+        "snapshots": snapshot_store.stats(),
+        "search": search_index.stats(),
+        "tokens": token_store.stats(),
+        "sessions": session_interface.store.stats() if session_interface is not None else None,
+        "trello_sessions": trello_sessions.stats(),
+        "rate_limits": limiter_stats(),
+        "report_backend": report_backend_stats(),
+        "precompute": precompute_stats()
+    })
+
+@app.route("/metrics")
+def metrics():
+    """Request, stage and upstream call latencies in Prometheus text format, for scrapers holding METRICS_TOKEN."""
+    if not METRICS_TOKEN:
+        return jsonify({"error": "Not found."}), 404
+    if not metrics_authorized(request.headers.get("Authorization")):
+        return jsonify({"error": "A valid metrics bearer token is required."}), 401
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5001)
\ No newline at end of file
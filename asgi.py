@@ -0,0 +1,283 @@
+"""
+ASGI entry point. The page and API routes that spend their time waiting on Trello and
+Gemini run as coroutines on the event loop, so one process serves many of them at once.
+Every other route (login, streams, jobs, webhooks) is the Flask app from app.py, run in
+a pool of ASGI_WSGI_THREADS threads. Work that would hold up the loop (prompt building,
+metrics, SQLite and rendering) runs in the loop's default thread pool.
+
+    uvicorn asgi:app --port 5001
+    gunicorn -k uvicorn.workers.UvicornWorker -w 4 asgi:app
+"""
+import asyncio
+import contextvars
+import io
+import os
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask import g, jsonify, redirect, request, session, url_for
+from werkzeug.exceptions import HTTPException
+
+from app import (
+    app as flask_app, _dashboard_response, _dashboard_error, _board_page_response, _board_view_error,
+    _summary_not_modified, _summary_response, _card_page_args, _card_page_response,
+    _trello_error_response, _report_backend_error
+)
+from trello import aio
+from trello.aio_agent import generate_board_report
+from trello.api import get_trello_client, track_upstream_calls
+from trello.metrics import compute_board_metrics
+from trello.pages import card_view, find_card
+from trello.precompute import record_view
+from trello.snapshots import SNAPSHOTS_SHARED, snapshot_fingerprint
+from trello.webhooks import WEBHOOK_CALLBACK_URL, ensure_board_webhook
+
+# Threads running the routes passed through to Flask. Summary streams hold one each until
+# their report is written, so this bounds the streams open at once per process.
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", "64"))
+
+def _thread_context():
+    """
+    The context a request's steps in threads run in. It is the same for all of them, since
+    stream_with_context resets the request context in the context it pushed it in.
+    """
+    if "thread_context" not in g:
+        g.thread_context = contextvars.copy_context()
+    return g.thread_context
+
+async def _in_thread(fn, *args):
+    """Run fn(*args) in the default thread pool, off the event loop"""
+    return await asyncio.to_thread(_thread_context().run, fn, *args)
+
+def _client():
+    return aio.AsyncTrelloClient(session["access_token"], session["access_token_secret"])
+
+async def dashboard():
+    """Show user's Trello boards"""
+    if "access_token" not in session:
+        return redirect(url_for("index"))
+
+    try:
+        calls = track_upstream_calls()
+        boards = await aio.get_boards(_client())
+        print(f"Dashboard loaded with {calls.count} Trello API calls")
+        return _dashboard_response(boards)
+    except Exception as e:
+        return _dashboard_error(e)
+
+async def view_board(board_id):
+    """Show details of a specific Trello board"""
+    if "access_token" not in session:
+        return redirect(url_for("index"))
+
+    try:
+        calls = track_upstream_calls()
+        snapshot = await aio.sync_snapshot(_client(), board_id)
+        if WEBHOOK_CALLBACK_URL and SNAPSHOTS_SHARED and not snapshot.get("webhook_id"):
+            # Registered once per board, so the sync client in a thread is fine here
+            await asyncio.to_thread(ensure_board_webhook, get_trello_client(session["access_token"], session["access_token_secret"]), board_id)
+        # View counts may be in SQLite, and the page looks up its report by building the prompt for new content
+        await _in_thread(record_view, board_id, session["access_token"], session["access_token_secret"], getattr(session, "sid", None))
+        print(f"Board {board_id} loaded with {calls.count} Trello API calls")
+        return await _in_thread(_board_page_response, board_id, snapshot)
+    except Exception as e:
+        return _board_view_error(e, board_id)
+
+async def api_board_summary(board_id):
+    """API endpoint to get a Trello board summary."""
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    backend_error = _report_backend_error()
+    if backend_error is not None:
+        return backend_error
+
+    try:
+        calls = track_upstream_calls()
+        snapshot = await aio.sync_snapshot(_client(), board_id)
+        board_data_tuple = snapshot["board"], snapshot["lists"]
+        print(f"Board {board_id} summary fetched with {calls.count} Trello API calls")
+
+        refresh = request.args.get("refresh") == "1"
+        not_modified = None if refresh else await _in_thread(
+            _summary_not_modified, board_id, board_data_tuple, snapshot_fingerprint(snapshot)
+        )
+        if not_modified is not None:
+            return not_modified
+        report = await generate_board_report(board_data_tuple, refresh=refresh)
+        return _summary_response(board_id, report)
+    except Exception as e:
+        return _trello_error_response(e, board_id)
+
+async def api_board_metrics(board_id):
+    """API endpoint with card counts, due dates, workload and label metrics for a board."""
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    try:
+        board, lists = await aio.sync_board(_client(), board_id)
+        return jsonify(await _in_thread(compute_board_metrics, board, lists))
+    except Exception as e:
+        return _trello_error_response(e, board_id)
+
+async def api_board_cards(board_id):
+    """API endpoint returning a page of one list's cards."""
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    page_args, error = _card_page_args()
+    if error is not None:
+        return error
+
+    try:
+        _, lists = await aio.sync_board(_client(), board_id)
+    except Exception as e:
+        return _trello_error_response(e, board_id)
+    return await _in_thread(_card_page_response, board_id, lists, *page_args)
+
+async def api_board_card(board_id, card_id):
+    """API endpoint returning one card with its full description."""
+    if "access_token" not in session:
+        return jsonify({"error": "User not authenticated. Please login via the web interface first."}), 401
+
+    try:
+        _, lists = await aio.sync_board(_client(), board_id)
+    except Exception as e:
+        return _trello_error_response(e, board_id)
+
+    card = find_card(lists, card_id)
+    if card is None:
+        return jsonify({"error": f"Card {card_id} is not on board {board_id}."}), 404
+    return jsonify(card_view(card, desc_limit=None))
+
+# GET routes served as coroutines, by Flask endpoint name
+ASYNC_VIEWS = {
+    "dashboard": dashboard,
+    "view_board": view_board,
+    "api_board_summary": api_board_summary,
+    "api_board_metrics": api_board_metrics,
+    "api_board_cards": api_board_cards,
+    "api_board_card": api_board_card
+}
+
+def _environ(scope):
+    """A WSGI environ for an ASGI HTTP request without a body"""
+    script_name = scope.get("root_path", "").encode("utf-8").decode("latin-1")
+    path_info = scope["path"].encode("utf-8").decode("latin-1")
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": script_name,
+        "PATH_INFO": path_info,
+        "QUERY_STRING": scope["query_string"].decode("ascii"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False
+    }
+    headers = defaultdict(list)
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1")
+        if name in ("content-type", "content-length"):
+            key = name.upper().replace("-", "_")
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        headers[key].append(value.decode("latin-1"))
+    environ.update((key, ",".join(values)) for key, values in headers.items())
+    return environ
+
+def _open_session(request):
+    """Open the request's session and read its data, which server-side sessions otherwise do on first use"""
+    session = flask_app.session_interface.open_session(flask_app, request)
+    if hasattr(session, "loaded"):
+        session.data
+    return session
+
+async def _dispatch(view, view_args, environ, send):
+    """Run an async view inside a Flask request context and send its response"""
+    context = flask_app.request_context(environ)
+    # Server-side sessions are read from SQLite, so the session is opened and loaded in a thread
+    # rather than on entering the context or on the view's first look at it
+    context.session = await asyncio.to_thread(_open_session, context.request)
+    with context:
+        try:
+            # before_request handlers, as Flask does; one returning a response skips the view
+            response = flask_app.preprocess_request()
+            if response is None:
+                response = await view(**view_args)
+            response = flask_app.make_response(response)
+        except Exception as e:
+            response = flask_app.make_response(flask_app.handle_exception(e))
+        # after_request handlers and saving the session, as Flask does
+        response = await asyncio.to_thread(flask_app.process_response, response)
+
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in response.headers.to_wsgi_list()]
+        })
+        try:
+            chunks = response.iter_encoded()
+            while True:
+                # Streamed pages go out as the template renders them, in a thread
+                chunk = await _in_thread(next, chunks, None) if response.is_streamed else next(chunks, None)
+                if chunk is None:
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            _thread_context().run(response.close)
+        await send({"type": "http.response.body", "body": b""})
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await aio.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+_wsgi_threads = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix="wsgi")
+
+class _WsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs every WSGI request on one shared thread, so a single open stream would hold up the rest
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__["run_wsgi_app"].func, thread_sensitive=False, executor=_wsgi_threads)
+
+class _WsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi running requests on a pool of threads"""
+
+    async def __call__(self, scope, receive, send):
+        await _WsgiInstance(self.wsgi_application)(scope, receive, send)
+
+wsgi_app = _WsgiToAsgi(flask_app)
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    if scope["type"] == "http" and scope["method"] == "GET":
+        environ = _environ(scope)
+        try:
+            endpoint, view_args = flask_app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            endpoint = None
+        view = ASYNC_VIEWS.get(endpoint)
+        if view is not None:
+            await _dispatch(view, view_args, environ, send)
+            return
+
+    await wsgi_app(scope, receive, send)
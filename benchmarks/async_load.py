@@ -0,0 +1,147 @@
+"""
+Load test: board views served by sync gunicorn workers (app:app) vs one ASGI process (asgi:app).
+
+Starts benchmarks/fake_upstream.py in place of api.trello.com, answering after --latency
+seconds, runs each server against it in a subprocess, and fires --requests board page loads
+with --concurrency in flight. Every view asks the stand-in for the board's new actions, as a
+real page load does.
+
+    python benchmarks/async_load.py --requests 2000 --concurrency 200 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.fake_upstream import FakeUpstream, free_port
+
+def _session_cookie():
+    """A signed Flask session cookie for a logged-in stand-in user"""
+    from app import app
+    return app.session_interface.get_signing_serializer(app).dumps({"access_token": "token", "access_token_secret": "secret"})
+
+def _start(command, port, env):
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"{command[0]} did not start")
+
+async def _read_response(reader):
+    """Read one HTTP/1.1 response and return (status code, whether the connection stays open)"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    headers = head.lower()
+    if b"transfer-encoding: chunked" in headers:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        length = headers.split(b"content-length:", 1)[1].split(b"\r\n", 1)[0] if b"content-length:" in headers else b"0"
+        await reader.readexactly(int(length))
+    return status, b"connection: close" not in headers
+
+async def _load(port, boards, requests, concurrency, cookie):
+    """Keep-alive connections sending board views back to back; cheaper than a full HTTP client"""
+    latencies = []
+    errors = 0
+    next_request = 0
+
+    async def connection(count):
+        nonlocal errors, next_request
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while next_request < count:
+                board = next_request % boards
+                next_request += 1
+                started = time.perf_counter()
+                writer.write(f"GET /board/b{board} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: session={cookie}\r\n\r\n".encode("latin-1"))
+                try:
+                    status, keep_alive = await _read_response(reader)
+                    ok = status == 200
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    ok = keep_alive = False
+                if not keep_alive:
+                    # Sync gunicorn workers close the connection after every response
+                    writer.close()
+                    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                latencies.append(time.perf_counter() - started)
+                errors += not ok
+        finally:
+            writer.close()
+
+    # Warm the snapshots so every measured view is an incremental sync
+    await asyncio.gather(*(connection(boards) for _ in range(min(concurrency, boards))))
+    latencies.clear()
+    errors = 0
+    next_request = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(connection(requests) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return elapsed, errors, latencies
+
+def run(label, command, port, env, args, cookie):
+    server = _start(command, port, env)
+    try:
+        elapsed, errors, latencies = asyncio.run(_load(port, args.boards, args.requests, args.concurrency, cookie))
+    finally:
+        server.terminate()
+        server.wait()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    print(f"{label:<28} {args.requests / elapsed:>9.1f}/s {p50:>9.0f} ms {p95:>9.0f} ms {errors:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--boards", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4, help="sync gunicorn workers")
+    parser.add_argument("--latency", type=float, default=0.1, help="stand-in Trello response time in seconds")
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(trello_latency=args.latency).start()
+
+    env = dict(
+        os.environ,
+        TRELLO_API_BASE=upstream.url,
+        SESSION_BACKEND="cookie",
+        WEBHOOK_CALLBACK_URL="",
+        SNAPSHOT_STORE_PATH="",
+        PRECOMPUTE_MODE="off",
+        # The stand-in has no rate limit to respect
+        TRELLO_TOKEN_RATE="1000000", TRELLO_TOKEN_BURST="1000000",
+        TRELLO_KEY_RATE="1000000", TRELLO_KEY_BURST="1000000",
+        PYTHONPATH=ROOT
+    )
+    os.environ.update(SESSION_BACKEND="cookie")
+    cookie = _session_cookie()
+
+    print(f"{args.requests} board views, {args.concurrency} concurrent, {args.latency * 1000:.0f} ms upstream latency")
+    print(f"{'server':<28} {'throughput':>11} {'p50':>12} {'p95':>12} {'errors':>7}")
+    port = free_port()
+    run(f"gunicorn app:app, {args.workers} sync", [
+        sys.executable, "-m", "gunicorn", "app:app", "-w", str(args.workers),
+        "-b", f"127.0.0.1:{port}", "--backlog", "2048", "--timeout", "120"
+    ], port, env, args, cookie)
+    port = free_port()
+    run("uvicorn asgi:app, 1 process", [
+        sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port),
+        "--no-access-log", "--backlog", "2048"
+    ], port, env, args, cookie)
+
+if __name__ == "__main__":
+    main()
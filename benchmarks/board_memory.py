@@ -0,0 +1,108 @@
+"""
+Benchmark: memory held by a cached board snapshot, as Trello's nested dicts and as compact records.
+
+Measures boards of --sizes cards in three forms: decoded from JSON (every card with its own
+label and member dicts, as snapshots read back from the SQLite store are), as fetched (member
+profiles shared through the member cache), and as trello.compact records. Also times making
+the compact form and reading it back through compute_board_metrics and the report prompt.
+The last row is what the search index holds for the board on top of its snapshot, and how
+long indexing it takes.
+
+The compact form is measured with COMPACT_DESC_MIN as configured and with every description
+over 200 characters compressed. Synthetic descriptions are drawn from a small vocabulary and
+compress far better than real ones, so the second is optimistic.
+
+    python benchmarks/board_memory.py --sizes 1000 10000 100000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trello.compact
+from benchmarks.synthetic import make_board_details
+from trello.compact import COMPACT_DESC_MIN, compact_lists
+from trello.metrics import compute_board_metrics
+from trello.prompts import build_board_prompt
+from trello.search import SearchIndex
+
+def decoded(encoded):
+    return json.loads(encoded)
+
+def fetched(encoded):
+    """Lists as fetch_board leaves them: cards share one profile dict per member"""
+    lists = json.loads(encoded)
+    profiles = {}
+    for trello_list in lists:
+        for card in trello_list["cards"]:
+            if "members" in card:
+                card["members"] = [profiles.setdefault(member["id"], member) for member in card["members"]]
+    return lists
+
+def compact(encoded):
+    return compact_lists(json.loads(encoded))
+
+def held(build, encoded):
+    """Bytes still allocated for what build returns, once everything it used along the way is freed"""
+    gc.collect()
+    tracemalloc.start()
+    result = build(encoded)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+def indexed(board, lists):
+    index = SearchIndex()
+    index.update_board(board["id"], {"board": board, "lists": lists})
+    return index
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'cards':>7} {'form':<26} {'MiB':>8} {'bytes/card':>11} {'vs decoded':>11} {'build ms':>9} {'metrics ms':>11} {'prompt ms':>10}")
+    for size in args.sizes:
+        board, lists = make_board_details(size, num_members=max(25, size // 100))
+        encoded = json.dumps(lists)
+        del lists
+        forms = [
+            ("decoded JSON dicts", decoded, None),
+            ("as fetched (shared members)", fetched, None),
+            ("compact", compact, COMPACT_DESC_MIN),
+            ("compact, desc over 200 zlib", compact, 200)
+        ]
+        baseline = None
+        for name, build, desc_min in forms:
+            if desc_min is not None:
+                trello.compact.COMPACT_DESC_MIN = desc_min
+            size_bytes, result = held(build, encoded)
+            build_ms, result = timed(build, encoded)
+            metrics_ms, _ = timed(compute_board_metrics, board, result)
+            prompt_ms, _ = timed(build_board_prompt, {"name": board["name"], "desc": board["desc"], "lists": result})
+            baseline = baseline or size_bytes
+            print(f"{size:>7} {name:<26} {size_bytes / 2 ** 20:>8.1f} {size_bytes / size:>11.0f} {size_bytes / baseline:>10.0%} "
+                  f"{build_ms:>9.0f} {metrics_ms:>11.0f} {prompt_ms:>10.0f}")
+            del result
+
+        # What the index holds on top of the compact snapshot it was built from
+        lists = compact(encoded)
+        size_bytes, index = held(lambda lists: indexed(board, lists), lists)
+        del index
+        build_ms, _ = timed(indexed, board, lists)
+        print(f"{size:>7} {'search index':<26} {size_bytes / 2 ** 20:>8.1f} {size_bytes / size:>11.0f} {size_bytes / baseline:>10.0%} "
+              f"{build_ms:>9.0f} {'-':>11} {'-':>10}")
+        del lists
+
+if __name__ == "__main__":
+    main()
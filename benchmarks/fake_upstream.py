@@ -0,0 +1,239 @@
+"""
+Stand-in for the Trello and Gemini APIs, for benchmarks and for running the app offline.
+
+Serves the Trello routes the app calls (boards, lists, cards, actions, members, /batch and
+webhooks) from synthetic boards, and Gemini's generateContent and streamGenerateContent.
+Latency, rate limits and board sizes are tunable. A board whose id looks like "cards500"
+or "cards500-2" has that many cards; other boards have --cards. GET /_stats returns request
+counts.
+
+    python benchmarks/fake_upstream.py --port 8099 --trello-latency 0.05
+    TRELLO_API_BASE=http://127.0.0.1:8099 GEMINI_API_BASE=http://127.0.0.1:8099 python app.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import WORDS, make_board_details
+
+_SIZED_BOARD = re.compile(r"cards(\d+)(?:-\w+)?$")
+_OAUTH_TOKEN = re.compile(rb'oauth_token="([^"]*)"')
+_REASONS = {200: "OK", 404: "Not Found", 429: "Too Many Requests"}
+# Trello counts requests per token over 10 second windows; Gemini per key per minute
+TRELLO_WINDOW = 10
+GEMINI_WINDOW = 60
+
+class FakeUpstream:
+    """Keep-alive HTTP server on its own event loop, cheap enough not to skew what it serves"""
+
+    def __init__(self, host="127.0.0.1", port=0, cards=40, boards=20, trello_latency=0.0, gemini_latency=0.0,
+                 trello_rate=0, gemini_rpm=0, report_words=400):
+        self.cards = cards
+        self.boards = boards
+        self.trello_latency = trello_latency
+        self.gemini_latency = gemini_latency
+        # Requests allowed per token per TRELLO_WINDOW and per key per GEMINI_WINDOW (0 for no limit)
+        self.trello_rate = trello_rate
+        self.gemini_rpm = gemini_rpm
+        self.report_words = report_words
+        self.counts = Counter()
+        self._boards = {}
+        self._windows = {}
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(self._serve, host, port, backlog=2048))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{self.port}"
+
+    def start(self):
+        """Serve from a background thread"""
+        threading.Thread(target=self.loop.run_forever, name="fake-upstream", daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self.loop.run_forever()
+
+    def _board(self, board_id):
+        """(board payload as Trello nests it, lists, cards by id), generated once per board"""
+        board = self._boards.get(board_id)
+        if board is None:
+            match = _SIZED_BOARD.match(board_id)
+            num_cards = int(match.group(1)) if match else self.cards
+            details, lists = make_board_details(num_cards, seed=zlib.crc32(board_id.encode("utf-8")), board_id=board_id)
+            cards = {}
+            for trello_list in lists:
+                for card in trello_list["cards"]:
+                    # Trello sends member ids only; profiles come from /members or /batch
+                    card.pop("members", None)
+                    cards[card["id"]] = card
+            lists = [{"id": trello_list["id"], "name": trello_list["name"]} for trello_list in lists]
+            payload = dict(details, lists=lists, cards=list(cards.values()), actions=[{"id": f"{board_id}-action0", "date": "2024-01-01T00:00:00.000Z"}])
+            board = self._boards[board_id] = (json.dumps(payload).encode("utf-8"), lists, cards)
+        return board
+
+    def _member(self, member_id):
+        return {"id": member_id, "fullName": f"Member {member_id}", "username": member_id.lower()}
+
+    def _throttled(self, service, key, limit, window):
+        """Count a request against key's window and say whether it's over limit"""
+        if not limit:
+            return False
+        current = int(time.time() // window)
+        started, count = self._windows.get((service, key), (current, 0))
+        if started != current:
+            count = 0
+        self._windows[(service, key)] = (current, count + 1)
+        if count + 1 > limit:
+            self.counts[f"{service}_throttled"] += 1
+            return True
+        return False
+
+    def _trello(self, method, path, query):
+        """(status, JSON-encodable body or bytes) for a Trello API request"""
+        parts = path.strip("/").split("/")[1:]
+        if method == "POST" and parts == ["webhooks"]:
+            model_id = query.get("idModel", [""])[0]
+            return 200, {"id": f"webhook-{model_id}", "idModel": model_id, "callbackURL": query.get("callbackURL", [""])[0], "active": True}
+        if parts == ["members", "me", "boards"]:
+            return 200, [{"id": f"b{index}", "name": f"Board b{index}"} for index in range(self.boards)]
+        if len(parts) == 2 and parts[0] == "members":
+            return 200, self._member(parts[1])
+        if parts == ["batch"]:
+            results = []
+            for route in query.get("urls", [""])[0].split(","):
+                route_parts = route.strip("/").split("/")
+                if len(route_parts) == 2 and route_parts[0] == "members":
+                    results.append({"200": self._member(route_parts[1])})
+                else:
+                    results.append({"404": "not found"})
+            return 200, results
+        if len(parts) >= 2 and parts[0] == "boards":
+            payload, lists, _ = self._board(parts[1])
+            if len(parts) == 2:
+                return 200, payload
+            if parts[2:] == ["lists"]:
+                return 200, lists
+            if parts[2:] == ["actions"]:
+                # Boards never change, so there is nothing new since any watermark
+                return 200, []
+        if len(parts) == 2 and parts[0] == "cards":
+            card = self._board(parts[1].rsplit("-card", 1)[0])[2].get(parts[1])
+            if card is not None:
+                return 200, card
+        return 404, {"message": "not found"}
+
+    def _report(self):
+        words = [WORDS[index % len(WORDS)] for index in range(self.report_words)]
+        lines = [" ".join(words[start:start + 12]).capitalize() + "." for start in range(0, len(words), 12)]
+        return "Board report\n\n" + "\n".join(lines)
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, _, headers = head.partition(b"\r\n")
+                method, target = request_line.decode("latin-1").split(" ")[:2]
+                length = re.search(rb"(?i)content-length:\s*(\d+)", headers)
+                if length:
+                    await reader.readexactly(int(length.group(1)))
+                url = urlsplit(target)
+                query = parse_qs(url.query)
+
+                if url.path == "/_stats":
+                    await self._respond(writer, 200, dict(self.counts))
+                elif url.path.startswith("/v1beta/"):
+                    self.counts["gemini"] += 1
+                    if self._throttled("gemini", query.get("key", [""])[0], self.gemini_rpm, GEMINI_WINDOW):
+                        await self._respond(writer, 429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}})
+                    elif url.path.endswith(":streamGenerateContent"):
+                        await self._stream_report(writer)
+                    else:
+                        await asyncio.sleep(self.gemini_latency)
+                        await self._respond(writer, 200, {"candidates": [{"content": {"parts": [{"text": self._report()}]}}]})
+                else:
+                    self.counts["trello"] += 1
+                    token = _OAUTH_TOKEN.search(headers)
+                    if self._throttled("trello", token.group(1) if token else b"", self.trello_rate, TRELLO_WINDOW):
+                        await self._respond(writer, 429, {"message": "API_TOKEN_LIMIT_EXCEEDED"})
+                    else:
+                        await asyncio.sleep(self.trello_latency)
+                        await self._respond(writer, *self._trello(method, url.path, query))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, body):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (
+            status, _REASONS.get(status, "Error").encode("ascii"), len(data), data))
+        await writer.drain()
+
+    async def _stream_report(self, writer):
+        """The report as server-sent events, spread over gemini_latency"""
+        lines = self._report().split("\n")
+        chunks = [lines[start:start + 4] for start in range(0, len(lines), 4)]
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+        for chunk in chunks:
+            await asyncio.sleep(self.gemini_latency / len(chunks))
+            event = {"candidates": [{"content": {"parts": [{"text": "\n".join(chunk) + "\n"}]}}]}
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8")
+            writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def spawn(port, *options):
+    """Run the stand-in in a subprocess on port, with command line options, once it accepts connections"""
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--port", str(port), *options], stdout=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("The fake upstream server did not start")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--cards", type=int, default=40, help="cards on boards whose id doesn't give a size")
+    parser.add_argument("--boards", type=int, default=20, help="boards listed for every user")
+    parser.add_argument("--trello-latency", type=float, default=0.0, help="seconds per Trello response")
+    parser.add_argument("--gemini-latency", type=float, default=0.0, help="seconds per Gemini report")
+    parser.add_argument("--trello-rate", type=int, default=0, help=f"Trello requests per token per {TRELLO_WINDOW}s (0 for no limit)")
+    parser.add_argument("--gemini-rpm", type=int, default=0, help="Gemini requests per key per minute (0 for no limit)")
+    parser.add_argument("--report-words", type=int, default=400)
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(
+        args.host, args.port, cards=args.cards, boards=args.boards, trello_latency=args.trello_latency,
+        gemini_latency=args.gemini_latency, trello_rate=args.trello_rate, gemini_rpm=args.gemini_rpm,
+        report_words=args.report_words
+    )
+    print(f"Fake Trello and Gemini at {upstream.url}: set TRELLO_API_BASE and GEMINI_API_BASE to it", flush=True)
+    try:
+        upstream.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
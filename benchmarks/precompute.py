@@ -0,0 +1,114 @@
+"""
+Benchmark: first visits to popular boards with cold caches, after the precompute scheduler warmed them, and on a cache hit.
+
+Counts yesterday's views of --boards boards (board i gets about --views / (i + 1) of them), then
+times a visit to each board the scheduler would keep warm: the board page followed by its
+summary, as the page fetches it when the report isn't inline. First with every cache empty, as
+the first visitor of the morning finds them, then again after PrecomputeScheduler.warm_all(),
+then once more as a repeat visit. Trello and Gemini are benchmarks/fake_upstream.py.
+
+    python benchmarks/precompute.py --boards 20 --cards 500 --gemini-latency 1.0
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.fake_upstream import FakeUpstream
+
+def configure(upstream_url):
+    """Point the app at the stand-in; must run before trello or app are imported"""
+    os.environ.update(
+        TRELLO_API_BASE=upstream_url,
+        GEMINI_API_BASE=upstream_url,
+        GEMINI_API_KEY="bench",
+        REPORT_BACKEND="gemini",
+        REPORT_FALLBACK_BACKEND="",
+        REPORT_CACHE_BACKEND="memory",
+        SESSION_BACKEND="cookie",
+        SNAPSHOT_STORE_PATH="",
+        WEBHOOK_CALLBACK_URL="",
+        TRACE_SLOW_MS="3600000",
+        # The benchmark runs the scheduler itself rather than on a timer
+        PRECOMPUTE_MODE="worker",
+        PRECOMPUTE_STORE_PATH="",
+        TRELLO_TOKEN_RATE="1000000", TRELLO_TOKEN_BURST="1000000", TRELLO_KEY_RATE="1000000", TRELLO_KEY_BURST="1000000",
+        GEMINI_RATE="1000000", GEMINI_BURST="1000000"
+    )
+
+def forget_everything(board_ids):
+    """Empty the caches a restart or a night's expiry would"""
+    from trello import agent, api, snapshots
+    from trello.search import search_index
+    snapshots.snapshot_store.clear()
+    snapshots.board_access.clear()
+    api.member_cache.clear()
+    agent.clear_report_cache()
+    for board_id in board_ids:
+        search_index.remove_board(board_id)
+
+def visit(client, board_id):
+    """Seconds to load a board page and its summary"""
+    started = time.perf_counter()
+    for path in (f"/board/{board_id}", f"/api/board/{board_id}/summary"):
+        response = client.get(path)
+        response.get_data()
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path} returned {response.status_code}")
+    return time.perf_counter() - started
+
+def summarize(label, latencies, calls):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{label:<34} {p50:>9.0f} {p99:>9.0f} {calls['trello'] / len(latencies):>8.1f} {calls['gemini'] / len(latencies):>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--boards", type=int, default=20)
+    parser.add_argument("--cards", type=int, default=500, help="cards per board")
+    parser.add_argument("--views", type=int, default=20, help="yesterday's views of the most viewed board")
+    parser.add_argument("--trello-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(trello_latency=args.trello_latency, gemini_latency=args.gemini_latency).start()
+    configure(upstream.url)
+    from app import app
+    from trello import precompute
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["access_token"] = "bench-token"
+        session["access_token_secret"] = "bench-secret"
+
+    board_ids = [f"cards{args.cards}-{index}" for index in range(args.boards)]
+    for index, board_id in enumerate(board_ids):
+        for _ in range(max(args.views // (index + 1), 1)):
+            precompute.record_view(board_id, "bench-token", "bench-secret")
+    popular = [board_id for board_id, _ in precompute.scheduler.candidates(time.time())]
+    print(f"{len(popular)} of {args.boards} boards viewed often enough to keep warm, {args.cards} cards each; "
+          f"Trello {args.trello_latency * 1000:.0f} ms, Gemini {args.gemini_latency * 1000:.0f} ms")
+
+    def measure(label):
+        before = dict(upstream.counts)
+        latencies = [visit(client, board_id) for board_id in popular]
+        calls = {service: upstream.counts[service] - before.get(service, 0) for service in ("trello", "gemini")}
+        summarize(label, latencies, calls)
+
+    print(f"{'first visit of the day':<34} {'p50 ms':>9} {'p99 ms':>9} {'trello':>8} {'gemini':>8}")
+    forget_everything(popular)
+    measure("cold caches")
+
+    forget_everything(popular)
+    before = dict(upstream.counts)
+    started = time.perf_counter()
+    warmed = precompute.scheduler.warm_all()
+    print(f"  (warming {warmed} boards took {time.perf_counter() - started:.1f}s in the background, "
+          f"{upstream.counts['trello'] - before.get('trello', 0)} Trello and {upstream.counts['gemini'] - before.get('gemini', 0)} Gemini calls)")
+    measure("after the scheduler warmed them")
+    measure("repeat visit (cache hit)")
+
+if __name__ == "__main__":
+    main()
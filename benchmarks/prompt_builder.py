@@ -0,0 +1,68 @@
+"""
+Benchmark: report prompt building on synthetic boards of increasing size.
+
+Compares the original string-concatenating prompt with the compact, token-budgeted
+builder, and shows when a board falls back to map-reduce summarization.
+
+    python benchmarks/prompt_builder.py --sizes 10 100 1000 2000 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import make_board_details
+from trello.prompts import build_board_prompt, build_list_prompts, estimate_tokens
+
+def legacy_prompt(board_data):
+    """The prompt as it was built before the budgeted builder, kept for comparison"""
+    prompt_content = "Analyze the following Trello board data and build a comprehensive report.\n\n"
+    prompt_content += f"Board Name: {board_data.get('name', 'N/A')}\n"
+    prompt_content += f"Board Description: {board_data.get('desc', 'No description')}\n\n"
+    prompt_content += "Board Lists and Cards:\n"
+    for lst in board_data.get("lists", []):
+        prompt_content += f"\nList: {lst.get('name', 'Unnamed List')}\n"
+        for card in lst.get("cards", []):
+            prompt_content += f"  - Card: {card.get('name', 'Unnamed Card')}\n"
+            if card.get("desc"):
+                prompt_content += f"    Description: {card['desc']}\n"
+            prompt_content += f"    Due Date: {card.get('due', 'No due date')}\n"
+            labels = [label.get("name", "N/A") for label in card.get("labels", [])]
+            if labels:
+                prompt_content += f"    Labels: {', '.join(labels)}\n"
+            members = [member.get("fullName", "N/A") for member in card.get("members", [])]
+            if members:
+                prompt_content += f"    Assigned Members: {', '.join(members)}\n"
+    return prompt_content
+
+def best_of(repeat, fn, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 2000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'cards':>6} {'legacy ms':>10} {'legacy tok':>11} {'budget ms':>10} {'budget tok':>11} {'mode':>10} {'map ms':>8}")
+    for size in args.sizes:
+        board, lists = make_board_details(size)
+        board_data = {"name": board["name"], "desc": board["desc"], "lists": lists}
+
+        legacy_ms, legacy = best_of(args.repeat, legacy_prompt, board_data)
+        budget_ms, (prompt, fits) = best_of(args.repeat, build_board_prompt, board_data)
+        mode, map_ms = "single", 0.0
+        if not fits:
+            mode = "map-reduce"
+            map_ms, _ = best_of(args.repeat, build_list_prompts, board_data)
+        print(f"{size:>6} {legacy_ms:>10.2f} {estimate_tokens(legacy):>11} {budget_ms:>10.2f} "
+              f"{estimate_tokens(prompt):>11} {mode:>10} {map_ms:>8.2f}")
+
+if __name__ == "__main__":
+    main()
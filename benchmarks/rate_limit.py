@@ -0,0 +1,108 @@
+"""
+Benchmark: sustained throughput against a rate limited stand-in server.
+
+Runs a local HTTP server that allows --server-rate requests per second (with a small
+burst), answers the rest with 429 and Retry-After, and adds --latency to every reply.
+Many threads then send requests through three clients: no retries, retries with
+jittered backoff only, and the adaptive token bucket plus retries used for Trello.
+
+    python benchmarks/rate_limit.py --requests 600 --threads 16 --server-rate 100
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trello.pool import new_session
+from trello.ratelimit import TokenBucket, send_with_retries
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    rate = 100.0
+    burst = 10
+    latency = 0.01
+    retry_after = "1"
+    tokens = 10.0
+    updated = time.monotonic()
+    served = 0
+    limited = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        cls = RateLimitedHandler
+        with cls.lock:
+            now = time.monotonic()
+            cls.tokens = min(cls.burst, cls.tokens + (now - cls.updated) * cls.rate)
+            cls.updated = now
+            allowed = cls.tokens >= 1
+            if allowed:
+                cls.tokens -= 1
+                cls.served += 1
+            else:
+                cls.limited += 1
+        time.sleep(cls.latency)
+
+        body = b'{"ok":true}' if allowed else b'{"message":"API_TOKEN_LIMIT_EXCEEDED"}'
+        self.send_response(200 if allowed else 429)
+        if not allowed:
+            self.send_header("Retry-After", cls.retry_after)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def run(label, url, args, send):
+    handler = RateLimitedHandler
+    handler.tokens, handler.updated, handler.served, handler.limited = float(handler.burst), time.monotonic(), 0, 0
+    session = new_session()
+
+    def one(_):
+        try:
+            return send(lambda: session.get(url)).status_code == 200
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        ok = sum(executor.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    session.close()
+    print(f"{label:<16} {ok:>6}/{args.requests:<6} {elapsed:>8.2f}s {ok / elapsed:>9.1f}/s {handler.limited:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--server-rate", type=float, default=100.0)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--client-rate", type=float, default=None, help="bucket rate, defaults to 1.5x the server rate to show adaptation")
+    args = parser.parse_args()
+
+    RateLimitedHandler.rate = args.server_rate
+    RateLimitedHandler.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RateLimitedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/1/members/me"
+
+    print(f"{'client':<16} {'succeeded':>13} {'elapsed':>9} {'throughput':>10} {'429s':>8}")
+    run("no retries", url, args, lambda send: send())
+    run("backoff only", url, args, lambda send: send_with_retries(send, [], attempts=6))
+    bucket = TokenBucket(args.client_rate or args.server_rate * 1.5, RateLimitedHandler.burst)
+    run("bucket+backoff", url, args, lambda send: send_with_retries(send, [bucket], attempts=6))
+    print(f"bucket ended at {bucket.rate:.1f}/s after {bucket.overloads} overloads and {bucket.throttled} throttled requests")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
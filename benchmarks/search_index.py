@@ -0,0 +1,93 @@
+"""
+Benchmark: card search over many synthetic boards, from the search index and by scanning.
+
+Indexes --boards boards of --cards cards each, then times typical queries against the index
+and against a scan of every board's (board, lists), which is what answering them took before
+the index. Also times reindexing a board after a handful of its cards change.
+
+    python benchmarks/search_index.py --boards 20 --cards 2500
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import make_board_details
+from trello.search import SearchIndex, parse_due, tokenize
+from trello.snapshots import fingerprint
+
+def scan(boards, words=(), member=None, label=None, overdue=False, now=None):
+    """Matching cards found by walking every card of every board"""
+    matches = []
+    for board, lists in boards:
+        for trello_list in lists:
+            for card in trello_list["cards"]:
+                if member and member not in [m["username"] for m in card.get("members", [])]:
+                    continue
+                if label and label not in [l["name"] for l in card.get("labels", [])]:
+                    continue
+                if overdue:
+                    due = parse_due(card.get("due"))
+                    if due is None or due >= now or card.get("dueComplete"):
+                        continue
+                if words:
+                    text = set(tokenize(card.get("name")) + tokenize(card.get("desc")))
+                    if not all(any(word.startswith(term) for word in text) for term in words):
+                        continue
+                matches.append(card)
+    return matches
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--boards", type=int, default=20)
+    parser.add_argument("--cards", type=int, default=2500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    boards = [make_board_details(args.cards, seed=index, board_id=f"board{index:03d}") for index in range(args.boards)]
+    snapshots = [{"board": board, "lists": lists, "fingerprint": fingerprint(board, lists)} for board, lists in boards]
+    index = SearchIndex()
+    start = time.perf_counter()
+    for snapshot in snapshots:
+        index.update_board(snapshot["board"]["id"], snapshot)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"Indexed {args.boards * args.cards} cards on {args.boards} boards in {build_ms:.0f} ms: {index.stats()}")
+
+    member = next(card["members"][0]["username"] for card in boards[0][1][0]["cards"] if card.get("members"))
+    now = time.time()
+    queries = [
+        ("text: deploy", {"query": "deploy"}, lambda: scan(boards, ["deploy"])),
+        ("text prefix: deplo latency", {"query": "deplo latency"}, lambda: scan(boards, ["deplo", "latency"])),
+        ("label: Urgent", {"filters": {"label": "Urgent"}}, lambda: scan(boards, label="Urgent")),
+        ("overdue for one member", {"filters": {"member": member}, "due": "overdue"}, lambda: scan(boards, member=member, overdue=True, now=now)),
+        ("text + label + overdue", {"query": "bug", "filters": {"label": "Backend"}, "due": "overdue"},
+         lambda: scan(boards, ["bug"], label="Backend", overdue=True, now=now))
+    ]
+    print(f"{'query':<28} {'matches':>8} {'index ms':>9} {'scan ms':>9}")
+    for name, kwargs, scan_fn in queries:
+        index_ms, result = best_of(args.repeat, lambda: index.search(now=now, **kwargs))
+        scan_ms, scanned = best_of(args.repeat, scan_fn)
+        print(f"{name:<28} {result['total']:>8} {index_ms:>9.2f} {scan_ms:>9.1f}")
+        if result["total"] != len(scanned):
+            print(f"  mismatch: scan found {len(scanned)}")
+
+    # A refetch after a few cards changed only reindexes those cards
+    board, lists = copy.deepcopy(boards[0])
+    for card in lists[0]["cards"][:5]:
+        card["name"] += " renamed"
+    reindex_ms, _ = best_of(1, lambda: index.update_board(board["id"], {"board": board, "lists": lists, "fingerprint": fingerprint(board, lists)}))
+    full_ms, _ = best_of(1, lambda: SearchIndex().update_board(board["id"], {"board": board, "lists": lists, "fingerprint": None}))
+    print(f"Reindex after 5 of {args.cards} cards changed: {reindex_ms:.1f} ms (indexing the board from scratch: {full_ms:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: per-request session overhead for each session backend.
+
+Runs a minimal Flask app through the test client with routes that ignore, read and
+write the session, for Flask's signed cookie and the server-side memory and SQLite
+stores, and reports the time per request and the size of the cookie sent back.
+
+    python benchmarks/session_overhead.py --requests 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flask import Flask, session
+from trello.cache import LRUCache, SQLiteCache
+from trello.session_store import ServerSessionInterface
+
+def make_app(interface):
+    app = Flask(__name__)
+    app.secret_key = "benchmark"
+    if interface is not None:
+        app.session_interface = interface
+
+    @app.route("/noop")
+    def noop():
+        return "ok"
+
+    @app.route("/read")
+    def read():
+        return "ok" if "access_token" in session else "anonymous"
+
+    @app.route("/write")
+    def write():
+        session["access_token"] = "a" * 32
+        session["access_token_secret"] = "b" * 64
+        return "ok"
+
+    return app
+
+def run(app, path, requests):
+    client = app.test_client()
+    client.get("/write")
+    for _ in range(min(requests, 200)):
+        client.get(path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+    elapsed = time.perf_counter() - start
+    cookie = client.get_cookie("session")
+    return elapsed / requests * 1e6, len(cookie.value) if cookie else 0, response
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [
+            ("cookie", None),
+            ("memory", ServerSessionInterface(LRUCache(maxsize=10000), sweep_interval=0)),
+            ("sqlite", ServerSessionInterface(SQLiteCache(os.path.join(tmp, "sessions.db"), table="sessions"), sweep_interval=0))
+        ]
+        print(f"{'backend':>8} {'noop us':>9} {'read us':>9} {'write us':>9} {'cookie bytes':>13}")
+        for name, interface in backends:
+            app = make_app(interface)
+            noop_us, _, _ = run(app, "/noop", args.requests)
+            read_us, cookie_bytes, _ = run(app, "/read", args.requests)
+            write_us, _, _ = run(app, "/write", args.requests)
+            print(f"{name:>8} {noop_us:>9.1f} {read_us:>9.1f} {write_us:>9.1f} {cookie_bytes:>13}")
+
+if __name__ == "__main__":
+    main()
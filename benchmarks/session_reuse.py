@@ -0,0 +1,86 @@
+"""
+Micro-benchmark: fresh OAuth1Session per request vs pooled keep-alive sessions.
+
+Runs a local stand-in HTTP server and counts the TCP connections it accepts.
+The server speaks plain HTTP, so the savings shown are TCP handshakes only;
+against api.trello.com every avoided connection also skips a TLS handshake.
+
+    python benchmarks/session_reuse.py --requests 200
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from requests_oauthlib import OAuth1Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trello.pool import SessionPool
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    connections_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this Nagle stalls keep-alive replies
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with StandInHandler.connections_lock:
+            StandInHandler.connections += 1
+
+    def do_GET(self):
+        body = b'{"id":"board","name":"Stand-in"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def _client():
+    return OAuth1Session("key", client_secret="secret", resource_owner_key="token", resource_owner_secret="token-secret")
+
+def run(label, url, count, get_session):
+    StandInHandler.connections = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        get_session().get(url).raise_for_status()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {count} requests in {elapsed * 1000:8.1f} ms "
+          f"({elapsed / count * 1000:.2f} ms/request, {StandInHandler.connections} connections)")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/1/boards/board"
+
+    def fresh():
+        # Mirrors the old get_trello_client: a new session, so a new connection, per call
+        session = _client()
+        fresh.sessions.append(session)
+        return session
+    fresh.sessions = []
+
+    pool = SessionPool()
+    fresh_time = run("fresh", url, args.requests, fresh)
+    pooled_time = run("pooled", url, args.requests, lambda: pool.get("token", _client))
+    print(f"speedup    {fresh_time / pooled_time:.2f}x")
+
+    for session in fresh.sessions:
+        session.close()
+    pool.close_all()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
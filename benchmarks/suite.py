@@ -0,0 +1,225 @@
+"""
+Benchmark suite: the board request path on synthetic boards of 10 to 5,000 cards.
+
+Runs benchmarks/fake_upstream.py in place of Trello and Gemini, then for each board size
+times get_board_details, _prepare_prompt_for_report, generate_board_report and the board
+page and summary routes. Records throughput, p50/p99 latency, Trello and Gemini calls per
+operation, failed operations and peak traced memory. --save-baseline stores the results;
+later runs are compared with the stored baseline and exit with status 1 when something
+got worse.
+
+    python benchmarks/suite.py --save-baseline
+    python benchmarks/suite.py --sizes 10 1000 5000 --trello-latency 0.05
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.fake_upstream import free_port, spawn
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+# Options that change what is measured; results are only compared when they match the baseline's
+SETTINGS = ("trello_latency", "gemini_latency", "trello_rate", "gemini_rpm", "concurrency")
+
+def configure(upstream_url, args):
+    """Point the app at the stand-in; must run before trello or app are imported"""
+    os.environ.update(
+        TRELLO_API_BASE=upstream_url,
+        GEMINI_API_BASE=upstream_url,
+        GEMINI_API_KEY="bench",
+        REPORT_BACKEND="gemini",
+        REPORT_FALLBACK_BACKEND="",
+        # Every report is generated, not served from the cache
+        REPORT_CACHE_BACKEND="none",
+        SESSION_BACKEND="cookie",
+        SNAPSHOT_STORE_PATH="",
+        WEBHOOK_CALLBACK_URL="",
+        # No background refreshes adding to the upstream calls being counted
+        PRECOMPUTE_MODE="off",
+        TRACE_SLOW_MS="3600000"
+    )
+    if not args.trello_rate:
+        # The stand-in has no Trello rate limit to respect
+        os.environ.update(TRELLO_TOKEN_RATE="1000000", TRELLO_TOKEN_BURST="1000000", TRELLO_KEY_RATE="1000000", TRELLO_KEY_BURST="1000000")
+    if not args.gemini_rpm:
+        os.environ.update(GEMINI_RATE="1000000", GEMINI_BURST="1000000")
+
+def upstream_counts(upstream_url):
+    with urllib.request.urlopen(f"{upstream_url}/_stats") as response:
+        return json.load(response)
+
+def percentile(latencies, share):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * share))] * 1000
+
+def attempt(op):
+    """Run op, and say whether it failed (e.g. rate limited by the stand-in)"""
+    try:
+        op()
+        return False
+    except Exception as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return True
+
+def measure(op, upstream_url, iterations, concurrency):
+    """Time op after one warm-up call, then trace one more call for its peak memory"""
+    quiet = open(os.devnull, "w")
+    with contextlib.redirect_stdout(quiet):
+        attempt(op)
+        before = upstream_counts(upstream_url)
+        latencies = []
+        errors = []
+
+        def timed(_):
+            started = time.perf_counter()
+            if attempt(op):
+                errors.append(1)
+            latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(timed, range(iterations)))
+        else:
+            for index in range(iterations):
+                timed(index)
+        elapsed = time.perf_counter() - started
+        after = upstream_counts(upstream_url)
+
+        tracemalloc.start()
+        attempt(op)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    quiet.close()
+
+    latencies.sort()
+    return {
+        "ops_per_s": round(iterations / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "trello_calls": round((after.get("trello", 0) - before.get("trello", 0)) / iterations, 2),
+        "gemini_calls": round((after.get("gemini", 0) - before.get("gemini", 0)) / iterations, 2),
+        "peak_mib": round(peak / 2 ** 20, 2),
+        "errors": len(errors)
+    }
+
+def cases(board_id):
+    """(name, operation) for everything timed on one board"""
+    from app import app
+    from trello import agent, api
+
+    trello = api.get_trello_client("bench-token", "bench-secret")
+    details = api.get_board_details(trello, board_id)
+    board_data = agent._combine_board_data(details)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["access_token"] = "bench-token"
+        session["access_token_secret"] = "bench-secret"
+
+    def get(path):
+        def op():
+            response = client.get(path)
+            body = response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {path} returned {response.status_code}: {body[:200]!r}")
+        return op
+
+    return [
+        ("get_board_details", lambda: api.get_board_details(trello, board_id)),
+        ("_prepare_prompt_for_report", lambda: agent._prepare_prompt_for_report(board_data)),
+        ("generate_board_report", lambda: agent.generate_board_report(details)),
+        ("GET /board/<id>", get(f"/board/{board_id}")),
+        ("GET /api/board/<id>/summary", get(f"/api/board/{board_id}/summary"))
+    ]
+
+def regressions(results, baseline, tolerance, min_ms, min_mib):
+    """Descriptions of every result worse than its baseline by more than the tolerance"""
+    found = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if result[metric] > before[metric] * (1 + tolerance) and result[metric] - before[metric] >= min_ms:
+                found.append(f"{key}: {metric} {before[metric]} -> {result[metric]}")
+        for metric in ("trello_calls", "gemini_calls", "errors"):
+            if result[metric] > before[metric]:
+                found.append(f"{key}: {metric} {before[metric]} -> {result[metric]}")
+        if result["peak_mib"] > before["peak_mib"] * (1 + tolerance) and result["peak_mib"] - before["peak_mib"] >= min_mib:
+            found.append(f"{key}: peak_mib {before['peak_mib']} -> {result['peak_mib']}")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1, help="operations in flight at once")
+    parser.add_argument("--trello-latency", type=float, default=0.0, help="seconds per stand-in Trello response")
+    parser.add_argument("--gemini-latency", type=float, default=0.0, help="seconds per stand-in Gemini report")
+    parser.add_argument("--trello-rate", type=int, default=0, help="stand-in Trello requests per token per 10s (0 for no limit)")
+    parser.add_argument("--gemini-rpm", type=int, default=0, help="stand-in Gemini requests per minute (0 for no limit)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="share a latency or memory figure may grow by")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="latency changes smaller than this are noise")
+    parser.add_argument("--min-mib", type=float, default=0.5, help="memory changes smaller than this are noise")
+    args = parser.parse_args()
+
+    port = free_port()
+    upstream = spawn(
+        port, "--trello-latency", str(args.trello_latency), "--gemini-latency", str(args.gemini_latency),
+        "--trello-rate", str(args.trello_rate), "--gemini-rpm", str(args.gemini_rpm)
+    )
+    upstream_url = f"http://127.0.0.1:{port}"
+    configure(upstream_url, args)
+    settings = {name: getattr(args, name) for name in SETTINGS}
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored.get("settings") == settings:
+            baseline = stored["results"]
+        else:
+            print(f"Not comparing with {args.baseline}: it was measured with {stored.get('settings')}")
+
+    results = {}
+    print(f"{'operation':<28} {'cards':>6} {'ops/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'trello':>7} {'gemini':>7} {'peak MiB':>9} {'errors':>7} {'p50 vs base':>12}")
+    try:
+        for size in args.sizes:
+            for name, op in cases(f"cards{size}"):
+                key = f"{name} @ {size}"
+                result = results[key] = measure(op, upstream_url, args.iterations, args.concurrency)
+                before = baseline.get(key)
+                change = f"{(result['p50_ms'] / before['p50_ms'] - 1) * 100:+.0f}%" if before and before["p50_ms"] else "-"
+                print(f"{name:<28} {size:>6} {result['ops_per_s']:>8.1f} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                      f"{result['trello_calls']:>7.2f} {result['gemini_calls']:>7.2f} {result['peak_mib']:>9.2f} {result['errors']:>7} {change:>12}")
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"settings": settings, "python": platform.python_version(), "machine": platform.machine(), "results": results}, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    found = regressions(results, baseline, args.tolerance, args.min_ms, args.min_mib)
+    if found:
+        print(f"\n{len(found)} regressions against {args.baseline}:")
+        for regression in found:
+            print(f"  {regression}")
+        sys.exit(1)
+    if baseline:
+        print(f"\nNo regressions against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
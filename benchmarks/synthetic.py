@@ -0,0 +1,63 @@
+"""
+Synthetic Trello boards shaped like the output of get_board_details
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+WORDS = (
+    "api design review deploy backend frontend bug fix release migrate database cache "
+    "customer onboarding invoice report metrics dashboard login search export import "
+    "sprint planning retro docs test coverage performance latency mobile android ios"
+).split()
+LABELS = [
+    {"id": "label-red", "name": "Urgent", "color": "red"},
+    {"id": "label-orange", "name": "Backend", "color": "orange"},
+    {"id": "label-green", "name": "Frontend", "color": "green"},
+    {"id": "label-blue", "name": "Research", "color": "blue"},
+    {"id": "label-purple", "name": "", "color": "purple"}
+]
+LIST_NAMES = ["Backlog", "To Do", "In Progress", "Review", "Blocked", "Done"]
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def make_members(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {"id": f"member{index:04d}", "fullName": f"{_sentence(rng, 1).title()} Person{index}", "username": f"person{index}"}
+        for index in range(count)
+    ]
+
+def make_board_details(num_cards, num_lists=None, num_members=25, desc_words=40, seed=0, board_id="synthetic"):
+    """Build a (board, lists) tuple with num_cards cards spread over the lists"""
+    rng = random.Random(seed)
+    num_lists = num_lists or max(3, min(30, num_cards // 50))
+    members = make_members(num_members, seed)
+    now = datetime.now(timezone.utc)
+
+    board = {"id": board_id, "name": f"Synthetic board ({num_cards} cards)", "desc": _sentence(rng, 20), "url": f"https://trello.com/b/{board_id}"}
+    lists = [
+        {"id": f"{board_id}-list{index:03d}", "name": f"{LIST_NAMES[index % len(LIST_NAMES)]} {index}", "cards": []}
+        for index in range(num_lists)
+    ]
+    for index in range(num_cards):
+        trello_list = lists[rng.randrange(num_lists)]
+        card_members = rng.sample(members, rng.choice([0, 1, 1, 2, 3]))
+        due = None
+        if rng.random() < 0.6:
+            due = (now + timedelta(days=rng.randint(-30, 60))).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        card = {
+            "id": f"{board_id}-card{index:06d}",
+            "name": _sentence(rng, rng.randint(2, 8)).capitalize(),
+            "desc": _sentence(rng, rng.randint(0, desc_words * 2)) if rng.random() < 0.7 else "",
+            "due": due,
+            "dueComplete": due is not None and rng.random() < 0.2,
+            "labels": rng.sample(LABELS, rng.choice([0, 0, 1, 1, 2])),
+            "idMembers": [member["id"] for member in card_members],
+            "idList": trello_list["id"],
+            "pos": float(index)
+        }
+        if card_members:
+            card["members"] = card_members
+        trello_list["cards"].append(card)
+    return board, lists
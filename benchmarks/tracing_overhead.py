@@ -0,0 +1,79 @@
+"""
+Benchmark: cost of request tracing, enabled and disabled.
+
+Times a traced function, an upstream span and a whole request through a minimal Flask
+app with five traced stages, with TRACING_ENABLED on and off, against the same code
+without any instrumentation.
+
+    python benchmarks/tracing_overhead.py --calls 200000 --requests 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flask import Flask
+from trello import tracing
+
+def stage(value):
+    return value + 1
+
+def make_app(instrumented):
+    app = Flask(__name__)
+    if instrumented:
+        tracing.install_tracing(app)
+    traced_stage = tracing.traced("stage")(stage) if instrumented else stage
+
+    @app.route("/board")
+    def board():
+        value = 0
+        for _ in range(5):
+            value = traced_stage(value)
+        if instrumented:
+            with tracing.upstream_span("trello", "GET", "/boards/b1") as call:
+                call.status = 200
+        return str(value)
+
+    return app
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e9
+
+def per_request(app, requests):
+    client = app.test_client()
+    for _ in range(min(requests, 200)):
+        client.get("/board").close()
+    start = time.perf_counter()
+    for _ in range(requests):
+        # Closing the response is what records the request's metrics
+        client.get("/board").close()
+    return (time.perf_counter() - start) / requests * 1e6
+
+def upstream_call():
+    with tracing.upstream_span("trello", "GET", "/boards/b1/actions") as call:
+        call.status = 200
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    baseline_call = per_call(lambda: stage(0), args.calls)
+    baseline_request = per_request(make_app(False), args.requests)
+    print(f"{'tracing':<12} {'traced call':>14} {'upstream span':>15} {'request':>12}")
+    print(f"{'none':<12} {baseline_call:>11.0f} ns {'-':>15} {baseline_request:>9.1f} us")
+    for enabled in (False, True):
+        tracing.TRACING_ENABLED = enabled
+        traced_stage = tracing.traced("stage")(stage)
+        call = per_call(lambda: traced_stage(0), args.calls)
+        upstream = per_call(upstream_call, args.calls)
+        request = per_request(make_app(True), args.requests)
+        print(f"{'enabled' if enabled else 'disabled':<12} {call:>11.0f} ns {upstream:>12.0f} ns {request:>9.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Shared setup for the tests: the app's stores are kept in memory and Trello is answered from
+recorded payloads in tests/fixtures, so nothing touches the network or the cache/ directory
+"""
+import io
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+sys.path.insert(0, ROOT)
+
+# Settings are read when the trello modules are imported, so they go in before any import
+os.environ.update(
+    TOKEN_STORE_BACKEND="memory",
+    SESSION_BACKEND="cookie",
+    SNAPSHOT_STORE_PATH="",
+    MEMBER_CACHE_PATH="",
+    REPORT_CACHE_BACKEND="memory",
+    WEBHOOK_CALLBACK_URL="",
+    PRECOMPUTE_MODE="off",
+    PRECOMPUTE_STORE_PATH="",
+    TRACE_SLOW_MS="3600000",
+    RETRY_BASE_DELAY="0",
+    TRELLO_TOKEN_RATE="1000000", TRELLO_TOKEN_BURST="1000000",
+    TRELLO_KEY_RATE="1000000", TRELLO_KEY_BURST="1000000",
+    GEMINI_RATE="1000000", GEMINI_BURST="1000000"
+)
+
+import pytest
+import requests
+
+from trello import api, snapshots
+from trello.search import search_index
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+class FixtureTrello:
+    """
+    Stands in for a signed Trello session: answers GETs and POSTs from routes, a dict of API
+    path (after /1) to a JSON value or a callable taking the query params, and records every call.
+    A route answering with a requests.Response, e.g. from error_response, is returned as it is.
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.calls = []
+
+    def _respond(self, method, url, params=None, headers=None, timeout=None):
+        path = url[len(api.TRELLO_API_URL):]
+        self.calls.append((method, path))
+        response = requests.Response()
+        response.url = url
+        if path not in self.routes:
+            response.status_code = 404
+            response._content = b'{"message": "not found"}'
+            return response
+        body = self.routes[path]
+        if callable(body):
+            body = body(params or {})
+        if isinstance(body, requests.Response):
+            return body
+        response.status_code = 200
+        response._content = json.dumps(body).encode("utf-8")
+        response.headers["Content-Type"] = "application/json"
+        return response
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        return self._respond("GET", url, params, headers, timeout)
+
+    def post(self, url, params=None, headers=None, timeout=None):
+        return self._respond("POST", url, params, headers, timeout)
+
+    def paths(self, method="GET"):
+        return [path for call_method, path in self.calls if call_method == method]
+
+def error_response(status_code, headers=None):
+    """A Trello error response, for routes that should fail"""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = b'{"message": "error"}'
+    response.raw = io.BytesIO()
+    response.headers.update(headers or {})
+    return response
+
+@pytest.fixture(autouse=True)
+def empty_stores():
+    """Each test starts with no snapshots, members or revalidation state from the last one"""
+    for store in (snapshots.snapshot_store, snapshots.board_access, api.member_cache, api.upstream_etags, api.boards_cache):
+        store.clear()
+    for board_id in ("b1",):
+        search_index.remove_board(board_id)
+    yield
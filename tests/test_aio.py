@@ -0,0 +1,77 @@
+"""The async board sync (trello.aio) against benchmarks/fake_upstream.py's Trello"""
+import asyncio
+import threading
+
+import pytest
+
+import asgi
+from benchmarks.fake_upstream import FakeUpstream
+from trello import aio, snapshots
+from trello.cache import LRUCache
+from trello.session_store import ServerSessionInterface
+
+@pytest.fixture
+def trello(monkeypatch):
+    upstream = FakeUpstream().start()
+    monkeypatch.setattr(aio, "TRELLO_API_URL", f"{upstream.url}/1")
+    yield upstream
+    upstream.loop.call_soon_threadsafe(upstream.server.close)
+
+async def sync(board_id):
+    try:
+        return await aio.sync_snapshot(aio.AsyncTrelloClient("token", "secret"), board_id)
+    finally:
+        await aio.aclose()
+
+def test_sync_waits_for_a_sync_of_the_board_in_a_thread(trello):
+    result = {}
+    syncing = threading.Thread(target=lambda: result.update(snapshot=asyncio.run(sync("cards5"))))
+
+    with snapshots.board_lock("cards5"):
+        syncing.start()
+        syncing.join(1)
+        # Fetching is fine, but the snapshot isn't stored while a thread holds the board
+        assert syncing.is_alive()
+        assert snapshots.snapshot_store.get("cards5") is None
+    syncing.join(5)
+
+    assert sum(len(trello_list["cards"]) for trello_list in result["snapshot"]["lists"]) == 5
+    assert snapshots.snapshot_store.get("cards5") is not None
+    assert not snapshots.board_lock("cards5").locked()
+
+def test_a_cancelled_wait_for_the_board_lock_leaves_it_alone():
+    lock = threading.Lock()
+    lock.acquire()
+
+    async def cancel_waiting():
+        waiting = asyncio.ensure_future(aio._acquire_thread_lock(lock))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        lock.release()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(cancel_waiting())
+    assert not lock.locked()
+
+def test_server_sessions_are_read_off_the_event_loop(monkeypatch):
+    class RecordingStore(LRUCache):
+        def get(self, key, default=None):
+            readers.append(threading.current_thread())
+            return super().get(key, default)
+
+    readers = []
+    store = RecordingStore(maxsize=10)
+    store.set("sid-1", {"access_token": "token"})
+    monkeypatch.setattr(asgi.flask_app, "session_interface", ServerSessionInterface(store))
+
+    async def open_session():
+        context = asgi.flask_app.test_request_context("/", headers={"Cookie": "session=sid-1"})
+        session = await asyncio.to_thread(asgi._open_session, context.request)
+        return session, threading.current_thread()
+
+    session, loop_thread = asyncio.run(open_session())
+
+    assert "access_token" in session
+    assert readers and loop_thread not in readers
@@ -0,0 +1,59 @@
+"""Prompt sizing for the local report backend (trello.backends), with a stand-in for Llama's tokenizer"""
+from conftest import load_fixture
+from trello import agent, backends
+
+class WordTokenizer:
+    """One token per word, in place of Llama 2's tokenizer"""
+
+    def __call__(self, text, add_special_tokens=True):
+        return {"input_ids": (["<s>"] if add_special_tokens else []) + text.split()}
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+def local_backend(monkeypatch, context_tokens):
+    monkeypatch.setattr(backends, "LOCAL_CONTEXT_TOKENS", context_tokens)
+    monkeypatch.setattr(backends, "LOCAL_MAX_NEW_TOKENS", 10)
+    backend = backends.LocalLlamaBackend("Write a report.")
+    backend._tokenizer = WordTokenizer()
+    backend._template_tokens = len(backend._tokenizer(backend._chat_prompt(""))["input_ids"])
+    return backend
+
+def test_prompts_are_counted_with_the_tokenizer(monkeypatch):
+    backend = local_backend(monkeypatch, 40)
+    # 40, less 10 new tokens and 8 for <s> and the chat template, leaves 22 words
+    assert backend._template_tokens == 8
+    assert backend.fits(" ".join(["word"] * 22))
+    assert not backend.fits(" ".join(["word"] * 23))
+
+def test_an_overlong_prompt_is_cut_in_the_middle_and_keeps_the_chat_template(monkeypatch):
+    backend = local_backend(monkeypatch, 60)
+    prompt = " ".join(f"w{index}" for index in range(100))
+
+    chat_prompt = backend._chat_prompt(backend._fit_prompt(prompt))
+
+    assert chat_prompt.startswith("[INST] <<SYS>>\nWrite a report.\n<</SYS>>")
+    assert chat_prompt.endswith("w99 [/INST]")
+    assert "w0 w1" in chat_prompt and "\n...\n" in chat_prompt and "w50" not in chat_prompt
+    assert len(backend._tokenizer(chat_prompt)["input_ids"]) <= 60 - 10
+
+def test_without_a_tokenizer_prompts_are_sized_conservatively(monkeypatch):
+    backend = backends.LocalLlamaBackend("Write a report.")
+    monkeypatch.setattr(backend, "missing_config", lambda: "no transformers here")
+    prompt = "x" * int(backend.prompt_token_budget * 3)
+    # Fits at the 4 characters per token prompts are estimated with for Gemini, but not at Llama's
+    assert backends.estimate_tokens(prompt) <= backend.prompt_token_budget
+    assert not backend.fits(prompt)
+
+def test_a_board_the_backend_cant_fit_is_map_reduced(monkeypatch):
+    class TightBackend(backends.ReportBackend):
+        name = "tight"
+        def fits(self, prompt):
+            return False
+    monkeypatch.setattr(agent, "report_backend", TightBackend())
+    board = load_fixture("board.json")
+    lists = [dict(trello_list, cards=[card for card in board["cards"] if card["idList"] == trello_list["id"]]) for trello_list in board["lists"]]
+
+    _, _, _, list_prompts = agent._plan_report(({"name": board["name"], "desc": board["desc"]}, lists))
+
+    assert len(list_prompts) == len(lists)
@@ -0,0 +1,23 @@
+"""Tiered caching (trello.cache): the in-memory tier must not outlive the shared SQLite entries it copies"""
+import time
+
+from trello.cache import LRUCache, SQLiteCache, TieredCache
+
+def test_disk_hit_keeps_its_remaining_ttl_in_memory(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"), ttl=3600)
+    disk.set("key", "value", ttl=0.2)
+    tiered = TieredCache(LRUCache(maxsize=10, ttl=3600), disk)
+
+    assert tiered.get("key") == "value"
+    assert tiered.memory.get("key") == "value"
+    time.sleep(0.3)
+    assert tiered.get("key") is None
+
+def test_disk_entries_without_expiry_use_the_memory_ttl(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"))
+    disk.set("key", {"a": 1})
+    memory = LRUCache(maxsize=10, ttl=60)
+    tiered = TieredCache(memory, disk)
+
+    assert tiered.get("key") == {"a": 1}
+    assert memory._data["key"][1] is not None
@@ -0,0 +1,44 @@
+"""Session pooling (trello.pool): sessions the pool lets go must not be closed under a request in flight"""
+import threading
+
+import requests
+
+from trello.pool import SessionPool
+
+class RecordingSession(requests.Session):
+    """A session whose requests block until released, and which records being closed"""
+
+    def __init__(self):
+        super().__init__()
+        self.closed = False
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def request(self, *args, **kwargs):
+        self.started.set()
+        self.release.wait(5)
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+def test_evicted_session_closes_after_its_request_finishes():
+    pool = SessionPool(maxsize=1)
+    busy = pool.get("a", RecordingSession)
+    worker = threading.Thread(target=busy.get, args=("http://example.invalid",))
+    worker.start()
+    assert busy.started.wait(5)
+
+    pool.get("b", RecordingSession)
+    assert not busy.closed
+
+    busy.release.set()
+    worker.join(5)
+    assert busy.closed
+
+def test_idle_evicted_session_closes_right_away():
+    pool = SessionPool(maxsize=1)
+    idle = pool.get("a", RecordingSession)
+    pool.get("b", RecordingSession)
+    assert idle.closed
+    assert pool.stats()["evicted"] == 1
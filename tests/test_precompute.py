@@ -0,0 +1,82 @@
+"""Viewer tokens for background refreshes (trello.precompute) never stored with the view counts"""
+import pytest
+
+from app import app
+from trello import precompute
+from trello.cache import LRUCache
+
+@pytest.fixture(autouse=True)
+def counting_views(monkeypatch):
+    # "worker" counts views without starting the scheduler thread in the tests
+    monkeypatch.setattr(precompute, "PRECOMPUTE_MODE", "worker")
+    monkeypatch.setattr(precompute, "board_views", LRUCache(maxsize=100))
+    monkeypatch.setattr(precompute, "_viewer_tokens", LRUCache(maxsize=100))
+    monkeypatch.setattr(precompute, "session_store", None)
+
+def stored_values(record):
+    return set(map(str, record.values()))
+
+def test_cookie_session_tokens_stay_in_memory_until_logout():
+    precompute.record_view("b1", "token-1", "secret-1")
+    record = precompute.board_views.get("b1")
+
+    assert not {"token-1", "secret-1"} & stored_values(record)
+    assert precompute.viewer_credentials(record) == ("token-1", "secret-1")
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["access_token"] = "token-1"
+        session["access_token_secret"] = "secret-1"
+    client.get("/logout")
+
+    assert precompute.viewer_credentials(record) is None
+
+def test_server_session_tokens_last_as_long_as_the_session(monkeypatch):
+    sessions = LRUCache(maxsize=10)
+    sessions.set("sid-1", {"access_token": "token-1", "access_token_secret": "secret-1"})
+    monkeypatch.setattr(precompute, "session_store", sessions)
+
+    precompute.record_view("b1", "token-1", "secret-1", session_id="sid-1")
+    record = precompute.board_views.get("b1")
+
+    assert not {"token-1", "secret-1"} & stored_values(record)
+    assert not len(precompute._viewer_tokens)
+    assert precompute.viewer_credentials(record) == ("token-1", "secret-1")
+    # Logging out or expiring deletes the session
+    sessions.delete("sid-1")
+    assert precompute.viewer_credentials(record) is None
+
+def test_boards_without_a_signed_in_viewer_are_not_refreshed(monkeypatch):
+    monkeypatch.setattr(precompute, "get_trello_client", lambda *credentials: pytest.fail("refreshed without a viewer"))
+    scheduler = precompute.PrecomputeScheduler(precompute.board_views, concurrency=1)
+    precompute.record_view("b1", "token-1", "secret-1")
+    precompute.forget_viewer("token-1")
+
+    scheduler._refresh("b1", precompute.board_views.get("b1"))
+
+    assert scheduler.no_viewer == 1 and scheduler.failed == 0
+
+def test_one_process_refreshes_boards_counted_in_a_shared_store(monkeypatch, tmp_path):
+    monkeypatch.setattr(precompute, "PRECOMPUTE_STORE_PATH", str(tmp_path / "precompute.db"))
+    first = precompute.PrecomputeScheduler(precompute.board_views, concurrency=1)
+    second = precompute.PrecomputeScheduler(precompute.board_views, concurrency=1)
+
+    assert first._hold_lock()
+    assert not second._hold_lock()
+    first._lock_file.close()
+    assert second._hold_lock()
+    second._lock_file.close()
+
+def test_boards_no_longer_viewed_enough_are_forgotten(monkeypatch):
+    scheduler = precompute.PrecomputeScheduler(precompute.board_views, concurrency=1)
+    monkeypatch.setattr(scheduler._runner, "submit", lambda *args: None)
+    precompute.record_view("b1", "token-1", "secret-1")
+    precompute.record_view("b1", "token-1", "secret-1")
+    now = precompute.board_views.get("b1")["at"]
+
+    scheduler.run_due(now + scheduler.interval)
+    assert "b1" in scheduler._boards
+    scheduler._boards["b1"]["due"] = 0
+
+    scheduler.run_due(now + precompute.PRECOMPUTE_HALF_LIFE * 2)
+    assert "b1" not in scheduler._boards
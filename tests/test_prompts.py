@@ -0,0 +1,32 @@
+"""Report prompts (trello.prompts) built from the computed board metrics"""
+from datetime import datetime, timezone
+
+from conftest import load_fixture
+from trello.metrics import compute_board_metrics
+from trello.prompts import build_board_prompt, build_list_prompts
+
+def board_data():
+    board = load_fixture("board.json")
+    lists = [dict(trello_list, cards=[card for card in board["cards"] if card["idList"] == trello_list["id"]]) for trello_list in board["lists"]]
+    return {"name": board["name"], "desc": board["desc"], "lists": lists}
+
+def test_board_prompt_has_rows_only_for_overdue_and_upcoming_cards():
+    data = board_data()
+    # "Fix login bug" is due 2024-05-10, the only card with a due date
+    metrics = compute_board_metrics(data, data["lists"], now=datetime(2024, 5, 12, tzinfo=timezone.utc))
+
+    prompt, fits = build_board_prompt(data, metrics=metrics)
+
+    assert fits
+    assert "Totals: lists=2 cards=4" in prompt
+    assert "  Fix login bug | open | 2024-05-10 |" in prompt
+    for name in ("Write release notes", "Old spike", "Design review"):
+        assert name not in prompt
+
+def test_list_prompts_keep_every_card():
+    data = board_data()
+
+    to_do, doing = build_list_prompts(data)
+
+    assert "Write release notes" in to_do and "Fix login bug" in to_do
+    assert "Old spike" in doing and "Design review" in doing
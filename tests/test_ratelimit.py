@@ -0,0 +1,78 @@
+"""Retries in trello.ratelimit.send_with_retries"""
+import threading
+
+import pytest
+import requests
+import urllib3
+
+from conftest import error_response
+from trello import ratelimit
+
+def flaky(*failures):
+    """A send() that raises or returns each failure in turn, then answers 200; calls counts its calls"""
+    calls = []
+
+    def send():
+        calls.append(len(calls))
+        if len(calls) <= len(failures):
+            failure = failures[len(calls) - 1]
+            if isinstance(failure, Exception):
+                raise failure
+            return failure
+        return error_response(200)
+    return send, calls
+
+def refused():
+    """What requests raises when nothing is listening: the request never left"""
+    reason = urllib3.exceptions.NewConnectionError(None, "Connection refused")
+    return requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(None, "/", reason))
+
+def test_read_timeouts_are_retried_for_gets():
+    send, calls = flaky(requests.exceptions.ReadTimeout())
+    assert ratelimit.send_with_retries(send, []).status_code == 200
+    assert len(calls) == 2
+
+def test_posts_that_may_have_arrived_are_not_retried():
+    for error in (requests.exceptions.ReadTimeout(), requests.exceptions.ConnectionError("Connection reset by peer")):
+        send, calls = flaky(error)
+        with pytest.raises(type(error)):
+            ratelimit.send_with_retries(send, [], idempotent=False)
+        assert len(calls) == 1
+
+def test_posts_that_never_connected_are_retried():
+    send, calls = flaky(refused(), requests.exceptions.ConnectTimeout())
+    assert ratelimit.send_with_retries(send, [], idempotent=False).status_code == 200
+    assert len(calls) == 3
+
+def test_slot_is_released_between_attempts():
+    slot = threading.BoundedSemaphore(1)
+    first_attempt = threading.Event()
+
+    def send():
+        assert not slot.acquire(blocking=False)
+        if first_attempt.is_set():
+            return error_response(200)
+        first_attempt.set()
+        return error_response(503, {"Retry-After": "0.5"})
+
+    result = {}
+    retrying = threading.Thread(target=lambda: result.update(response=ratelimit.send_with_retries(send, [], slot=slot)))
+    retrying.start()
+    first_attempt.wait(5)
+    # Free while the retry waits out Retry-After
+    assert slot.acquire(timeout=0.4)
+    slot.release()
+    retrying.join(5)
+
+    assert result["response"].status_code == 200
+    # The returned response still holds the slot until the caller is done with it
+    assert not slot.acquire(blocking=False)
+    slot.release()
+    assert slot.acquire(blocking=False)
+
+def test_slot_is_released_when_the_last_attempt_fails():
+    slot = threading.BoundedSemaphore(1)
+    send, _ = flaky(requests.exceptions.ReadTimeout())
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        ratelimit.send_with_retries(send, [], slot=slot, idempotent=False)
+    assert slot.acquire(blocking=False)
@@ -0,0 +1,92 @@
+"""The summary stream follows one report job per board content, against benchmarks/fake_upstream.py's streaming Gemini"""
+import json
+import threading
+
+import pytest
+
+import app as app_module
+from app import app
+from benchmarks.fake_upstream import FakeUpstream
+from conftest import FixtureTrello, load_fixture
+from trello import agent
+from trello.jobs import JobRunner, publish
+
+@pytest.fixture
+def gemini(monkeypatch):
+    upstream = FakeUpstream(gemini_latency=0.3, report_words=60).start()
+    monkeypatch.setattr(agent, "GEMINI_API_KEY", "test")
+    monkeypatch.setattr(agent, "GEMINI_API_URL", f"{upstream.url}/v1beta/models/gemini-2.0-flash:generateContent")
+    monkeypatch.setattr(agent, "GEMINI_STREAM_URL", f"{upstream.url}/v1beta/models/gemini-2.0-flash:streamGenerateContent")
+    monkeypatch.setattr(agent, "report_backend", agent.GeminiBackend())
+    monkeypatch.setattr(agent, "fallback_backend", None)
+    trello = FixtureTrello({
+        "/boards/b1": lambda params: load_fixture("board.json"),
+        "/boards/b1/actions": [],
+        "/batch": lambda params: load_fixture("batch_members.json")
+    })
+    monkeypatch.setattr(app_module, "get_trello_client", lambda token, secret: trello)
+    agent.clear_report_cache()
+    yield upstream
+    agent.clear_report_cache()
+    upstream.loop.call_soon_threadsafe(upstream.server.close)
+
+def stream_events():
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["access_token"] = "token"
+        session["access_token_secret"] = "secret"
+    body = client.get("/api/board/b1/summary/stream").get_data(as_text=True)
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+def report_text(events):
+    return "".join(data["text"] for event, data in events if event == "chunk")
+
+def test_streams_of_the_same_board_share_one_generation(gemini):
+    results = [None] * 3
+
+    def stream(index):
+        results[index] = stream_events()
+
+    streams = [threading.Thread(target=stream, args=(index,)) for index in range(3)]
+    for thread in streams:
+        thread.start()
+    for thread in streams:
+        thread.join(10)
+
+    assert gemini.counts["gemini"] == 1
+    for events in results:
+        assert events[-1] == ("done", {"board_id": "b1"})
+        assert report_text(events).startswith("Board report")
+        assert report_text(events) == report_text(results[0])
+    # Followers that arrived while it was being written still got it in pieces
+    assert max(len(events) for events in results) > 2
+
+def test_a_finished_stream_is_served_from_the_report_cache(gemini):
+    first = stream_events()
+    second = stream_events()
+
+    assert gemini.counts["gemini"] == 1
+    assert second == [("chunk", {"text": report_text(first).strip()}), ("done", {"board_id": "b1"})]
+
+def test_followers_get_every_published_chunk_whenever_they_arrive():
+    runner = JobRunner(1, name="test-jobs")
+    release = threading.Event()
+
+    def write():
+        publish("one ")
+        release.wait(5)
+        publish("two")
+        return "one two"
+
+    job = runner.submit("key", write)
+    early = job.follow()
+    assert next(early) == "one "
+    release.set()
+    assert list(early) == ["two"]
+    assert job.wait(5) and job.result == "one two"
+    # A follower arriving after the job finished replays what was published
+    assert list(job.follow()) == ["one ", "two"]
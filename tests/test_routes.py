@@ -0,0 +1,86 @@
+"""Route access checks in app.py"""
+import app as app_module
+from app import app
+from conftest import FixtureTrello, error_response
+from trello import api, tracing
+from trello.ratelimit import RateLimiter
+from trello.session_store import make_session_interface
+
+def test_cache_stats_need_a_session():
+    client = app.test_client()
+    assert client.get("/api/cache/stats").status_code == 401
+
+    with client.session_transaction() as session:
+        session["access_token"] = "token"
+        session["access_token_secret"] = "secret"
+    response = client.get("/api/cache/stats")
+    assert response.status_code == 200
+    assert "snapshots" in response.get_json()
+
+def test_dashboard_passes_on_trello_rate_limits(monkeypatch):
+    trello = FixtureTrello({"/members/me/boards": lambda params: error_response(429, {"Retry-After": "60"})})
+    monkeypatch.setattr(app_module, "get_trello_client", lambda token, secret: trello)
+    # Keeps the long Retry-After from slowing the other tests' buckets
+    monkeypatch.setattr(api, "trello_key_limiter", RateLimiter(1000, 1000))
+    monkeypatch.setattr(api, "trello_token_limiter", RateLimiter(1000, 1000))
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["access_token"] = "token"
+        session["access_token_secret"] = "secret"
+
+    response = client.get("/dashboard")
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "60"
+
+def test_metrics_need_the_bearer_token(monkeypatch):
+    client = app.test_client()
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "scrape-token")
+    monkeypatch.setattr(tracing, "METRICS_TOKEN", "scrape-token")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+    assert response.status_code == 200
+    assert "http_request_duration_seconds" in response.get_data(as_text=True)
+
+def test_login_moves_the_session_to_a_new_id(monkeypatch):
+    interface = make_session_interface("memory")
+    monkeypatch.setattr(app, "session_interface", interface)
+    monkeypatch.setattr(app_module, "get_access_token", lambda token, verifier: ("token", "secret"))
+    client = app.test_client()
+    # A session id planted before login, e.g. by an attacker
+    with client.session_transaction() as session:
+        session["request_token"] = "planted"
+    planted = client.get_cookie(app.config["SESSION_COOKIE_NAME"]).value
+
+    response = client.get("/callback?oauth_token=t&oauth_verifier=v")
+
+    sid = client.get_cookie(app.config["SESSION_COOKIE_NAME"]).value
+    assert response.status_code == 302
+    assert app.config["SESSION_COOKIE_NAME"] in response.headers["Set-Cookie"]
+    assert sid != planted
+    assert interface.store.get(planted) is None
+    assert interface.store.get(sid)["access_token"] == "token"
+
+def test_bulk_summary_refuses_malformed_bodies():
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["access_token"] = "token"
+        session["access_token_secret"] = "secret"
+
+    for body in (["b1"], "b1", {"board_ids": "b1,b2"}, {"board_ids": [1, 2]}):
+        assert client.post("/api/boards/summary", json=body).status_code == 400
+
+def test_upstream_call_counting_ends_with_the_request(monkeypatch):
+    trello = FixtureTrello({"/members/me/boards": []})
+    monkeypatch.setattr(app_module, "get_trello_client", lambda token, secret: trello)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["access_token"] = "token"
+        session["access_token_secret"] = "secret"
+
+    assert client.get("/dashboard").status_code == 200
+
+    assert api._call_counter.get() is None
@@ -0,0 +1,35 @@
+"""Card search (trello.search) over indexed board snapshots"""
+from conftest import load_fixture
+from trello.pages import card_view
+from trello.search import SearchIndex
+
+def snapshot():
+    board = load_fixture("board.json")
+    lists = [dict(trello_list, cards=[card for card in board["cards"] if card["idList"] == trello_list["id"]]) for trello_list in board["lists"]]
+    return {"board": {"id": board["id"], "name": board["name"]}, "lists": lists, "fingerprint": "f1"}
+
+def test_results_are_the_board_page_card_views_with_their_board_and_list():
+    index = SearchIndex()
+    board = snapshot()
+    board["lists"][0]["cards"][1]["members"] = [{"id": "m1", "fullName": "Alice Smith", "username": "alice"}]
+    index.update_board("b1", board)
+
+    result = index.search("login")
+
+    card = board["lists"][0]["cards"][1]
+    assert result["total"] == 1
+    assert result["results"] == [dict(
+        card_view(card),
+        board={"id": "b1", "name": "Launch plan"},
+        list={"id": "l1", "name": board["lists"][0]["name"]}
+    )]
+
+def test_changed_cards_are_found_by_their_new_text():
+    index = SearchIndex()
+    board = snapshot()
+    index.update_board("b1", board)
+    board["lists"][0]["cards"][1] = dict(board["lists"][0]["cards"][1], name="Fix signup bug")
+    index.update_board("b1", dict(board, fingerprint="f2"))
+
+    assert index.search("login")["total"] == 0
+    assert [card["name"] for card in index.search("signup")["results"]] == ["Fix signup bug"]
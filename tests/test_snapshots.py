@@ -0,0 +1,166 @@
+"""Incremental board sync (trello.snapshots) against recorded Trello board and action payloads"""
+import copy
+import types
+
+from conftest import FixtureTrello, load_fixture
+from trello import snapshots
+
+def board_routes(actions=()):
+    """Routes for board b1 with the given actions since the watermark, newest first as Trello lists them"""
+    return {
+        "/boards/b1": lambda params: load_fixture("board.json"),
+        "/boards/b1/actions": lambda params: copy.deepcopy(list(actions)),
+        "/batch": lambda params: load_fixture("batch_members.json")
+    }
+
+def synced(trello):
+    """A first sync of b1, which fetches the whole board"""
+    snapshot = snapshots.sync_snapshot(trello, "b1")
+    assert trello.paths() == ["/boards/b1", "/batch"]
+    trello.calls.clear()
+    return snapshot
+
+def card_names(snapshot):
+    return {trello_list["id"]: [card["name"] for card in trello_list["cards"]] for trello_list in snapshot["lists"]}
+
+def test_first_sync_fetches_the_whole_board():
+    snapshot = synced(FixtureTrello(board_routes()))
+    assert snapshot["board"]["name"] == "Launch plan"
+    assert card_names(snapshot) == {
+        "l1": ["Write release notes", "Fix login bug"],
+        "l2": ["Old spike", "Design review"]
+    }
+    assert snapshot["lists"][0]["cards"][0]["members"] == [{"id": "m1", "fullName": "Alice Smith", "username": "alice"}]
+    assert snapshot["last_action_id"] == "a0"
+    assert snapshots.is_clean(snapshot)
+
+def test_update_card_renames_and_moves_between_lists_without_refetching():
+    trello = FixtureTrello(board_routes())
+    before = synced(trello)
+    trello.routes.update(board_routes(load_fixture("actions_update_card.json")))
+
+    snapshot = snapshots.sync_snapshot(trello, "b1")
+
+    # Both actions carry the changed fields, so only the actions were fetched
+    assert trello.paths() == ["/boards/b1/actions"]
+    assert card_names(snapshot) == {
+        "l1": ["Write the release notes"],
+        "l2": ["Old spike", "Fix login bug", "Design review"]
+    }
+    moved = snapshot["lists"][1]["cards"][1]
+    assert moved["idList"] == "l2" and moved["labels"][0]["name"] == "Urgent"
+    assert snapshot["last_action_id"] == "a2"
+    assert snapshot["fingerprint"] != before["fingerprint"]
+    # The snapshot readers already held is left as it was
+    assert card_names(before)["l1"] == ["Write release notes", "Fix login bug"]
+
+def test_create_card_is_refetched_and_delete_card_removed():
+    trello = FixtureTrello(board_routes())
+    synced(trello)
+    trello.routes.update(board_routes(load_fixture("actions_create_delete.json")))
+    trello.routes["/cards/c4"] = load_fixture("card_c4.json")
+
+    snapshot = snapshots.sync_snapshot(trello, "b1")
+
+    # createCard doesn't carry the whole card; its member profile is already cached
+    assert trello.paths() == ["/boards/b1/actions", "/cards/c4"]
+    assert card_names(snapshot) == {
+        "l1": ["Book launch venue", "Write release notes", "Fix login bug"],
+        "l2": ["Design review"]
+    }
+    assert snapshot["lists"][0]["cards"][0]["members"][0]["username"] == "alice"
+    assert snapshot["last_action_id"] == "a4"
+    assert snapshots.is_clean(snapshot)
+
+def test_a_card_deleted_before_its_refetch_is_dropped():
+    trello = FixtureTrello(board_routes())
+    synced(trello)
+    trello.routes.update(board_routes(load_fixture("actions_create_delete.json")))
+
+    snapshot = snapshots.sync_snapshot(trello, "b1")
+
+    # /cards/c4 answers 404, as Trello does for a card deleted since the action
+    assert trello.paths() == ["/boards/b1/actions", "/cards/c4"]
+    assert "Book launch venue" not in card_names(snapshot)["l1"]
+    assert snapshots.is_clean(snapshot)
+
+def test_list_changes_refetch_the_lists_and_keep_their_cards():
+    trello = FixtureTrello(board_routes())
+    synced(trello)
+    trello.routes.update(board_routes(load_fixture("actions_lists.json")))
+    trello.routes["/boards/b1/lists"] = load_fixture("lists_after_list_changes.json")
+
+    snapshot = snapshots.sync_snapshot(trello, "b1")
+
+    assert trello.paths() == ["/boards/b1/actions", "/boards/b1/lists"]
+    assert [(trello_list["id"], trello_list["name"]) for trello_list in snapshot["lists"]] == [
+        ("l1", "To Do"), ("l2", "In progress"), ("l3", "Done")
+    ]
+    assert card_names(snapshot)["l2"] == ["Old spike", "Design review"]
+    assert card_names(snapshot)["l3"] == []
+    assert snapshot["last_action_id"] == "a6"
+
+def test_actions_limit_falls_back_to_a_full_fetch():
+    trello = FixtureTrello(board_routes())
+    synced(trello)
+    flood = [
+        dict(action, id=f"flood{index}")
+        for index, action in enumerate(load_fixture("actions_update_card.json") * (snapshots.ACTIONS_LIMIT // 2))
+    ]
+    trello.routes.update(board_routes(flood))
+
+    snapshot = snapshots.sync_snapshot(trello, "b1")
+
+    # A full page of actions may not be all of them, so the board is fetched whole instead
+    assert trello.paths() == ["/boards/b1/actions", "/boards/b1"]
+    assert card_names(snapshot)["l1"] == ["Write release notes", "Fix login bug"]
+    assert snapshot["last_action_id"] == "a0"
+
+def test_no_new_actions_keeps_the_snapshot():
+    trello = FixtureTrello(board_routes())
+    before = synced(trello)
+    # Trello may repeat the watermark's own action
+    trello.routes.update(board_routes([{"id": "a0", "type": "updateCard", "date": "2024-05-01T09:00:00.000Z", "data": {}}]))
+
+    snapshot = snapshots.sync_snapshot(trello, "b1")
+
+    assert trello.paths() == ["/boards/b1/actions"]
+    assert snapshot["fingerprint"] == before["fingerprint"]
+
+def test_apply_actions_marks_what_the_actions_dont_describe():
+    trello = FixtureTrello(board_routes())
+    snapshot = synced(trello)
+    # Newest first, as the actions endpoint returns them
+    actions = load_fixture("actions_lists.json") + load_fixture("actions_create_delete.json")
+
+    updated = snapshots.apply_actions(snapshot, snapshots.new_actions(snapshot, actions))
+
+    assert updated["dirty_cards"] == ["c4"]
+    assert updated["lists_dirty"]
+    assert not updated["stale"]
+    assert not trello.calls
+
+def test_webhook_fed_snapshots_are_only_served_live_from_a_shared_store(monkeypatch):
+    trello = FixtureTrello(board_routes())
+    trello.auth = types.SimpleNamespace(client=types.SimpleNamespace(resource_owner_key="tok1"))
+    snapshot = snapshots.sync_snapshot(trello, "b1")
+    snapshots.snapshot_store.set("b1", dict(snapshot, webhook_id="w1"))
+    trello.calls.clear()
+
+    # Each worker's own store misses deliveries that reached another worker
+    snapshots.sync_snapshot(trello, "b1")
+    assert trello.paths() == ["/boards/b1/actions"]
+    trello.calls.clear()
+
+    monkeypatch.setattr(snapshots, "SNAPSHOTS_SHARED", True)
+    snapshots.sync_snapshot(trello, "b1")
+    assert not trello.calls
+
+def test_board_locks_last_only_while_they_are_used():
+    lock = snapshots.board_lock("b-once")
+    assert snapshots.board_lock("b-once") is lock
+    with lock:
+        assert snapshots.board_lock("b-once").locked()
+
+    del lock
+    assert "b-once" not in snapshots._board_locks
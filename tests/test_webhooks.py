@@ -0,0 +1,110 @@
+"""Registering board webhooks (trello.webhooks) when Trello refuses the POST"""
+import types
+
+import pytest
+
+from app import app
+from conftest import FixtureTrello, error_response
+from trello import snapshots, tracing, webhooks
+from trello.cache import LRUCache
+
+CALLBACK_URL = "https://example.com/webhooks/trello"
+
+@pytest.fixture(autouse=True)
+def registering(monkeypatch):
+    monkeypatch.setattr(webhooks, "WEBHOOK_CALLBACK_URL", CALLBACK_URL)
+    monkeypatch.setattr(webhooks, "SNAPSHOTS_SHARED", True)
+    monkeypatch.setattr(webhooks, "_webhook_failures", LRUCache(maxsize=100, ttl=600))
+    snapshots.snapshot_store.set("b1", {"board": {"id": "b1"}, "lists": []})
+
+def signed_trello(routes):
+    """A FixtureTrello whose auth carries token tok1, as an OAuth1Session's does"""
+    trello = FixtureTrello(routes)
+    trello.auth = types.SimpleNamespace(client=types.SimpleNamespace(resource_owner_key="tok1"))
+    return trello
+
+def test_an_existing_webhook_is_looked_up_and_stored():
+    trello = signed_trello({
+        "/webhooks": lambda params: error_response(400),
+        "/tokens/tok1/webhooks": [
+            {"id": "w-other", "idModel": "b2", "callbackURL": CALLBACK_URL},
+            {"id": "w1", "idModel": "b1", "callbackURL": CALLBACK_URL}
+        ]
+    })
+
+    assert webhooks.ensure_board_webhook(trello, "b1") == "w1"
+    assert snapshots.snapshot_store.get("b1")["webhook_id"] == "w1"
+
+def test_the_token_lookup_keeps_the_token_out_of_the_metrics():
+    trello = signed_trello({"/webhooks": lambda params: error_response(400), "/tokens/tok1/webhooks": []})
+
+    webhooks.ensure_board_webhook(trello, "b1")
+
+    metrics = tracing.render_metrics()
+    assert 'route="/tokens/{id}/webhooks"' in metrics
+    assert "tok1" not in metrics
+
+def test_a_400_without_a_matching_webhook_stores_nothing():
+    trello = signed_trello({"/webhooks": lambda params: error_response(400), "/tokens/tok1/webhooks": []})
+
+    assert webhooks.ensure_board_webhook(trello, "b1") is None
+    assert "webhook_id" not in snapshots.snapshot_store.get("b1")
+
+def test_a_failed_registration_is_not_retried_until_the_backoff_passes(monkeypatch):
+    trello = signed_trello({"/webhooks": lambda params: error_response(500)})
+
+    assert webhooks.ensure_board_webhook(trello, "b1") is None
+    assert webhooks.ensure_board_webhook(trello, "b1") is None
+    assert trello.paths("POST") == ["/webhooks"]
+
+    monkeypatch.setattr(webhooks, "_webhook_failures", LRUCache(maxsize=100, ttl=600))
+    trello.routes["/webhooks"] = {"id": "w1"}
+    assert webhooks.ensure_board_webhook(trello, "b1") == "w1"
+    assert trello.paths("POST") == ["/webhooks", "/webhooks"]
+
+def test_workers_with_their_own_snapshots_register_no_webhooks(monkeypatch):
+    monkeypatch.setattr(webhooks, "SNAPSHOTS_SHARED", False)
+    trello = signed_trello({"/webhooks": {"id": "w1"}})
+
+    assert webhooks.ensure_board_webhook(trello, "b1") is None
+    assert not trello.calls
+
+def delivery(board_id="b1"):
+    return {"model": {"id": board_id}, "action": {
+        "id": "a9", "type": "updateCard", "date": "2024-05-02T09:00:00.000Z",
+        "data": {"board": {"id": board_id}, "card": {"id": "c9", "name": "Renamed"}}
+    }}
+
+def test_reports_are_only_precomputed_for_viewed_boards(monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(webhooks, "_schedule_report", scheduled.append)
+    monkeypatch.setattr(webhooks.agent, "report_backend_problem", lambda: None)
+    views = {}
+    monkeypatch.setattr(webhooks, "is_popular", lambda board_id: views.get(board_id, False))
+
+    assert webhooks.handle_webhook(delivery()) == "applied"
+    assert scheduled == []
+
+    views["b1"] = True
+    webhooks.handle_webhook(delivery())
+    assert scheduled == ["b1"]
+
+def test_deliveries_that_arent_json_objects_are_refused():
+    body = b"[]"
+    signature = webhooks.sign_payload(body, "http://localhost/webhooks/trello")
+
+    response = app.test_client().post("/webhooks/trello", data=body, headers={"X-Trello-Webhook": signature})
+
+    assert response.status_code == 400
+
+def test_report_timers_remove_themselves_when_they_fire(monkeypatch):
+    fired = []
+    monkeypatch.setattr(webhooks, "WEBHOOK_REPORT_DELAY", 0.05)
+    monkeypatch.setattr(webhooks, "current_snapshot", lambda board_id: fired.append(board_id))
+
+    webhooks._schedule_report("b1")
+    timer = webhooks._report_timers["b1"]
+    timer.join(5)
+
+    assert fired == ["b1"]
+    assert "b1" not in webhooks._report_timers
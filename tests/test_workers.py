@@ -0,0 +1,7 @@
+"""The shared fetch pool (trello.workers) and its per-user limits"""
+from trello import workers
+
+def test_per_user_semaphores_are_dropped_when_idle():
+    assert workers.fetch_all([lambda: 1, lambda: 2], user_key="user-1") == [1, 2]
+
+    assert "user-1" not in workers._user_slots
@@ -2,7 +2,18 @@ import os
 import requests
 import json
 import re
+import hashlib
+import threading
 from dotenv import load_dotenv
+from trello.pool import new_session
+from trello.cache import LRUCache, SQLiteCache, make_cache
+from trello.jobs import report_jobs, publish
+from trello.workers import fetch_all
+from trello.ratelimit import send_with_retries, gemini_limiter
+from trello.prompts import build_board_prompt, build_list_prompts, build_merge_prompt
+from trello.metrics import compute_board_metrics
+from trello.backends import ReportBackend, LocalLlamaBackend, BackendUnavailable
+from trello.tracing import traced, upstream_span
 
 # Load environment variables from .env file
 load_dotenv()
@@ -10,57 +21,59 @@ load_dotenv()
 # It's crucial to manage API keys securely.
 # Use environment variables instead of hardcoding them
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+# Point at a stand-in such as benchmarks/fake_upstream.py to run without Gemini
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com").rstrip("/")
+GEMINI_API_URL = f"{GEMINI_API_BASE}/v1beta/models/gemini-2.0-flash:generateContent"
+GEMINI_STREAM_URL = GEMINI_API_URL.replace(":generateContent", ":streamGenerateContent")
+
+REPORT_SYSTEM_INSTRUCTION = "You are an AI assistant that builds comprehensive reports for Trello boards. Your reports are detailed, analytical, and provide actionable insights. IMPORTANT: Your reports must be formatted in plain text without any markdown formatting (no **, ##, or other markdown syntax). Use plain text headings and formatting only.\n\n"
+
+# Shared keep-alive session so report requests reuse their connection to Gemini
+gemini_session = new_session()
+# Most Gemini requests in flight at once from this process, across pages, jobs and bulk runs
+GEMINI_CONCURRENCY = int(os.environ.get("GEMINI_CONCURRENCY", "4"))
+_gemini_slots = threading.BoundedSemaphore(GEMINI_CONCURRENCY)
+# Seconds to wait for Gemini to finish a report, or between chunks of a streamed one
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", "120"))
+
+# Report cache: "memory" (LRU), "disk" (SQLite), "tiered" (memory over disk) or "none"
+REPORT_CACHE_BACKEND = os.environ.get("REPORT_CACHE_BACKEND", "memory")
+REPORT_CACHE_SIZE = int(os.environ.get("REPORT_CACHE_SIZE", "512"))
+REPORT_CACHE_TTL = int(os.environ.get("REPORT_CACHE_TTL", "86400"))
+REPORT_CACHE_PATH = os.environ.get("REPORT_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "reports.db"))
+
+def _build_report_cache():
+    """Create the report cache for the configured backend"""
+    if REPORT_CACHE_BACKEND == "none":
+        return None
+    if REPORT_CACHE_BACKEND == "disk":
+        return SQLiteCache(REPORT_CACHE_PATH, ttl=REPORT_CACHE_TTL, table="reports")
+    if REPORT_CACHE_BACKEND == "tiered":
+        return make_cache(REPORT_CACHE_SIZE, ttl=REPORT_CACHE_TTL, path=REPORT_CACHE_PATH, table="reports")
+    return LRUCache(maxsize=REPORT_CACHE_SIZE, ttl=REPORT_CACHE_TTL)
+
+report_cache = _build_report_cache()
+# Snapshot fingerprint -> report cache key for that content, so a page view doesn't rebuild the prompt to look its report up.
+# The prompt's overdue and upcoming cards are relative to now, so unchanged content gets its key worked out again this often
+REPORT_KEY_TTL = min(int(os.environ.get("REPORT_KEY_TTL", "3600")), REPORT_CACHE_TTL)
+_report_keys = LRUCache(maxsize=REPORT_CACHE_SIZE * 4, ttl=REPORT_KEY_TTL)
+
+# Boards too large for one prompt are summarized list by list, then merged ("auto" or "off")
+PROMPT_MAP_REDUCE = os.environ.get("PROMPT_MAP_REDUCE", "auto")
+
+# Where reports are generated: "gemini" (Gemini's API) or "local" (Llama 2 on this machine, see trello.backends)
+REPORT_BACKEND = os.environ.get("REPORT_BACKEND", "gemini")
+# Backend used when that one isn't configured or fails, e.g. "local" to keep going while Gemini is down ("" for none)
+REPORT_FALLBACK_BACKEND = os.environ.get("REPORT_FALLBACK_BACKEND", "")
 
 def _prepare_prompt_for_report(board_data):
     """
-    Prepares a detailed prompt for the LLM to build a comprehensive report of the board.
-    """
-    board_name = board_data.get('name', 'N/A')
-    board_desc = board_data.get('desc', 'No description')
-    lists = board_data.get('lists', [])
-
-    prompt_content = f"Analyze the following Trello board data and build a comprehensive report.\n\n"
-    prompt_content += f"Board Name: {board_name}\n"
-    prompt_content += f"Board Description: {board_desc}\n\n"
-
-    if not lists:
-        prompt_content += "The board has no lists or cards.\n"
-        return prompt_content
-
-    prompt_content += "Board Lists and Cards:\n"
-    for lst in lists:
-        list_name = lst.get('name', 'Unnamed List')
-        prompt_content += f"\nList: {list_name}\n"
-        cards = lst.get('cards', [])
-        if not cards:
-            prompt_content += "  - This list has no cards.\n"
-        else:
-            for card in cards:
-                card_name = card.get('name', 'Unnamed Card')
-                card_desc = card.get('desc', '')
-                card_due = card.get('due', 'No due date')
-                labels = [label.get('name', 'N/A') for label in card.get('labels', [])]
-                members = [member.get('fullName', 'N/A') for member in card.get('members', [])]
-
-                prompt_content += f"  - Card: {card_name}\n"
-                if card_desc:
-                    prompt_content += f"    Description: {card_desc}\n"
-                prompt_content += f"    Due Date: {card_due}\n"
-                if labels:
-                    prompt_content += f"    Labels: {', '.join(labels)}\n"
-                if members:
-                    prompt_content += f"    Assigned Members: {', '.join(members)}\n"
-    
-    prompt_content += "\nBased on this data, please build a comprehensive report that includes:\n"  
-    prompt_content += "1. Overall board status and progress\n"
-    prompt_content += "2. Key metrics (number of cards in each list, completion percentage)\n"
-    prompt_content += "3. Task distribution among team members\n"
-    prompt_content += "4. Upcoming deadlines and priority items\n"
-    prompt_content += "5. Recommendations for improving workflow or addressing bottlenecks\n"
-    prompt_content += "\nIMPORTANT: Format the report in a clear, professional structure with plain text headings. DO NOT use markdown formatting like **, ##, or any other markdown syntax. The report should look like a natural document without any markdown formatting."
-    return prompt_content
+    Prepares a compact prompt for the LLM to build a comprehensive report of the board,
+    with detail reduced as needed to fit PROMPT_TOKEN_BUDGET.
+    """
+    return build_board_prompt(board_data)[0]
 
+@traced()
 def _clean_markdown_formatting(text):
     """
     Removes markdown formatting from text to make it look more natural.
@@ -80,72 +93,388 @@ def _clean_markdown_formatting(text):
     
     return text
 
-def generate_board_report(board_details_from_trello_api):
+# Characters that may start markdown _clean_markdown_formatting would remove
+_MARKDOWN_CHARS = re.compile(r'[#*`\[]')
+
+def _clean_markdown_stream(chunks):
     """
-    Uses Google's Gemini API to generate a comprehensive report of the Trello board.
-    'board_details_from_trello_api' is a tuple (board, lists) as returned by get_board_details.
+    Cleans markdown from streamed text, yielding cleaned text as soon as it is safe to.
+    The patterns in _clean_markdown_formatting never span lines, so complete lines are
+    cleaned on their own, and partial lines are passed through while they hold no markdown.
     """
-    if not GEMINI_API_KEY:
-        return "Error: GEMINI_API_KEY is not set. Please set it as an environment variable."
+    pending = ""
+    mid_line = False
+    for chunk in chunks:
+        pending += chunk
+        line_end = pending.rfind("\n")
+        if line_end != -1:
+            complete, pending = pending[:line_end + 1], pending[line_end + 1:]
+            cleaned_lines = []
+            for line in complete[:-1].split("\n"):
+                cleaned_lines.append(_clean_markdown_line_tail(line) if mid_line else _clean_markdown_formatting(line))
+                mid_line = False
+            yield "\n".join(cleaned_lines) + "\n"
+        # A partial line can go out early unless it could still turn into markdown
+        if pending and not _MARKDOWN_CHARS.search(pending) and (mid_line or pending.strip()):
+            yield pending
+            pending = ""
+            mid_line = True
+    if pending:
+        yield _clean_markdown_line_tail(pending) if mid_line else _clean_markdown_formatting(pending)
 
-    board_object, lists_with_cards = board_details_from_trello_api
-    
-    # Combine board object and lists into a single structure for the prompt helper
-    combined_board_data = {
-        "name": board_object.get("name"),
-        "desc": board_object.get("desc"),
-        "lists": lists_with_cards
-    }
-
-    prompt = _prepare_prompt_for_report(combined_board_data)
-
-    # Construct the URL with API key
-    url = f"{GEMINI_API_URL}?key={GEMINI_API_KEY}"
-    
-    headers = {
-        "Content-Type": "application/json"
-    }
+def _clean_markdown_line_tail(text):
+    """Cleans text that continues a line already sent, so it can't start a header"""
+    return _clean_markdown_formatting("." + text)[1:]
 
+def _report_payload(prompt):
+    """Request body for Gemini's generateContent and streamGenerateContent endpoints"""
     # Payload structure for Gemini API based on the provided curl example
-    payload = {
+    return {
         "contents": [
             {
                 "parts": [
                     {
-                        "text": "You are an AI assistant that builds comprehensive reports for Trello boards. Your reports are detailed, analytical, and provide actionable insights. IMPORTANT: Your reports must be formatted in plain text without any markdown formatting (no **, ##, or other markdown syntax). Use plain text headings and formatting only.\n\n" + prompt
+                        "text": REPORT_SYSTEM_INSTRUCTION + prompt
                     }
                 ]
             }
         ]
     }
 
+def _combine_board_data(board_details_from_trello_api):
+    """Combine board object and lists into a single structure for the prompt helpers"""
+    board_object, lists_with_cards = board_details_from_trello_api
+    return {
+        "name": board_object.get("name"),
+        "desc": board_object.get("desc"),
+        "lists": lists_with_cards
+    }
+
+@traced()
+def _plan_report(board_details_from_trello_api):
+    """
+    Works out how to prompt for a board's report. Returns (board_data, metrics, prompt, list_prompts);
+    list_prompts is empty unless the board doesn't fit one prompt and gets map-reduced.
+    """
+    board_data = _combine_board_data(board_details_from_trello_api)
+    metrics = compute_board_metrics(board_data, board_data["lists"])
+    budget = report_backend.prompt_token_budget
+    chars_per_token = report_backend.chars_per_token
+    prompt, fits = build_board_prompt(board_data, budget=budget, metrics=metrics, chars_per_token=chars_per_token)
+    # The estimate may still be over for a backend that can count its tokens exactly
+    if (fits and report_backend.fits(prompt)) or PROMPT_MAP_REDUCE == "off":
+        return board_data, metrics, prompt, []
+    return board_data, metrics, prompt, build_list_prompts(board_data, budget=budget, metrics=metrics, chars_per_token=chars_per_token)
+
+def build_report_prompt(board_details_from_trello_api):
+    """
+    Builds the model input for a (board, lists) tuple as returned by get_board_details:
+    the report prompt, or every per-list prompt when the board is map-reduced.
+    """
+    _, _, prompt, list_prompts = _plan_report(board_details_from_trello_api)
+    return _model_input(prompt, list_prompts)
+
+def _model_input(prompt, list_prompts):
+    return "\n\n".join(list_prompts) if list_prompts else prompt
+
+def report_cache_key(prompt):
+    """
+    Content address of a report: a hash of the report backend's model and the prompt.
+    Boards with identical content share a key, whichever user is looking at them.
+    """
+    normalized = "\n".join(line.rstrip() for line in prompt.strip().splitlines())
+    return hashlib.sha256(f"{report_backend.cache_id}\n{normalized}".encode("utf-8")).hexdigest()
+
+def board_report_cache_key(board_details_from_trello_api, content=None):
+    """
+    The report cache key for a (board, lists) tuple. content, the snapshot's fingerprint,
+    lets content seen before skip building the prompt.
+    """
+    if content is None:
+        return report_cache_key(build_report_prompt(board_details_from_trello_api))
+    cache_key = _report_keys.get(content)
+    if cache_key is None:
+        cache_key = report_cache_key(build_report_prompt(board_details_from_trello_api))
+        _report_keys.set(content, cache_key)
+    return cache_key
+
+def get_cached_board_report(board_details_from_trello_api, content=None):
+    """Return the cached report for a board's current content, or None"""
+    if report_cache is None:
+        return None
+    return report_cache.get(board_report_cache_key(board_details_from_trello_api, content))
+
+def invalidate_board_report(board_details_from_trello_api):
+    """Drop the cached report for a board's current content"""
+    if report_cache is not None:
+        report_cache.delete(report_cache_key(build_report_prompt(board_details_from_trello_api)))
+
+def clear_report_cache():
+    """Drop every cached report"""
+    if report_cache is not None:
+        report_cache.clear()
+
+def _gemini_report_text(prompt):
+    """Sends a prompt to Gemini and returns the generated text, or None if the response has none"""
+    with upstream_span("gemini", "POST", "generateContent") as call:
+        # A slot is only held while an attempt is in flight, not through the backoff between them
+        response = send_with_retries(lambda: gemini_session.post(
+            f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
+            headers={"Content-Type": "application/json"},
+            json=_report_payload(prompt),
+            timeout=GEMINI_TIMEOUT
+        ), [gemini_limiter.bucket(GEMINI_API_KEY)], slot=_gemini_slots, idempotent=False)
+        # The body has been read, so Gemini is done with it
+        _gemini_slots.release()
+        call.status = response.status_code
+    response.raise_for_status()  # Raise an exception for HTTP errors
+    return _response_text(response)
+
+def _response_text(response):
+    """The generated text from a generateContent response, or None if it has none"""
+    response_data = response.json()
+    # Extract text from Gemini API response
+    if 'candidates' in response_data and len(response_data['candidates']) > 0:
+        candidate = response_data['candidates'][0]
+        if 'content' in candidate and 'parts' in candidate['content']:
+            parts = candidate['content']['parts']
+            if parts and 'text' in parts[0]:
+                return parts[0]['text'].strip()
+
+    print(f"Unexpected response structure: {response.text}")
+    return None
+
+def _gemini_stream_chunks(prompt):
+    """Yields the text of a report as Gemini's streaming endpoint generates it"""
+    # Retries only happen before any text has been yielded; the span ends at the first byte
+    with upstream_span("gemini", "POST", "streamGenerateContent") as call:
+        response = send_with_retries(lambda: gemini_session.post(
+            f"{GEMINI_STREAM_URL}?alt=sse&key={GEMINI_API_KEY}",
+            headers={"Content-Type": "application/json"},
+            json=_report_payload(prompt),
+            stream=True,
+            timeout=GEMINI_TIMEOUT
+        ), [gemini_limiter.bucket(GEMINI_API_KEY)], slot=_gemini_slots, idempotent=False)
+        call.status = response.status_code
+    # The slot stays held until the stream ends, since Gemini is still generating until then
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        
-        response_data = response.json()
-        # Extract text from Gemini API response
-        if 'candidates' in response_data and len(response_data['candidates']) > 0:
-            candidate = response_data['candidates'][0]
-            if 'content' in candidate and 'parts' in candidate['content']:
-                parts = candidate['content']['parts']
-                if parts and 'text' in parts[0]:
-                    # Clean any markdown formatting that might still be present
-                    report_text = parts[0]['text'].strip()
-                    clean_report = _clean_markdown_formatting(report_text)
-                    return clean_report
-        
-        print(f"Unexpected response structure: {response.text}")
-        return "Could not generate a board report due to unexpected API response structure."
+        with response:
+            response.raise_for_status()
+            # Server-sent events are UTF-8 whatever the Content-Type says
+            response.encoding = "utf-8"
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):])
+                for candidate in event.get("candidates", [])[:1]:
+                    for part in candidate.get("content", {}).get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+    finally:
+        _gemini_slots.release()
+
+class GeminiBackend(ReportBackend):
+    """Gemini's generateContent API"""
+    name = "gemini"
+    cache_id = GEMINI_API_URL
+
+    def missing_config(self):
+        if not GEMINI_API_KEY:
+            return "GEMINI_API_KEY is not set. Please set it as an environment variable."
+        return None
+
+    def generate(self, prompt):
+        return _gemini_report_text(prompt)
+
+    def stream(self, prompt):
+        return _gemini_stream_chunks(prompt)
+
+def _build_report_backend(name):
+    """Create the report backend called name, or None for an empty name"""
+    if not name:
+        return None
+    if name == "gemini":
+        return GeminiBackend()
+    if name == "local":
+        return LocalLlamaBackend(REPORT_SYSTEM_INSTRUCTION)
+    raise ValueError(f"Unknown report backend {name!r}, expected \"gemini\" or \"local\"")
+
+report_backend = _build_report_backend(REPORT_BACKEND)
+fallback_backend = _build_report_backend(REPORT_FALLBACK_BACKEND)
+
+def report_backend_problem():
+    """Why reports can't be generated, or None if the report backend or its fallback is ready"""
+    problem = report_backend.missing_config()
+    if problem and fallback_backend is not None and fallback_backend.missing_config() is None:
+        return None
+    return problem
+
+def warm_report_backends():
+    """Start loading local models now rather than on the first report"""
+    for backend in (report_backend, fallback_backend):
+        if backend is not None and backend.missing_config() is None:
+            backend.warm()
+
+def report_backend_stats():
+    stats = {"backend": report_backend.name, "fallback": fallback_backend.name if fallback_backend else None}
+    for backend in (report_backend, fallback_backend):
+        if isinstance(backend, LocalLlamaBackend):
+            stats["local"] = backend.stats()
+    return stats
+
+def _available_backend():
+    """The report backend, or its fallback if the report backend isn't configured"""
+    if report_backend.missing_config() is None or fallback_backend is None:
+        return report_backend
+    return fallback_backend
+
+def _request_report_text(prompt):
+    """
+    Generates the text for a prompt with the report backend, or with the fallback backend if
+    that isn't configured or fails. Returns (text, the backend that wrote it).
+    """
+    backend = _available_backend()
+    try:
+        return backend.generate(prompt), backend
+    except (requests.exceptions.RequestException, BackendUnavailable) as e:
+        if fallback_backend is None or backend is fallback_backend:
+            raise
+        print(f"Report backend {backend.name} failed, using {fallback_backend.name}: {e}")
+        return fallback_backend.generate(prompt), fallback_backend
+
+def _map_reduce_prompt(board_data, metrics, list_prompts):
+    """Summarizes each list in parallel and returns the prompt that merges the summaries"""
+    summaries = fetch_all(
+        [lambda list_prompt=list_prompt: _request_report_text(list_prompt)[0] or "" for list_prompt in list_prompts],
+        user_key="report"
+    )
+    return build_merge_prompt(board_data, [_clean_markdown_formatting(summary) for summary in summaries], metrics=metrics)
+
+def generate_board_report(board_details_from_trello_api, refresh=False):
+    """
+    Uses the report backend (Gemini's API by default) to generate a comprehensive report of the Trello board.
+    'board_details_from_trello_api' is a tuple (board, lists) as returned by get_board_details.
+    Reports are cached by board content; pass refresh=True to regenerate and replace the cached copy.
+    Reports written by the fallback backend aren't cached, so the next request tries the report backend again.
+    """
+    problem = report_backend_problem()
+    if problem:
+        return f"Error: {problem}"
+
+    board_data, metrics, prompt, list_prompts = _plan_report(board_details_from_trello_api)
+    cache_key = report_cache_key(_model_input(prompt, list_prompts))
+    if report_cache is not None and not refresh:
+        cached_report = report_cache.get(cache_key)
+        if cached_report is not None:
+            return cached_report
+
+    try:
+        if list_prompts:
+            prompt = _map_reduce_prompt(board_data, metrics, list_prompts)
+        report_text, backend = _request_report_text(prompt)
+        if report_text is None:
+            return "Could not generate a board report due to unexpected API response structure."
+
+        # Clean any markdown formatting that might still be present
+        clean_report = _clean_markdown_formatting(report_text)
+        if report_cache is not None and backend is report_backend:
+            report_cache.set(cache_key, clean_report)
+        return clean_report
 
+    except BackendUnavailable as e:
+        print(f"Report backend unavailable: {e}")
+        return f"Error: {e}"
     except requests.exceptions.RequestException as e:
         print(f"Error calling Gemini API: {e}")
         return f"Error: Could not connect to Gemini API to generate report. {e}"
     except (KeyError, IndexError, json.JSONDecodeError) as e:
         print(f"Error parsing Gemini API response: {e}")
-        print(f"Response content: {response.text if 'response' in locals() else 'No response object'}")
         return "Error: Could not parse the report from Gemini API response."
 
+def stream_board_report(board_details_from_trello_api):
+    """
+    Streams a board report from the report backend, yielding cleaned text as it arrives.
+    A cached report is yielded in one piece, and a completed stream is added to the report cache.
+    Raises ValueError if no backend is configured and requests.exceptions.RequestException on HTTP errors.
+    """
+    problem = report_backend_problem()
+    if problem:
+        raise ValueError(problem)
+
+    board_data, metrics, prompt, list_prompts = _plan_report(board_details_from_trello_api)
+    cache_key = report_cache_key(_model_input(prompt, list_prompts))
+    if report_cache is not None:
+        cached_report = report_cache.get(cache_key)
+        if cached_report is not None:
+            yield cached_report
+            return
+
+    # Large boards stream only the merge step, after the lists are summarized
+    if list_prompts:
+        prompt = _map_reduce_prompt(board_data, metrics, list_prompts)
+
+    backend = _available_backend()
+    sent = False
+    try:
+        for text in _stream_report_text(backend, prompt, cache_key):
+            sent = True
+            yield text
+    except (requests.exceptions.RequestException, BackendUnavailable) as e:
+        # Once text has gone out the report can't switch writers
+        if sent or fallback_backend is None or backend is fallback_backend:
+            raise
+        print(f"Report backend {backend.name} failed, using {fallback_backend.name}: {e}")
+        yield from _stream_report_text(fallback_backend, prompt, cache_key)
+
+def _stream_report_text(backend, prompt, cache_key):
+    report_parts = []
+    started = False
+    for text in _clean_markdown_stream(backend.stream(prompt)):
+        # Match the non-streaming report, which has leading whitespace stripped
+        if not started:
+            text = text.lstrip()
+            started = bool(text)
+        if text:
+            report_parts.append(text)
+            yield text
+
+    if report_cache is not None and report_parts and backend is report_backend:
+        report_cache.set(cache_key, "".join(report_parts).strip())
+
+def start_board_report(board_details_from_trello_api, content=None):
+    """
+    Starts generating a board report in the background and returns its Job.
+    A cached report comes back as an already finished job, and identical boards
+    requested while a report is in flight share that job. content, the snapshot's
+    fingerprint, lets content seen before skip building the prompt.
+    """
+    cache_key = board_report_cache_key(board_details_from_trello_api, content)
+    if report_cache is not None:
+        cached_report = report_cache.get(cache_key)
+        if cached_report is not None:
+            return report_jobs.completed(cache_key, cached_report)
+    return report_jobs.submit(cache_key, generate_board_report, board_details_from_trello_api)
+
+def start_board_report_stream(board_details_from_trello_api):
+    """
+    Like start_board_report, but the job streams the report and publishes its text as the
+    backend writes it, for Job.follow. Everyone streaming the same content follows one job,
+    and it keeps going if they disconnect, so the report still gets cached.
+    """
+    cache_key = report_cache_key(build_report_prompt(board_details_from_trello_api))
+    if report_cache is not None:
+        cached_report = report_cache.get(cache_key)
+        if cached_report is not None:
+            return report_jobs.completed(cache_key, cached_report)
+    return report_jobs.submit(cache_key, _publish_board_report, board_details_from_trello_api)
+
+def _publish_board_report(board_details_from_trello_api):
+    report_parts = []
+    for text in stream_board_report(board_details_from_trello_api):
+        publish(text)
+        report_parts.append(text)
+    return "".join(report_parts).strip()
+
 if __name__ == '__main__':
     # Example usage (for testing this module directly)
     # This requires you to have GEMINI_API_KEY set as an environment variable
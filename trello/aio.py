@@ -0,0 +1,355 @@
+"""
+Async Trello client and board sync for the ASGI entry point (asgi.py).
+
+Mirrors trello.api and trello.snapshots with coroutines on httpx, signing requests with
+oauthlib, and shares their caches, snapshots and rate limits so both paths can serve the
+same process.
+"""
+import asyncio
+import json
+import os
+import time
+import weakref
+
+import httpx
+from oauthlib.oauth1 import Client
+
+from trello.api import (
+    TRELLO_KEY, TRELLO_SECRET, TRELLO_API_URL, BOARD_PARAMS, BATCH_LIMIT, BOARDS_CACHE_TTL,
+    UPSTREAM_ETAG_MAX_BYTES, member_cache, boards_cache, upstream_etags, group_cards,
+    _batch_members, _call_counter
+)
+from trello.ratelimit import (
+    trello_token_limiter, trello_key_limiter, retry_after, backoff,
+    RETRY_ATTEMPTS, RETRY_MAX_DELAY, RETRY_STATUSES
+)
+from trello.snapshots import (
+    snapshot_store, current_snapshot, save_snapshot, board_access, board_lock, new_actions, actions_params, apply_actions, is_clean,
+    _is_live, _confirm_current, _store_fetched, _apply_refetched, _SnapshotEditor,
+    ACTIONS_LIMIT, MAX_CARD_REFETCH, LISTS_PARAMS, CARD_PARAMS, SNAPSHOTS_SHARED
+)
+from trello.tracing import traced, upstream_span
+from trello.workers import PER_USER_CONCURRENCY
+
+# Seconds to wait for an upstream response, and connections kept open per event loop
+AIO_HTTP_TIMEOUT = float(os.environ.get("AIO_HTTP_TIMEOUT", "30"))
+AIO_MAX_CONNECTIONS = int(os.environ.get("AIO_MAX_CONNECTIONS", "200"))
+AIO_MAX_KEEPALIVE = int(os.environ.get("AIO_MAX_KEEPALIVE", "50"))
+
+class _LoopState:
+    """The HTTP client, semaphores, locks and in-flight calls of one event loop"""
+
+    def __init__(self):
+        self.http = httpx.AsyncClient(
+            timeout=AIO_HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=AIO_MAX_CONNECTIONS, max_keepalive_connections=AIO_MAX_KEEPALIVE)
+        )
+        # Dropped once nothing holds or waits on them, like trello.workers' and trello.snapshots' thread versions
+        self.semaphores = weakref.WeakValueDictionary()
+        self.board_locks = weakref.WeakValueDictionary()
+        self.inflight = {}
+
+_states = weakref.WeakKeyDictionary()
+
+def _state():
+    loop = asyncio.get_running_loop()
+    state = _states.get(loop)
+    if state is None:
+        state = _states[loop] = _LoopState()
+    return state
+
+def http_client():
+    """The shared httpx client for the running event loop"""
+    return _state().http
+
+def loop_semaphore(key, value):
+    """A semaphore of the running event loop, created with value on first use"""
+    semaphores = _state().semaphores
+    semaphore = semaphores.get(key)
+    if semaphore is None:
+        semaphore = semaphores[key] = asyncio.Semaphore(value)
+    return semaphore
+
+async def aclose():
+    """Close the running loop's HTTP client, for servers shutting down"""
+    state = _states.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state.http.aclose()
+
+async def send_with_retries(send, buckets, attempts=RETRY_ATTEMPTS, slot=None, idempotent=True):
+    """
+    Async trello.ratelimit.send_with_retries: send() returns an awaitable httpx response and
+    slot is an asyncio semaphore. Only connect errors are retried for requests that aren't idempotent.
+    """
+    for attempt in range(attempts + 1):
+        wait = max(bucket.reserve() for bucket in buckets) if buckets else 0.0
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if slot is not None:
+            await slot.acquire()
+        try:
+            response = await send()
+        except httpx.TransportError as e:
+            if slot is not None:
+                slot.release()
+            if attempt == attempts or not (idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))):
+                raise
+            await asyncio.sleep(backoff(attempt))
+            continue
+        except BaseException:
+            if slot is not None:
+                slot.release()
+            raise
+
+        if response.status_code not in RETRY_STATUSES:
+            return response
+
+        delay = retry_after(response)
+        if response.status_code == 429:
+            for bucket in buckets:
+                bucket.penalize(delay if delay is not None else backoff(attempt))
+        if attempt == attempts or (delay is not None and delay > RETRY_MAX_DELAY):
+            return response
+        print(f"Upstream returned {response.status_code}, retrying (attempt {attempt + 1} of {attempts})")
+        await response.aclose()
+        if slot is not None:
+            slot.release()
+        await asyncio.sleep(delay if delay is not None else backoff(attempt))
+    return response
+
+async def coalesce(key, fn):
+    """Await fn() once per key at a time; callers arriving while it runs share its result"""
+    inflight = _state().inflight
+    task = inflight.get(key)
+    if task is None:
+        task = inflight[key] = asyncio.ensure_future(fn())
+
+        def _done(task):
+            inflight.pop(key, None)
+            # Retrieved here so a failure nobody is left waiting for isn't logged as unhandled
+            if not task.cancelled():
+                task.exception()
+
+        task.add_done_callback(_done)
+    # A caller that goes away doesn't cancel the call for the others
+    return await asyncio.shield(task)
+
+async def gather_limited(awaitables, user_key=None):
+    """
+    Await coroutines concurrently with at most PER_USER_CONCURRENCY running per user, and
+    return their results in order. The first to raise cancels the rest and is re-raised.
+    """
+    semaphore = loop_semaphore(("user", user_key), PER_USER_CONCURRENCY)
+
+    async def _limited(awaitable):
+        async with semaphore:
+            return await awaitable
+
+    tasks = [asyncio.ensure_future(_limited(awaitable)) for awaitable in awaitables]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+class AsyncTrelloClient:
+    """Sends Trello API requests signed for one user's OAuth access token"""
+
+    def __init__(self, access_token, access_token_secret):
+        self.user_key = access_token
+        self._oauth = Client(
+            TRELLO_KEY,
+            client_secret=TRELLO_SECRET,
+            resource_owner_key=access_token,
+            resource_owner_secret=access_token_secret
+        )
+
+    async def request(self, method, path, params=None, headers=None):
+        """Send one signed request within the token's and the API key's rate limits"""
+        url = str(httpx.URL(f"{TRELLO_API_URL}{path}", params=params))
+        buckets = [trello_key_limiter.bucket(TRELLO_KEY), trello_token_limiter.bucket(self.user_key)]
+
+        def send():
+            # Signed per attempt, since the nonce and timestamp may not be reused
+            signed_url, signed_headers, _ = self._oauth.sign(url, http_method=method, headers=headers)
+            return http_client().request(method, signed_url, headers=signed_headers)
+
+        with upstream_span("trello", method, path) as call:
+            response = await send_with_retries(send, buckets, idempotent=method in ("GET", "HEAD"))
+            call.status = response.status_code
+        return response
+
+async def _get_json(client, path, params=None):
+    """Async trello.api._get_json, sharing its ETag store"""
+    cache_key = f"{client.user_key} {path}?{sorted((params or {}).items())}"
+
+    async def fetch():
+        counter = _call_counter.get()
+        if counter is not None:
+            counter.increment()
+        cached = upstream_etags.get(cache_key)
+        headers = {"If-None-Match": cached[0]} if cached else None
+
+        response = await client.request("GET", path, params=params, headers=headers)
+        if cached and response.status_code == 304:
+            return cached[1]
+        response.raise_for_status()
+
+        etag = response.headers.get("ETag")
+        if etag and len(response.content) <= UPSTREAM_ETAG_MAX_BYTES:
+            upstream_etags.set(cache_key, (etag, response.text))
+        return response.text
+
+    # Each caller decodes its own copy, since callers modify what they get back
+    return json.loads(await coalesce(cache_key, fetch))
+
+@traced()
+async def _resolve_members(client, member_ids):
+    """Look up member profiles in the shared cache and batch fetch the misses"""
+    # The member cache may be on disk
+    members, missing_ids = await asyncio.to_thread(_cached_members, member_ids)
+    if missing_ids:
+        missing_ids = sorted(missing_ids)
+        chunks = [missing_ids[start:start + BATCH_LIMIT] for start in range(0, len(missing_ids), BATCH_LIMIT)]
+        fetched = _batch_members(await gather_limited([
+            _get_json(client, "/batch", params={"urls": ",".join(f"/members/{member_id}" for member_id in chunk)})
+            for chunk in chunks
+        ], client.user_key))
+        await asyncio.to_thread(_cache_members, fetched)
+        members.update(fetched)
+    return members
+
+def _cached_members(member_ids):
+    """(profiles found in the member cache by id, ids missing from it)"""
+    members = {}
+    missing_ids = set()
+    for member_id in member_ids:
+        member = member_cache.get(member_id)
+        if member is None:
+            missing_ids.add(member_id)
+        else:
+            members[member_id] = member
+    return members, missing_ids
+
+def _cache_members(members):
+    for member_id, member in members.items():
+        member_cache.set(member_id, member)
+
+async def attach_members(client, cards):
+    """Set each card's members from its idMembers, resolving profiles through the member cache"""
+    members = await _resolve_members(client, {member_id for card in cards for member_id in card.get("idMembers", [])})
+    for card in cards:
+        if card.get("idMembers"):
+            card["members"] = [members[member_id] for member_id in card["idMembers"] if member_id in members]
+        else:
+            card.pop("members", None)
+
+async def get_boards(client):
+    """Get all boards for the authenticated user, sharing trello.api's boards cache"""
+    boards = boards_cache.get(client.user_key) if BOARDS_CACHE_TTL else None
+    if boards is None:
+        boards = await _get_json(client, "/members/me/boards", params={"fields": "name,id"})
+        if BOARDS_CACHE_TTL:
+            boards_cache.set(client.user_key, boards)
+    return boards
+
+@traced()
+async def fetch_board(client, board_id):
+    """Fetch a board with its lists, cards and card members; returns (board, lists, latest_action)"""
+    board = await _get_json(client, f"/boards/{board_id}", params=BOARD_PARAMS)
+    lists = board.pop("lists", [])
+    cards = board.pop("cards", [])
+    actions = board.pop("actions", [])
+    await attach_members(client, cards)
+    group_cards(lists, cards)
+    return board, lists, actions[0] if actions else None
+
+async def _get_card(client, card_id):
+    """Fetch one card, or None if it no longer exists"""
+    try:
+        card = await _get_json(client, f"/cards/{card_id}", params=CARD_PARAMS)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            return None
+        raise
+    return None if card.get("closed") else card
+
+async def _refetch(client, board_id, snapshot):
+    """Fetch the lists and cards a snapshot has marked dirty; returns None if a full fetch is needed"""
+    editor = _SnapshotEditor(snapshot)
+    if editor.lists_dirty:
+        editor.replace_lists(await _get_json(client, f"/boards/{board_id}/lists", params=LISTS_PARAMS))
+
+    card_ids = sorted(editor.dirty_cards)
+    cards = [card for card in await gather_limited([_get_card(client, card_id) for card_id in card_ids], client.user_key) if card is not None]
+    await attach_members(client, cards)
+    return _apply_refetched(editor, board_id, card_ids, cards)
+
+async def _full_sync(client, board_id, previous=None):
+    return await asyncio.to_thread(_store_fetched, board_id, await fetch_board(client, board_id), previous)
+
+async def _sync_from_trello(client, board_id, snapshot):
+    if snapshot is None:
+        return await _full_sync(client, board_id)
+
+    actions = await _get_json(client, f"/boards/{board_id}/actions", params=actions_params(snapshot))
+    if len(actions) >= ACTIONS_LIMIT:
+        return await _full_sync(client, board_id, snapshot)
+
+    actions = new_actions(snapshot, actions)
+    if not actions and is_clean(snapshot):
+        return await asyncio.to_thread(_confirm_current, board_id, snapshot)
+
+    previous = snapshot
+    snapshot = apply_actions(snapshot, actions)
+    if snapshot["stale"] or len(snapshot["dirty_cards"]) > MAX_CARD_REFETCH:
+        return await _full_sync(client, board_id, previous)
+    if snapshot["lists_dirty"] or snapshot["dirty_cards"]:
+        refetched = await _refetch(client, board_id, snapshot)
+        if refetched is None:
+            return await _full_sync(client, board_id, previous)
+        snapshot = refetched
+
+    snapshot["synced_at"] = time.time()
+    # Stores the snapshot, maybe on disk, and reindexes the board for search
+    await asyncio.to_thread(save_snapshot, board_id, snapshot)
+    return snapshot
+
+async def _acquire_thread_lock(lock):
+    """
+    Acquire a threading lock without blocking the loop. It is polled rather than waited on in
+    a thread, so a cancelled wait can't take the lock after its caller has gone.
+    """
+    delay = 0.001
+    while not lock.acquire(blocking=False):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+@traced()
+async def sync_snapshot(client, board_id):
+    """Async trello.snapshots.sync_snapshot: bring a board's stored snapshot up to date and return it"""
+    snapshot = await asyncio.to_thread(current_snapshot, board_id) if SNAPSHOTS_SHARED else None
+    if snapshot is not None and _is_live(snapshot, client.user_key, board_id):
+        return snapshot
+
+    # Concurrent loads of one board on this loop share a single sync
+    locks = _state().board_locks
+    lock = locks.get(board_id)
+    if lock is None:
+        lock = locks[board_id] = asyncio.Lock()
+    async with lock:
+        # and wait for syncs of it in threads (Flask routes, webhooks, precompute) to finish writing
+        thread_lock = board_lock(board_id)
+        await _acquire_thread_lock(thread_lock)
+        try:
+            snapshot = await _sync_from_trello(client, board_id, await asyncio.to_thread(snapshot_store.get, board_id))
+        finally:
+            thread_lock.release()
+    board_access.set(f"{client.user_key}:{board_id}", True)
+    return snapshot
+
+async def sync_board(client, board_id):
+    """Get (board, lists) for a board from its synced snapshot"""
+    snapshot = await sync_snapshot(client, board_id)
+    return snapshot["board"], snapshot["lists"]
@@ -0,0 +1,91 @@
+"""
+Async board reports for the ASGI entry point, sharing trello.agent's prompts and report cache
+"""
+import asyncio
+import json
+
+import httpx
+import requests
+
+from trello import agent
+from trello.aio import send_with_retries, http_client, loop_semaphore, coalesce, gather_limited
+from trello.prompts import build_merge_prompt
+from trello.ratelimit import gemini_limiter
+from trello.tracing import upstream_span
+
+async def _gemini_report_text(prompt):
+    """Sends a prompt to Gemini and returns the generated text, or None if the response has none"""
+    slot = loop_semaphore("gemini", agent.GEMINI_CONCURRENCY)
+    with upstream_span("gemini", "POST", "generateContent") as call:
+        response = await send_with_retries(lambda: http_client().post(
+            f"{agent.GEMINI_API_URL}?key={agent.GEMINI_API_KEY}",
+            json=agent._report_payload(prompt),
+            timeout=agent.GEMINI_TIMEOUT
+        ), [gemini_limiter.bucket(agent.GEMINI_API_KEY)], slot=slot, idempotent=False)
+        # The body has been read, so Gemini is done with it
+        slot.release()
+        call.status = response.status_code
+    response.raise_for_status()
+    return agent._response_text(response)
+
+async def _request_report_text(prompt):
+    """
+    Async trello.agent._request_report_text, returning (text, backend). Gemini is called on
+    the event loop; other backends, and the fallback when Gemini fails, run in a thread.
+    """
+    if not isinstance(agent.report_backend, agent.GeminiBackend) or agent.report_backend.missing_config():
+        return await asyncio.to_thread(agent._request_report_text, prompt)
+    try:
+        return await _gemini_report_text(prompt), agent.report_backend
+    except httpx.HTTPError as e:
+        if agent.fallback_backend is None:
+            raise
+        print(f"Report backend gemini failed, using {agent.fallback_backend.name}: {e}")
+        return await asyncio.to_thread(agent.fallback_backend.generate, prompt), agent.fallback_backend
+
+async def _map_reduce_prompt(board_data, metrics, list_prompts):
+    """Summarizes each list concurrently and returns the prompt that merges the summaries"""
+    summaries = await gather_limited([_request_report_text(list_prompt) for list_prompt in list_prompts], "report")
+    return build_merge_prompt(board_data, [agent._clean_markdown_formatting(summary or "") for summary, _ in summaries], metrics=metrics)
+
+async def generate_board_report(board_details_from_trello_api, refresh=False):
+    """
+    Async trello.agent.generate_board_report. Identical boards requested at once share one
+    Gemini call, and the report goes into the shared report cache.
+    """
+    problem = agent.report_backend_problem()
+    if problem:
+        return f"Error: {problem}"
+
+    # Metrics and prompt building are CPU work, and the report cache may be on disk, so both run in a thread
+    board_data, metrics, prompt, list_prompts = await asyncio.to_thread(agent._plan_report, board_details_from_trello_api)
+    cache_key = agent.report_cache_key(agent._model_input(prompt, list_prompts))
+    if agent.report_cache is not None and not refresh:
+        cached_report = await asyncio.to_thread(agent.report_cache.get, cache_key)
+        if cached_report is not None:
+            return cached_report
+
+    async def generate():
+        report_prompt = prompt
+        if list_prompts:
+            report_prompt = await _map_reduce_prompt(board_data, metrics, list_prompts)
+        report_text, backend = await _request_report_text(report_prompt)
+        if report_text is None:
+            return "Could not generate a board report due to unexpected API response structure."
+
+        clean_report = agent._clean_markdown_formatting(report_text)
+        if agent.report_cache is not None and backend is agent.report_backend:
+            await asyncio.to_thread(agent.report_cache.set, cache_key, clean_report)
+        return clean_report
+
+    try:
+        return await coalesce(("report", cache_key, refresh), generate)
+    except agent.BackendUnavailable as e:
+        print(f"Report backend unavailable: {e}")
+        return f"Error: {e}"
+    except (httpx.HTTPError, requests.exceptions.RequestException) as e:
+        print(f"Error calling Gemini API: {e}")
+        return f"Error: Could not connect to Gemini API to generate report. {e}"
+    except (KeyError, IndexError, json.JSONDecodeError) as e:
+        print(f"Error parsing Gemini API response: {e}")
+        return "Error: Could not parse the report from Gemini API response."
@@ -1,6 +1,14 @@
 from requests_oauthlib import OAuth1Session
 import os
 import json
+import threading
+import contextvars
+from trello.cache import make_cache, LRUCache
+from trello.workers import fetch_all
+from trello.pool import SessionPool
+from trello.ratelimit import send_with_retries, trello_token_limiter, trello_key_limiter, trello_requests
+from trello.tokens import save_token, consume_token
+from trello.tracing import traced, upstream_span
 
 # Trello configuration
 TRELLO_KEY = os.environ.get("TRELLO_KEY", "a2f217e66e60163384df3e891fd329a8")
@@ -9,24 +17,51 @@ REQUEST_TOKEN_URL = "https://trello.com/1/OAuthGetRequestToken"
 AUTHORIZE_URL = "https://trello.com/1/OAuthAuthorizeToken"
 ACCESS_TOKEN_URL = "https://trello.com/1/OAuthGetAccessToken"
 CALLBACK_URI = os.environ.get("TRELLO_CALLBACK_URI", "https://mihiryadav20.pythonanywhere.com/callback")
+# Point at a stand-in such as benchmarks/fake_upstream.py to run without Trello
+TRELLO_API_BASE = os.environ.get("TRELLO_API_BASE", "https://api.trello.com").rstrip("/")
+TRELLO_API_URL = f"{TRELLO_API_BASE}/1"
+# Seconds to wait for a connection to Trello, and for each read of its response
+TRELLO_CONNECT_TIMEOUT = float(os.environ.get("TRELLO_CONNECT_TIMEOUT", "5"))
+TRELLO_READ_TIMEOUT = float(os.environ.get("TRELLO_READ_TIMEOUT", "30"))
 
-# Directory for token storage
-TOKEN_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tokens")
-os.makedirs(TOKEN_DIR, exist_ok=True)
+# Fields requested for each object on a board
+BOARD_FIELDS = "name,desc,url"
+LIST_FIELDS = "name,id"
+CARD_FIELDS = "name,desc,due,dueComplete,labels,idMembers,idList,pos"
+# One nested call returns a board's open lists and cards, and its newest action as a sync watermark
+BOARD_PARAMS = {
+    "fields": BOARD_FIELDS,
+    "lists": "open",
+    "list_fields": LIST_FIELDS,
+    "cards": "open",
+    "card_fields": CARD_FIELDS,
+    "actions": "all",
+    "actions_limit": 1,
+    "action_fields": "date"
+}
 
-def save_token(oauth_token, token_data):
-    """Save token data to a file using oauth_token as the key"""
-    token_path = os.path.join(TOKEN_DIR, f"{oauth_token}.json")
-    with open(token_path, "w") as f:
-        json.dump(token_data, f)
+# Trello accepts at most 10 routes per /batch call
+BATCH_LIMIT = 10
 
-def get_token(oauth_token):
-    """Retrieve token data from a file using oauth_token as the key"""
-    token_path = os.path.join(TOKEN_DIR, f"{oauth_token}.json")
-    if os.path.exists(token_path):
-        with open(token_path, "r") as f:
-            return json.load(f)
-    return None
+# Member profiles are shared by every board and user in the worker process
+MEMBER_CACHE_SIZE = int(os.environ.get("MEMBER_CACHE_SIZE", "2048"))
+MEMBER_CACHE_TTL = int(os.environ.get("MEMBER_CACHE_TTL", "3600"))
+MEMBER_CACHE_PATH = os.environ.get("MEMBER_CACHE_PATH")
+
+member_cache = make_cache(MEMBER_CACHE_SIZE, ttl=MEMBER_CACHE_TTL, path=MEMBER_CACHE_PATH, table="members")
+
+# Board lists shown on the dashboard are reused per user for this many seconds (0 disables)
+BOARDS_CACHE_TTL = int(os.environ.get("BOARDS_CACHE_TTL", "60"))
+boards_cache = LRUCache(maxsize=4096, ttl=BOARDS_CACHE_TTL)
+
+# Responses that came with an ETag are kept so repeat requests can be revalidated with If-None-Match
+UPSTREAM_ETAG_CACHE_SIZE = int(os.environ.get("UPSTREAM_ETAG_CACHE_SIZE", "512"))
+# Larger bodies aren't worth holding in memory for revalidation
+UPSTREAM_ETAG_MAX_BYTES = 256 * 1024
+upstream_etags = LRUCache(maxsize=UPSTREAM_ETAG_CACHE_SIZE)
+
+# Signed sessions are reused per access token so page loads keep their connections warm
+trello_sessions = SessionPool()
 
 def get_request_token():
     """Get a request token from Trello"""
@@ -39,7 +74,7 @@ def get_request_token():
     fetch_response = oauth.fetch_request_token(REQUEST_TOKEN_URL)
     oauth_token = fetch_response["oauth_token"]
     
-    # Store tokens in file
+    # Keep the request token secret until Trello redirects back to /callback
     token_data = {
         "request_token": oauth_token,
         "request_token_secret": fetch_response["oauth_token_secret"]
@@ -54,10 +89,10 @@ def get_authorization_url(oauth_token):
 
 def get_access_token(oauth_token, oauth_verifier):
     """Get an access token from Trello"""
-    # Get tokens from file
-    token_data = get_token(oauth_token)
+    # A request token can finish exactly one login
+    token_data = consume_token(oauth_token)
     if not token_data:
-        raise ValueError(f"Could not find token data for oauth_token: {oauth_token}")
+        raise ValueError(f"Unknown, expired or already used oauth_token: {oauth_token}")
         
     request_token = token_data.get("request_token")
     request_token_secret = token_data.get("request_token_secret")
@@ -81,45 +116,200 @@ def get_access_token(oauth_token, oauth_verifier):
     return access_tokens["oauth_token"], access_tokens["oauth_token_secret"]
 
 def get_trello_client(access_token, access_token_secret):
-    """Get a Trello client using access tokens"""
-    return OAuth1Session(
+    """Get a pooled Trello client for the access tokens"""
+    return trello_sessions.get(access_token, lambda: OAuth1Session(
         TRELLO_KEY,
         client_secret=TRELLO_SECRET,
         resource_owner_key=access_token,
         resource_owner_secret=access_token_secret
-    )
+    ))
 
-def get_boards(trello):
-    """Get all boards for the authenticated user"""
-    response = trello.get("https://api.trello.com/1/members/me/boards?fields=name,id")
+class UpstreamCallCounter:
+    """Counts the Trello API calls made while handling a single page load"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.count += 1
+
+_call_counter = contextvars.ContextVar("trello_call_counter", default=None)
+
+def track_upstream_calls():
+    """Start counting Trello API calls for the current request and return the counter"""
+    counter = UpstreamCallCounter()
+    _call_counter.set(counter)
+    return counter
+
+def stop_tracking_upstream_calls():
+    """Stop counting at the end of a request, so later work on the same thread isn't counted against it"""
+    _call_counter.set(None)
+
+def _send(trello, method, path, params=None, headers=None):
+    """Send a Trello API request within the token's and the API key's rate limits, retrying 429s and 5xx"""
+    user_key = _user_key(trello)
+    buckets = [trello_key_limiter.bucket(TRELLO_KEY)]
+    if user_key:
+        buckets.append(trello_token_limiter.bucket(user_key))
+    send = getattr(trello, method)
+    with upstream_span("trello", method, path) as call:
+        response = send_with_retries(
+            lambda: send(
+                f"{TRELLO_API_URL}{path}", params=params, headers=headers,
+                timeout=(TRELLO_CONNECT_TIMEOUT, TRELLO_READ_TIMEOUT)
+            ),
+            buckets, idempotent=method == "get"
+        )
+        call.status = response.status_code
+    return response
+
+def _get_json(trello, path, params=None):
+    """
+    GET a Trello API path, raise on HTTP errors and return the decoded JSON. Identical requests
+    in flight at once share one upstream call, and responses with an ETag are revalidated on
+    the next identical request, where a 304 reuses the stored body.
+    """
+    cache_key = f"{_user_key(trello)} {path}?{sorted((params or {}).items())}"
+
+    def fetch():
+        counter = _call_counter.get()
+        if counter is not None:
+            counter.increment()
+        cached = upstream_etags.get(cache_key)
+        headers = {"If-None-Match": cached[0]} if cached else None
+
+        response = _send(trello, "get", path, params=params, headers=headers)
+        if cached and response.status_code == 304:
+            return cached[1]
+        response.raise_for_status()
+
+        etag = response.headers.get("ETag")
+        if etag and len(response.content) <= UPSTREAM_ETAG_MAX_BYTES:
+            upstream_etags.set(cache_key, (etag, response.text))
+        return response.text
+
+    # Each caller decodes its own copy, since callers modify what they get back
+    return json.loads(trello_requests.do(cache_key, fetch))
+
+def _post_json(trello, path, params=None):
+    """POST to a Trello API path, raise on HTTP errors and return the decoded JSON"""
+    counter = _call_counter.get()
+    if counter is not None:
+        counter.increment()
+    response = _send(trello, "post", path, params=params)
     response.raise_for_status()
     return response.json()
 
+def _user_key(trello):
+    """Identify the Trello user behind a client, used for per-user concurrency limits"""
+    client = getattr(getattr(trello, "auth", None), "client", None)
+    return getattr(client, "resource_owner_key", None)
+
+def _batch_get_members(trello, member_ids):
+    """Fetch member profiles through /batch, packing up to BATCH_LIMIT lookups per call"""
+    member_ids = sorted(member_ids)
+    chunks = [member_ids[start:start + BATCH_LIMIT] for start in range(0, len(member_ids), BATCH_LIMIT)]
+    # Nested routes can't carry comma separated fields, so trim the full profile instead
+    calls = [
+        lambda chunk=chunk: _get_json(trello, "/batch", params={"urls": ",".join(f"/members/{member_id}" for member_id in chunk)})
+        for chunk in chunks
+    ]
+
+    return _batch_members(fetch_all(calls, user_key=_user_key(trello)))
+
+def _batch_members(batch_results):
+    """Member profiles by id from /batch results, trimmed to the fields cards show"""
+    members = {}
+    for results in batch_results:
+        for result in results:
+            member = result.get("200")
+            if member:
+                members[member["id"]] = {
+                    "id": member["id"],
+                    "fullName": member.get("fullName"),
+                    "username": member.get("username")
+                }
+    return members
+
+@traced()
+def _resolve_members(trello, member_ids):
+    """Look up member profiles in the shared cache and batch fetch the misses"""
+    members = {}
+    missing_ids = set()
+    for member_id in member_ids:
+        member = member_cache.get(member_id)
+        if member is None:
+            missing_ids.add(member_id)
+        else:
+            members[member_id] = member
+
+    if missing_ids:
+        fetched = _batch_get_members(trello, missing_ids)
+        for member_id, member in fetched.items():
+            member_cache.set(member_id, member)
+        members.update(fetched)
+    return members
+
+def get_boards(trello):
+    """Get all boards for the authenticated user, reusing the list fetched in the last BOARDS_CACHE_TTL seconds"""
+    user_key = _user_key(trello)
+    boards = boards_cache.get(user_key) if user_key and BOARDS_CACHE_TTL else None
+    if boards is None:
+        boards = _get_json(trello, "/members/me/boards", params={"fields": "name,id"})
+        if user_key and BOARDS_CACHE_TTL:
+            boards_cache.set(user_key, boards)
+    return boards
+
+def create_webhook(trello, model_id, callback_url, description=None):
+    """Ask Trello to POST changes to model_id (a board, list or card) to callback_url"""
+    params = {"idModel": model_id, "callbackURL": callback_url}
+    if description:
+        params["description"] = description
+    return _post_json(trello, "/webhooks", params=params)
+
+def get_token_webhooks(trello):
+    """List the webhooks registered with the client's token"""
+    return _get_json(trello, f"/tokens/{_user_key(trello)}/webhooks")
+
+def attach_members(trello, cards):
+    """Set each card's members from its idMembers, resolving profiles through the member cache"""
+    members = _resolve_members(trello, {member_id for card in cards for member_id in card.get("idMembers", [])})
+    for card in cards:
+        if card.get("idMembers"):
+            card["members"] = [members[member_id] for member_id in card["idMembers"] if member_id in members]
+        else:
+            card.pop("members", None)
+
+@traced()
+def fetch_board(trello, board_id):
+    """
+    Fetch a board with its lists, cards and card members in a single nested call.
+    Returns (board, lists, latest_action), where latest_action is the board's newest
+    action ({"id", "date"}) or None, for use as an incremental sync watermark.
+    """
+    board = _get_json(trello, f"/boards/{board_id}", params=BOARD_PARAMS)
+    lists = board.pop("lists", [])
+    cards = board.pop("cards", [])
+    actions = board.pop("actions", [])
+
+    # Card members come from the shared member cache, misses are fetched in batches
+    attach_members(trello, cards)
+    group_cards(lists, cards)
+    return board, lists, actions[0] if actions else None
+
+def group_cards(lists, cards):
+    """Set each list's cards, keeping Trello's card order within each list"""
+    cards_by_list = {trello_list["id"]: [] for trello_list in lists}
+    for card in sorted(cards, key=lambda card: card.get("pos", 0)):
+        if card.get("idList") in cards_by_list:
+            cards_by_list[card["idList"]].append(card)
+
+    for trello_list in lists:
+        trello_list["cards"] = cards_by_list[trello_list["id"]]
+
 def get_board_details(trello, board_id):
     """Get details for a specific board"""
-    # Fetch board details
-    board_response = trello.get(f"https://api.trello.com/1/boards/{board_id}?fields=name,desc,url")
-    board_response.raise_for_status()
-    board = board_response.json()
-    
-    # Fetch lists on the board
-    lists_response = trello.get(f"https://api.trello.com/1/boards/{board_id}/lists?fields=name,id")
-    lists_response.raise_for_status()
-    lists = lists_response.json()
-    
-    # Fetch cards for each list
-    for trello_list in lists:
-        cards_response = trello.get(f"https://api.trello.com/1/lists/{trello_list['id']}/cards?fields=name,desc,due,labels,idMembers")
-        cards_response.raise_for_status()
-        trello_list['cards'] = cards_response.json()
-        
-        # Get member details for each card
-        for card in trello_list['cards']:
-            if card.get('idMembers'):
-                card['members'] = []
-                for member_id in card['idMembers']:
-                    member_response = trello.get(f"https://api.trello.com/1/members/{member_id}?fields=fullName,username")
-                    member_response.raise_for_status()
-                    card['members'].append(member_response.json())
-    
+    board, lists, _ = fetch_board(trello, board_id)
     return board, lists
@@ -0,0 +1,319 @@
+"""
+Report backends turn report prompts into text. trello.agent picks one with REPORT_BACKEND:
+Gemini's API ("gemini", in trello.agent) or Llama 2 running on this machine's CPU ("local").
+"""
+import importlib.util
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from trello.prompts import CHARS_PER_TOKEN, PROMPT_TOKEN_BUDGET, estimate_tokens
+
+# Hugging Face model id and the cache directory holding its snapshot
+LOCAL_MODEL_ID = os.environ.get("LOCAL_MODEL_ID", "meta-llama/Llama-2-7b-chat-hf")
+LOCAL_MODEL_DIR = os.environ.get("LOCAL_MODEL_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "models", "llama2"))
+# Weights: "int8" (linear layers quantized, about 7 GB for 7B), "bf16" (about 14 GB) or "fp32" (about 27 GB)
+LOCAL_MODEL_QUANTIZE = os.environ.get("LOCAL_MODEL_QUANTIZE", "int8")
+# Model context in tokens, and how many of them a report may use
+LOCAL_CONTEXT_TOKENS = int(os.environ.get("LOCAL_CONTEXT_TOKENS", "4096"))
+LOCAL_MAX_NEW_TOKENS = int(os.environ.get("LOCAL_MAX_NEW_TOKENS", "1024"))
+# Concurrent reports sharing one forward pass, and how long the first waits for company
+LOCAL_BATCH_SIZE = int(os.environ.get("LOCAL_BATCH_SIZE", "4"))
+LOCAL_BATCH_WAIT_MS = float(os.environ.get("LOCAL_BATCH_WAIT_MS", "50"))
+# CPU threads for inference (0 lets torch decide)
+LOCAL_THREADS = int(os.environ.get("LOCAL_THREADS", "0"))
+# Characters per Llama 2 token assumed when sizing prompts; card tables of names, dates and
+# ids tokenize well below the 4 of plain English. Prompts are counted exactly once the tokenizer loads.
+LOCAL_CHARS_PER_TOKEN = float(os.environ.get("LOCAL_CHARS_PER_TOKEN", "2.5"))
+
+# Room kept for the chat template and system instruction around a prompt
+_TEMPLATE_TOKENS = 256
+
+class BackendUnavailable(Exception):
+    """A backend can't generate reports, e.g. its model isn't installed"""
+
+class ReportBackend:
+    """Turns report prompts into text"""
+    name = None
+    # Part of the report cache key, so reports from different models aren't mixed up
+    cache_id = None
+    # Token budget for one prompt, or None for trello.prompts.PROMPT_TOKEN_BUDGET
+    prompt_token_budget = None
+    # Characters per token that prompts are sized with
+    chars_per_token = CHARS_PER_TOKEN
+
+    def missing_config(self):
+        """Why this backend can't be used, or None if it can"""
+        return None
+
+    def fits(self, prompt):
+        """Whether a prompt fits the prompt token budget"""
+        return estimate_tokens(prompt, self.chars_per_token) <= (self.prompt_token_budget or PROMPT_TOKEN_BUDGET)
+
+    def generate(self, prompt):
+        """The generated text for a prompt, or None if the backend returned none"""
+        raise NotImplementedError
+
+    def stream(self, prompt):
+        """Yield the generated text for a prompt in pieces as it is produced"""
+        text = self.generate(prompt)
+        if text:
+            yield text
+
+    def warm(self):
+        """Get ready to serve the first report quickly"""
+
+class MicroBatcher:
+    """
+    Groups calls made at about the same time from different threads into one call of
+    fn(items), which returns a result per item. A batch runs once it has max_batch items
+    or max_wait seconds after its first item arrived.
+    """
+
+    def __init__(self, fn, max_batch, max_wait):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        """Add item to the next batch and wait for its result"""
+        future = Future()
+        self._queue.put((item, future))
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._worker.start()
+        return future.result()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = self.fn([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0
+        }
+
+class LocalLlamaBackend(ReportBackend):
+    """
+    Llama 2 chat on the CPU through transformers. The model is loaded once per process,
+    and concurrent reports are generated together in micro-batches. Streamed reports are
+    generated one at a time, outside the batches.
+    """
+    name = "local"
+    chars_per_token = LOCAL_CHARS_PER_TOKEN
+
+    def __init__(self, system_instruction, model_id=LOCAL_MODEL_ID, model_dir=LOCAL_MODEL_DIR, quantize=LOCAL_MODEL_QUANTIZE):
+        self.system_instruction = system_instruction.strip()
+        self.model_id = model_id
+        self.model_dir = model_dir
+        self.quantize = quantize
+        self.cache_id = f"local:{model_id}:{quantize}"
+        self.prompt_token_budget = LOCAL_CONTEXT_TOKENS - LOCAL_MAX_NEW_TOKENS - _TEMPLATE_TOKENS
+        self._model = None
+        self._tokenizer = None
+        self._template_tokens = None
+        self._load_lock = threading.Lock()
+        # One generation at a time, whether a batch or a stream; they'd only slow each other down
+        self._generate_lock = threading.Lock()
+        self._batcher = MicroBatcher(self._generate_batch, LOCAL_BATCH_SIZE, LOCAL_BATCH_WAIT_MS / 1000)
+
+    def missing_config(self):
+        for module in ("torch", "transformers"):
+            if importlib.util.find_spec(module) is None:
+                return f"The local report backend needs {module} installed (pip install torch transformers)."
+        return None
+
+    def _load_tokenizer(self):
+        """Load the tokenizer, once per process; it loads in a moment, unlike the model"""
+        with self._load_lock:
+            if self._tokenizer is not None:
+                return
+            problem = self.missing_config()
+            if problem:
+                raise BackendUnavailable(problem)
+
+            from transformers import AutoTokenizer
+
+            try:
+                tokenizer = AutoTokenizer.from_pretrained(self.model_id, cache_dir=self.model_dir, local_files_only=True)
+            except OSError as e:
+                raise BackendUnavailable(f"Could not load {self.model_id} from {self.model_dir}: {e}")
+            # Batched prompts are padded on the left so every row ends where generation starts
+            tokenizer.padding_side = "left"
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.unk_token or tokenizer.eos_token
+            self._template_tokens = len(tokenizer(self._chat_prompt(""))["input_ids"])
+            self._tokenizer = tokenizer
+
+    def _load(self):
+        """Load the tokenizer and model, once per process"""
+        self._load_tokenizer()
+        with self._load_lock:
+            if self._model is not None:
+                return
+
+            import torch
+            from transformers import AutoModelForCausalLM
+
+            if LOCAL_THREADS:
+                torch.set_num_threads(LOCAL_THREADS)
+            started = time.time()
+            try:
+                model = AutoModelForCausalLM.from_pretrained(
+                    self.model_id,
+                    cache_dir=self.model_dir,
+                    local_files_only=True,
+                    torch_dtype=torch.bfloat16 if self.quantize == "bf16" else torch.float32,
+                    low_cpu_mem_usage=True
+                )
+            except OSError as e:
+                raise BackendUnavailable(f"Could not load {self.model_id} from {self.model_dir}: {e}")
+
+            if self.quantize == "int8":
+                # Dynamic quantization: int8 weights for every linear layer, activations stay float.
+                # It starts from the fp32 model, so loading briefly needs the fp32 model's memory.
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            model.eval()
+            self._model = model
+            print(f"Loaded {self.model_id} ({self.quantize}) in {time.time() - started:.1f}s")
+
+    def _prompt_room(self):
+        """Tokens a prompt may use around the chat template, leaving room for the report"""
+        return LOCAL_CONTEXT_TOKENS - LOCAL_MAX_NEW_TOKENS - self._template_tokens
+
+    def _prompt_tokens(self, prompt):
+        return self._tokenizer(prompt.strip(), add_special_tokens=False)["input_ids"]
+
+    def fits(self, prompt):
+        """Whether a prompt fits the context, counted with the model's tokenizer when it can be loaded"""
+        try:
+            self._load_tokenizer()
+        except BackendUnavailable:
+            return super().fits(prompt)
+        return len(self._prompt_tokens(prompt)) <= self._prompt_room()
+
+    def _fit_prompt(self, prompt):
+        """
+        The prompt, cut in the middle if it is still too long for the context. Boards that don't
+        fit are map-reduced, so this only catches a single list too long even at the least detail.
+        Cutting here rather than in the tokenizer keeps the system instruction and [/INST].
+        """
+        tokens = self._prompt_tokens(prompt)
+        room = self._prompt_room()
+        if len(tokens) <= room:
+            return prompt
+        # Keep the header and metrics at the start and the instructions at the end
+        tail = room // 4
+        head = room - tail - 8
+        print(f"Local report prompt of {len(tokens)} tokens cut to {room}")
+        return self._tokenizer.decode(tokens[:head]) + "\n...\n" + self._tokenizer.decode(tokens[-tail:])
+
+    def _chat_prompt(self, prompt):
+        # Llama 2 chat format; the tokenizer adds the leading <s>
+        return f"[INST] <<SYS>>\n{self.system_instruction}\n<</SYS>>\n\n{prompt.strip()} [/INST]"
+
+    def _encode(self, prompts):
+        return self._tokenizer(
+            [self._chat_prompt(self._fit_prompt(prompt)) for prompt in prompts],
+            return_tensors="pt",
+            padding=True
+        )
+
+    def _generate_batch(self, prompts):
+        """Generate the reports for a batch of prompts in shared forward passes"""
+        self._load()
+        import torch
+
+        inputs = self._encode(prompts)
+        started = time.time()
+        with self._generate_lock, torch.inference_mode():
+            output = self._model.generate(
+                **inputs,
+                max_new_tokens=LOCAL_MAX_NEW_TOKENS,
+                do_sample=False,
+                pad_token_id=self._tokenizer.pad_token_id
+            )
+        # Drop the prompt tokens; with left padding every row's prompt has the same length
+        texts = self._tokenizer.batch_decode(output[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+        print(f"Generated {len(prompts)} local reports in {time.time() - started:.1f}s")
+        return [text.strip() or None for text in texts]
+
+    def generate(self, prompt):
+        return self._batcher.submit(prompt)
+
+    def stream(self, prompt):
+        """Yield the report as the model writes it, through transformers' TextIteratorStreamer"""
+        self._load()
+        import torch
+        from transformers import TextIteratorStreamer
+
+        inputs = self._encode([prompt])
+        streamer = TextIteratorStreamer(self._tokenizer, skip_prompt=True, skip_special_tokens=True)
+        failed = []
+
+        def generate():
+            try:
+                with self._generate_lock, torch.inference_mode():
+                    self._model.generate(
+                        **inputs,
+                        streamer=streamer,
+                        max_new_tokens=LOCAL_MAX_NEW_TOKENS,
+                        do_sample=False,
+                        pad_token_id=self._tokenizer.pad_token_id
+                    )
+            except Exception as e:
+                failed.append(e)
+                # Ends the iteration below, which would otherwise wait for text forever
+                streamer.end()
+
+        threading.Thread(target=generate, name="local-stream", daemon=True).start()
+        for text in streamer:
+            if text:
+                yield text
+        if failed:
+            raise failed[0]
+
+    def warm(self):
+        """Load the model in the background, so the server starts while it loads"""
+        def load():
+            try:
+                self._load()
+            except BackendUnavailable as e:
+                print(f"Local report backend not available: {e}")
+        threading.Thread(target=load, name="local-model-warmup", daemon=True).start()
+
+    def stats(self):
+        return dict(self._batcher.stats(), loaded=self._model is not None, model=self.model_id, quantize=self.quantize)
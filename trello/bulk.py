@@ -0,0 +1,133 @@
+"""
+Summaries for many boards at once, produced concurrently and yielded as each board finishes
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from trello.api import get_boards, get_trello_client
+from trello.snapshots import sync_snapshot, snapshot_fingerprint
+from trello import agent
+
+# Boards synced and reported at once per bulk run; Gemini calls are capped by GEMINI_CONCURRENCY
+BULK_BOARD_WORKERS = int(os.environ.get("BULK_BOARD_WORKERS", "8"))
+# Most boards accepted by one bulk request
+BULK_MAX_BOARDS = int(os.environ.get("BULK_MAX_BOARDS", "500"))
+# Seconds to wait for one board's report before reporting it as failed
+BULK_REPORT_TIMEOUT = float(os.environ.get("BULK_REPORT_TIMEOUT", "300"))
+
+def _error_message(e):
+    response = getattr(e, "response", None)
+    if response is not None:
+        return f"Trello API error: {response.status_code}"
+    return str(e)
+
+def _summarize(trello, board_id, refresh):
+    """Sync one board and wait for its report, returning a result line"""
+    started = time.time()
+    try:
+        snapshot = sync_snapshot(trello, board_id)
+        board, lists = snapshot["board"], snapshot["lists"]
+        # The prompt is planned at most once for both the cache check and the job
+        content = snapshot_fingerprint(snapshot)
+        cached = not refresh and agent.get_cached_board_report((board, lists), content) is not None
+        if refresh:
+            report = agent.generate_board_report((board, lists), refresh=True)
+        else:
+            # Identical boards, and boards already being reported elsewhere, share one job
+            job = agent.start_board_report((board, lists), content)
+            if not job.wait(BULK_REPORT_TIMEOUT):
+                raise TimeoutError(f"Report not ready after {BULK_REPORT_TIMEOUT:.0f}s")
+            if job.status == "error":
+                raise RuntimeError(job.error)
+            report = job.result
+        if report.startswith("Error:"):
+            raise RuntimeError(report)
+        return {
+            "board_id": board_id,
+            "name": board.get("name"),
+            "status": "ok",
+            "cached": cached,
+            "report": report,
+            "elapsed_ms": round((time.time() - started) * 1000)
+        }
+    except Exception as e:
+        print(f"Bulk summary failed for board {board_id}: {str(e)}")
+        return {
+            "board_id": board_id,
+            "status": "error",
+            "error": _error_message(e),
+            "elapsed_ms": round((time.time() - started) * 1000)
+        }
+
+def resolve_board_ids(trello, board_ids=None, all_boards=False):
+    """The requested board ids without duplicates, or every board the user can see"""
+    if all_boards:
+        board_ids = [board["id"] for board in get_boards(trello)]
+    return list(dict.fromkeys(board_ids or []))
+
+def summarize_boards(trello, board_ids, refresh=False, workers=None):
+    """
+    Yields one result dict per board as soon as it finishes, then a final {"done": true, ...} summary.
+    Boards are synced through the shared snapshot, member and session caches, and their reports
+    go through the report cache and job runner, so unchanged boards cost no Gemini call.
+    """
+    started = time.time()
+    counts = {"ok": 0, "error": 0, "cached": 0}
+    executor = ThreadPoolExecutor(max_workers=min(workers or BULK_BOARD_WORKERS, max(len(board_ids), 1)), thread_name_prefix="bulk")
+    futures = [executor.submit(_summarize, trello, board_id, refresh) for board_id in board_ids]
+    try:
+        for future in as_completed(futures):
+            result = future.result()
+            counts[result["status"]] += 1
+            counts["cached"] += bool(result.get("cached"))
+            yield result
+    finally:
+        # A client that stops reading cancels the boards not yet started
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    yield {
+        "done": True,
+        "boards": len(board_ids),
+        "ok": counts["ok"],
+        "errors": counts["error"],
+        "cached": counts["cached"],
+        "elapsed_ms": round((time.time() - started) * 1000)
+    }
+
+def to_ndjson(results):
+    """Encode results as newline-delimited JSON"""
+    for result in results:
+        yield json.dumps(result) + "\n"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize many Trello boards and write the reports as NDJSON")
+    parser.add_argument("board_ids", nargs="*", help="board ids to summarize")
+    parser.add_argument("--all", action="store_true", help="summarize every board the user can see")
+    parser.add_argument("--refresh", action="store_true", help="regenerate reports instead of using cached ones")
+    parser.add_argument("--workers", type=int, default=BULK_BOARD_WORKERS)
+    parser.add_argument("--output", help="file to write to instead of stdout")
+    args = parser.parse_args()
+
+    access_token = os.environ.get("TRELLO_ACCESS_TOKEN")
+    access_token_secret = os.environ.get("TRELLO_ACCESS_TOKEN_SECRET")
+    if not access_token or not access_token_secret:
+        parser.error("set TRELLO_ACCESS_TOKEN and TRELLO_ACCESS_TOKEN_SECRET to a user's OAuth access token")
+    if not args.board_ids and not args.all:
+        parser.error("give board ids or --all")
+
+    trello = get_trello_client(access_token, access_token_secret)
+    board_ids = resolve_board_ids(trello, args.board_ids, args.all)
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for line in to_ndjson(summarize_boards(trello, board_ids, refresh=args.refresh, workers=args.workers)):
+            output.write(line)
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
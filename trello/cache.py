@@ -0,0 +1,252 @@
+"""
+Caches shared across requests within a worker process, optionally backed by
+a local SQLite file so that several workers can share warm entries
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+def _json_default(value):
+    """Encode objects that know their JSON form, such as compact board records"""
+    to_json = getattr(value, "to_json", None)
+    if to_json is None:
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return to_json()
+
+class LRUCache:
+    """
+    Thread-safe in-memory cache with a size cap, LRU eviction and an optional TTL.
+    prepare, if given, turns values into the form they are kept in (e.g. a more compact one).
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, prepare=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.prepare = prepare
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value, expires_at = self._data.get(key, (_MISSING, None))
+            if value is not _MISSING:
+                if expires_at is None or expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        if self.prepare is not None:
+            value = self.prepare(value)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def sweep(self):
+        """Delete expired entries and return how many were removed"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]
+            for key in expired:
+                del self._data[key]
+        return len(expired)
+
+    def keys(self):
+        """Keys of the entries that haven't expired"""
+        now = time.time()
+        with self._lock:
+            return [key for key, (_, expires_at) in self._data.items() if expires_at is None or expires_at > now]
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize
+        }
+
+class SQLiteCache:
+    """Cache storing JSON values in a local SQLite file shared between worker processes"""
+
+    def __init__(self, path, ttl=None, table="cache"):
+        self.path = path
+        self.ttl = ttl
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+
+    def _connect(self):
+        """Return this thread's connection, reopening it after a fork"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        value, _ = self.get_with_expiry(key, default)
+        return value
+
+    def get_with_expiry(self, key, default=None):
+        """(value, expires_at) for a key, or (default, None) if it is missing or expired"""
+        row = self._connect().execute(
+            f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            self.misses += 1
+            return default, None
+        self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        self._connect().execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value, separators=(",", ":"), default=_json_default), expires_at)
+        )
+
+    def delete(self, key):
+        self._connect().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connect().execute(f"DELETE FROM {self.table}")
+
+    def sweep(self):
+        """Delete expired entries and return how many were removed"""
+        cursor = self._connect().execute(
+            f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        )
+        return cursor.rowcount
+
+    def keys(self):
+        """Keys of the entries that haven't expired"""
+        rows = self._connect().execute(
+            f"SELECT key FROM {self.table} WHERE expires_at IS NULL OR expires_at > ?", (time.time(),)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def __len__(self):
+        return self._connect().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self), "path": self.path}
+
+class TieredCache:
+    """In-memory LRU in front of a shared on-disk cache"""
+
+    def __init__(self, memory, disk):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is _MISSING:
+            value, expires_at = self.disk.get_with_expiry(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            # The memory copy expires with the disk entry, not a full TTL from now
+            self.memory.set(key, value, ttl=None if expires_at is None else max(expires_at - time.time(), 0.001))
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.memory.set(key, value, ttl)
+        self.disk.set(key, value, ttl)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
+
+    def keys(self):
+        return self.disk.keys()
+
+    def __len__(self):
+        return len(self.disk)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats()
+        }
+
+class Sweeper:
+    """Daemon thread that periodically deletes a cache's expired entries, restarted in forked workers"""
+
+    def __init__(self, store, interval, name="cache-sweeper"):
+        self.store = store
+        self.interval = interval
+        self.name = name
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self):
+        if self._pid == os.getpid() or not self.interval:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name=self.name, daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                removed = self.store.sweep()
+                if removed:
+                    print(f"{self.name}: swept {removed} expired entries")
+            except Exception as e:
+                print(f"{self.name}: sweep failed: {str(e)}")
+
+def make_cache(maxsize, ttl=None, path=None, table="cache", prepare=None):
+    """Build an in-memory LRU cache, tiered over SQLite when a path is given"""
+    memory = LRUCache(maxsize=maxsize, ttl=ttl, prepare=prepare)
+    if path:
+        return TieredCache(memory, SQLiteCache(path, ttl=ttl, table=table))
+    return memory
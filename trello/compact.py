@@ -0,0 +1,280 @@
+"""
+Compact board snapshots for the in-memory snapshot store. Cards and lists are kept as
+__slots__ records that read like the dicts they replace (they are read-only Mappings), label
+and member profiles are kept once per board in tables the cards refer to by index, and long
+descriptions are held compressed and decoded when read.
+"""
+import operator
+import os
+import threading
+import zlib
+from collections.abc import Mapping
+
+# Descriptions at least this many characters long are stored zlib-compressed. Every board
+# page read of such a card decompresses it, so only long descriptions are worth it.
+COMPACT_DESC_MIN = int(os.environ.get("COMPACT_DESC_MIN", "1000"))
+
+# Stands in for a key the original dict didn't have
+_ABSENT = object()
+
+class BoardTables:
+    """
+    The labels, member ids and member profiles of one board, shared by the cards of its
+    snapshots. Entries are only ever added, so records already made keep reading the same
+    values as the board changes, and unchanged cards carry over to the next snapshot as is.
+    """
+
+    def __init__(self):
+        self.labels = []
+        self.member_ids = []
+        # Parallel to member_ids: the member's profile, or None if no card has shown it yet
+        self.profiles = []
+        self._label_index = {}
+        self._member_index = {}
+        self._strings = {}
+        self.lock = threading.Lock()
+
+    def label(self, label):
+        """Index of a label dict, or None if it can't be interned"""
+        try:
+            key = tuple(sorted(label.items()))
+            index = self._label_index.get(key)
+        except TypeError:
+            return None
+        if index is None:
+            index = self._label_index[key] = len(self.labels)
+            self.labels.append(label)
+        return index
+
+    def member(self, member_id):
+        index = self._member_index.get(member_id)
+        if index is None:
+            index = self._member_index[member_id] = len(self.member_ids)
+            self.member_ids.append(member_id)
+            self.profiles.append(None)
+        return index
+
+    def string(self, value):
+        """One shared copy of a string repeated across cards, such as a list id"""
+        return self._strings.setdefault(value, value)
+
+class _TablesOutdated(Exception):
+    """A member's profile changed, so the board's tables can't describe the new snapshot"""
+
+def _encode_desc(desc):
+    if isinstance(desc, str) and len(desc) >= COMPACT_DESC_MIN:
+        data = zlib.compress(desc.encode("utf-8"))
+        if len(data) < len(desc):
+            return data
+    return desc
+
+# Readers below return the value the card dict had for a key, or _ABSENT if it had none
+
+def _read_desc(card):
+    desc = card._desc
+    return zlib.decompress(desc).decode("utf-8") if type(desc) is bytes else desc
+
+def _read_labels(card):
+    labels = card._labels
+    if type(labels) is tuple:
+        table = card._tables.labels
+        return [table[index] for index in labels]
+    return labels
+
+def _read_id_members(card):
+    member_ids = card._id_members
+    if type(member_ids) is tuple:
+        table = card._tables.member_ids
+        return [table[index] for index in member_ids]
+    return member_ids
+
+def _read_members(card):
+    if card._members is True:
+        profiles = card._tables.profiles
+        return [profiles[index] for index in card._id_members]
+    return card._members
+
+# Card keys stored in their own slot
+_CARD_SLOTS = {
+    "id": "_id", "name": "_name", "desc": "_desc", "due": "_due", "dueComplete": "_due_complete",
+    "labels": "_labels", "idMembers": "_id_members", "members": "_members", "idList": "_id_list", "pos": "_pos"
+}
+_CARD_READERS = dict(
+    {key: operator.attrgetter(slot) for key, slot in _CARD_SLOTS.items()},
+    desc=_read_desc, labels=_read_labels, idMembers=_read_id_members, members=_read_members
+)
+
+class CompactCard(Mapping):
+    """A card record that reads like the card dict it was made from"""
+    __slots__ = ("_tables", "_extra") + tuple(_CARD_SLOTS.values())
+
+    def __init__(self, tables):
+        self._tables = tables
+        # Keys without a slot of their own, e.g. idBoard on refetched cards
+        self._extra = None
+        self._id = self._name = self._desc = self._due = self._due_complete = _ABSENT
+        self._labels = self._id_members = self._members = self._id_list = self._pos = _ABSENT
+
+    def get(self, key, default=None):
+        read = _CARD_READERS.get(key)
+        if read is None:
+            return self._extra.get(key, default) if self._extra else default
+        value = read(self)
+        return default if value is _ABSENT else value
+
+    def __getitem__(self, key):
+        value = self.get(key, _ABSENT)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        slot = _CARD_SLOTS.get(key)
+        if slot is None:
+            return bool(self._extra) and key in self._extra
+        return getattr(self, slot) is not _ABSENT
+
+    def __iter__(self):
+        for key, slot in _CARD_SLOTS.items():
+            if getattr(self, slot) is not _ABSENT:
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"CompactCard({dict(self)!r})"
+
+    def to_json(self):
+        return dict(self)
+
+class CompactList(Mapping):
+    """A list record that reads like the list dict it was made from; its cards are a tuple of CompactCards"""
+    __slots__ = ("_id", "_name", "_cards", "_extra")
+
+    def __init__(self, trello_list, cards):
+        self._id = trello_list.get("id", _ABSENT)
+        self._name = trello_list.get("name", _ABSENT)
+        self._cards = cards
+        extra = {key: value for key, value in trello_list.items() if key not in ("id", "name", "cards")}
+        self._extra = extra or None
+
+    def _fields(self):
+        yield "id", self._id
+        yield "name", self._name
+        yield "cards", self._cards
+
+    def get(self, key, default=None):
+        if key == "cards":
+            return self._cards
+        if key == "id":
+            value = self._id
+        elif key == "name":
+            value = self._name
+        else:
+            return self._extra.get(key, default) if self._extra else default
+        return default if value is _ABSENT else value
+
+    def __getitem__(self, key):
+        value = self.get(key, _ABSENT)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for key, value in self._fields():
+            if value is not _ABSENT:
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"CompactList({dict(self)!r})"
+
+    def to_json(self):
+        return dict(self)
+
+def _compact_members(members, id_members, tables, strict):
+    """True when a card's members are the profiles of its idMembers, in order, else the list itself"""
+    if type(id_members) is not tuple or not isinstance(members, list) or len(members) != len(id_members):
+        return members
+    for index, member in zip(id_members, members):
+        if not isinstance(member, dict) or member.get("id") != tables.member_ids[index]:
+            return members
+        known = tables.profiles[index]
+        if known is None:
+            tables.profiles[index] = member
+        elif known != member:
+            if strict:
+                raise _TablesOutdated()
+            return members
+    return True
+
+def _compact_card(card, tables, strict):
+    if isinstance(card, CompactCard):
+        if card._tables is tables:
+            return card
+        card = dict(card)
+    record = CompactCard(tables)
+    extra = {}
+    for key, value in card.items():
+        slot = _CARD_SLOTS.get(key)
+        if slot is None:
+            extra[key] = value
+        elif key == "desc":
+            record._desc = _encode_desc(value)
+        elif key == "labels":
+            indexes = [tables.label(label) if isinstance(label, dict) else None for label in value] if isinstance(value, list) else [None]
+            record._labels = value if None in indexes else tuple(indexes)
+        elif key == "idMembers":
+            record._id_members = tuple(tables.member(member_id) for member_id in value) \
+                if isinstance(value, list) and all(isinstance(member_id, str) for member_id in value) else value
+        elif key == "idList":
+            record._id_list = tables.string(value) if isinstance(value, str) else value
+        elif key != "members":
+            setattr(record, slot, value)
+    if "members" in card:
+        record._members = _compact_members(card["members"], record._id_members, tables, strict)
+    record._extra = extra or None
+    return record
+
+def _compact_list(trello_list, tables, strict):
+    cards = trello_list.get("cards", ())
+    if isinstance(trello_list, CompactList) and all(type(card) is CompactCard and card._tables is tables for card in cards):
+        return trello_list
+    return CompactList(trello_list, tuple(_compact_card(card, tables, strict) for card in cards))
+
+def _board_tables(lists):
+    """The tables of the first compact card in lists, if there is one"""
+    for trello_list in lists:
+        for card in trello_list.get("cards", ()):
+            if isinstance(card, CompactCard):
+                return card._tables
+            break
+    return None
+
+def compact_lists(lists):
+    """
+    A board's lists (dicts, records or a mix, as snapshot updates leave them) as CompactLists.
+    Records already made for the board are reused; the board's tables are started over
+    when a member's profile has changed.
+    """
+    tables = _board_tables(lists)
+    if tables is not None:
+        try:
+            with tables.lock:
+                return [_compact_list(trello_list, tables, strict=True) for trello_list in lists]
+        except _TablesOutdated:
+            pass
+    tables = BoardTables()
+    with tables.lock:
+        return [_compact_list(trello_list, tables, strict=False) for trello_list in lists]
+
+def compact_snapshot(snapshot):
+    """A board snapshot with its lists and cards as compact records"""
+    return dict(snapshot, lists=compact_lists(snapshot["lists"]))
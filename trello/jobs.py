@@ -0,0 +1,150 @@
+"""
+In-process background job runner for slow work such as report generation
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+REPORT_JOB_WORKERS = int(os.environ.get("REPORT_JOB_WORKERS", "4"))
+# Finished jobs stay available for polling this many seconds
+JOB_RETENTION = int(os.environ.get("JOB_RETENTION", "600"))
+
+class Job:
+    """A unit of background work and its outcome"""
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "pending"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        # Text published while the job runs, for followers that want it before the result
+        self.chunks = []
+        self._done = threading.Event()
+        self._published = threading.Condition()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes, returning whether it did"""
+        return self._done.wait(timeout)
+
+    def publish(self, text):
+        with self._published:
+            self.chunks.append(text)
+            self._published.notify_all()
+
+    def follow(self):
+        """Yields the job's published chunks as they arrive, those already out first, until the job finishes"""
+        sent = 0
+        while True:
+            with self._published:
+                while sent == len(self.chunks) and not self.finished:
+                    self._published.wait()
+                chunks = self.chunks[sent:]
+                finished = self.finished
+            sent += len(chunks)
+            yield from chunks
+            if finished and sent == len(self.chunks):
+                return
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+# The job running on this worker thread, for publish
+_running = threading.local()
+
+def publish(text):
+    """Publish text to the followers of the job running on this thread; does nothing outside a job"""
+    job = getattr(_running, "job", None)
+    if job is not None:
+        job.publish(text)
+
+class JobRunner:
+    """Runs jobs on a thread pool, sharing one job between identical in-flight requests"""
+
+    def __init__(self, max_workers, retention=JOB_RETENTION, name="jobs"):
+        self.retention = retention
+        self.submitted = 0
+        self.deduplicated = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) and return its Job.
+        While a job with the same key is pending or running, that job is returned instead.
+        """
+        with self._lock:
+            self._sweep()
+            job = self._inflight.get(key)
+            if job is not None:
+                self.deduplicated += 1
+                return job
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            self.submitted += 1
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def completed(self, key, result):
+        """Record an already available result as a finished job, so callers can treat it like any other"""
+        job = Job(key)
+        self._finish(job, "done", result=result)
+        with self._lock:
+            self._sweep()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        _running.job = job
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            self._finish(job, "error", error=str(e))
+        else:
+            self._finish(job, "done", result=result)
+        finally:
+            _running.job = None
+
+    def _finish(self, job, status, result=None, error=None):
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job.status = status
+        with self._lock:
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+        with job._published:
+            job._done.set()
+            job._published.notify_all()
+
+    def _sweep(self):
+        """Forget finished jobs past their retention period (caller holds the lock)"""
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "jobs": len(self._jobs),
+                "inflight": len(self._inflight),
+                "submitted": self.submitted,
+                "deduplicated": self.deduplicated
+            }
+
+report_jobs = JobRunner(REPORT_JOB_WORKERS, name="report-job")
@@ -0,0 +1,134 @@
+"""
+Board metrics computed locally from get_board_details output, so the LLM doesn't have to count
+"""
+import os
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+# Lists whose name matches this count as finished work
+DONE_LIST_PATTERN = re.compile(os.environ.get("DONE_LIST_PATTERN", r"\b(done|complete|completed|closed|shipped|finished)\b"), re.IGNORECASE)
+# Cards due within this many days count as due soon
+DUE_SOON_DAYS = 7
+# Most overdue and upcoming cards listed individually
+CARD_LIST_LIMIT = 25
+
+def parse_due(due):
+    """Parse a Trello due date into an aware datetime, or None"""
+    if not due:
+        return None
+    try:
+        parsed = datetime.fromisoformat(due.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def compute_board_metrics(board, lists, now=None):
+    """
+    Computes list counts, completion, due date buckets, overdue and upcoming cards,
+    per-member workload and label usage for a board in a single pass over its cards.
+    """
+    now = now or datetime.now(timezone.utc)
+    today_end = now.replace(hour=23, minute=59, second=59, microsecond=999999)
+    soon = now + timedelta(days=DUE_SOON_DAYS)
+
+    buckets = {"overdue": 0, "due_today": 0, "due_soon": 0, "due_later": 0, "no_due": 0, "completed_due": 0}
+    list_metrics = []
+    member_cards = Counter()
+    member_overdue = Counter()
+    member_names = {}
+    label_counts = Counter()
+    label_colors = {}
+    overdue_cards = []
+    upcoming_cards = []
+    total_cards = 0
+    completed_cards = 0
+    unassigned = 0
+
+    for trello_list in lists:
+        list_name = trello_list.get("name", "Unnamed List")
+        done_list = bool(DONE_LIST_PATTERN.search(list_name))
+        counts = {"cards": 0, "completed": 0, "overdue": 0, "due_soon": 0}
+
+        for card in trello_list.get("cards", []):
+            counts["cards"] += 1
+            due = parse_due(card.get("due"))
+            completed = done_list or bool(card.get("dueComplete"))
+            if completed:
+                counts["completed"] += 1
+
+            members = card.get("members", [])
+            if not members:
+                unassigned += 1
+            for member in members:
+                member_id = member.get("id") or member.get("fullName")
+                member_names[member_id] = member.get("fullName", "N/A")
+                member_cards[member_id] += 1
+
+            for label in card.get("labels", []):
+                label_name = label.get("name") or label.get("color") or "N/A"
+                label_counts[label_name] += 1
+                label_colors.setdefault(label_name, label.get("color"))
+
+            if due is None:
+                buckets["no_due"] += 1
+                continue
+            if completed:
+                buckets["completed_due"] += 1
+                continue
+
+            card_summary = {
+                "id": card.get("id"),
+                "name": card.get("name", "Unnamed Card"),
+                "list": list_name,
+                "due": due.astimezone(timezone.utc).isoformat(),
+                "members": [member.get("fullName", "N/A") for member in members]
+            }
+            if due < now:
+                buckets["overdue"] += 1
+                counts["overdue"] += 1
+                overdue_cards.append(card_summary)
+                for member in members:
+                    member_overdue[member.get("id") or member.get("fullName")] += 1
+            elif due <= today_end:
+                buckets["due_today"] += 1
+                counts["due_soon"] += 1
+                upcoming_cards.append(card_summary)
+            elif due <= soon:
+                buckets["due_soon"] += 1
+                counts["due_soon"] += 1
+                upcoming_cards.append(card_summary)
+            else:
+                buckets["due_later"] += 1
+
+        total_cards += counts["cards"]
+        completed_cards += counts["completed"]
+        list_metrics.append({"id": trello_list.get("id"), "name": list_name, "done_list": done_list, **counts})
+
+    # UTC ISO timestamps sort chronologically as strings
+    overdue_cards.sort(key=lambda card: card["due"])
+    upcoming_cards.sort(key=lambda card: card["due"])
+
+    return {
+        "board": {"id": board.get("id"), "name": board.get("name")},
+        "generated_at": now.isoformat(),
+        "totals": {
+            "lists": len(list_metrics),
+            "cards": total_cards,
+            "completed": completed_cards,
+            "completion_pct": round(100.0 * completed_cards / total_cards, 1) if total_cards else 0.0,
+            "unassigned": unassigned
+        },
+        "due": buckets,
+        "lists": list_metrics,
+        "overdue_cards": overdue_cards[:CARD_LIST_LIMIT],
+        "upcoming_cards": upcoming_cards[:CARD_LIST_LIMIT],
+        "members": [
+            {"id": member_id, "name": member_names[member_id], "cards": count, "overdue": member_overdue[member_id]}
+            for member_id, count in member_cards.most_common()
+        ],
+        "labels": [
+            {"name": name, "color": label_colors[name], "cards": count}
+            for name, count in label_counts.most_common()
+        ]
+    }
@@ -0,0 +1,67 @@
+"""
+Board page slicing: the board view renders the first page of each list and the rest is fetched on demand
+"""
+import os
+
+# Cards rendered per list with the page, and per request to the cards endpoint
+BOARD_PAGE_SIZE = int(os.environ.get("BOARD_PAGE_SIZE", "20"))
+# Descriptions longer than this are cut and can be expanded from the card endpoint
+CARD_DESC_PREVIEW = int(os.environ.get("CARD_DESC_PREVIEW", "200"))
+MAX_PAGE_SIZE = 200
+
+def card_view(card, desc_limit=CARD_DESC_PREVIEW):
+    """The fields the board page shows for a card, with the description cut to desc_limit characters"""
+    desc = card.get("desc") or ""
+    truncated = desc_limit is not None and len(desc) > desc_limit
+    return {
+        "id": card.get("id"),
+        "name": card.get("name", "Unnamed Card"),
+        "desc": desc[:desc_limit].rstrip() + "…" if truncated else desc,
+        "desc_truncated": truncated,
+        "due": card.get("due"),
+        "dueComplete": bool(card.get("dueComplete")),
+        "labels": [{"name": label.get("name"), "color": label.get("color")} for label in card.get("labels", [])],
+        "members": [member.get("fullName", "N/A") for member in card.get("members", [])]
+    }
+
+def list_views(lists, page_size=BOARD_PAGE_SIZE):
+    """Each list with only its first page of cards, and how many more there are"""
+    return [
+        {
+            "id": trello_list["id"],
+            "name": trello_list.get("name", "Unnamed List"),
+            "total": len(trello_list.get("cards", [])),
+            "cards": [card_view(card) for card in trello_list.get("cards", [])[:page_size]],
+            "remaining": max(len(trello_list.get("cards", [])) - page_size, 0)
+        }
+        for trello_list in lists
+    ]
+
+def card_page(lists, list_id, offset=0, limit=BOARD_PAGE_SIZE):
+    """
+    A page of a list's cards for the cards endpoint: {"list", "offset", "total", "cards", "next_offset"},
+    or None if the board has no such list.
+    """
+    trello_list = next((trello_list for trello_list in lists if trello_list["id"] == list_id), None)
+    if trello_list is None:
+        return None
+    offset = max(offset, 0)
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    cards = trello_list.get("cards", [])
+    page = cards[offset:offset + limit]
+    next_offset = offset + len(page)
+    return {
+        "list": list_id,
+        "offset": offset,
+        "total": len(cards),
+        "cards": [card_view(card) for card in page],
+        "next_offset": next_offset if next_offset < len(cards) else None
+    }
+
+def find_card(lists, card_id):
+    """A card from the board by id, or None"""
+    for trello_list in lists:
+        for card in trello_list.get("cards", []):
+            if card.get("id") == card_id:
+                return card
+    return None
@@ -0,0 +1,122 @@
+"""
+Pooled HTTP sessions so repeated requests reuse keep-alive connections
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connection pools per session: hosts kept, and connections kept per host
+POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "16"))
+# Sessions unused for this many seconds are let go
+SESSION_IDLE_TIMEOUT = int(os.environ.get("HTTP_SESSION_IDLE_TIMEOUT", "300"))
+# Most sessions kept at once, least recently used are let go first
+MAX_SESSIONS = int(os.environ.get("HTTP_MAX_SESSIONS", "256"))
+
+def mount_pool(session):
+    """Mount a keep-alive connection pool sized for concurrent fetches on a session"""
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def new_session():
+    """Create a plain requests session with a tuned connection pool"""
+    return mount_pool(requests.Session())
+
+class _PooledSession:
+    """
+    A pooled session and the requests it has in flight. A session the pool lets go may still
+    be in use by the request that got it, so it is only closed once nothing is in flight.
+    """
+
+    def __init__(self, session, now):
+        self.session = session
+        self.last_used = now
+        self.inflight = 0
+        self.retired = False
+        self._lock = threading.Lock()
+        send = session.request
+
+        def request(*args, **kwargs):
+            with self._lock:
+                self.inflight += 1
+            try:
+                return send(*args, **kwargs)
+            finally:
+                self._finish()
+
+        session.request = request
+
+    def _finish(self):
+        with self._lock:
+            self.inflight -= 1
+            close = self.retired and self.inflight == 0
+        if close:
+            self.session.close()
+
+    def retire(self):
+        """Close the session now if it is idle, otherwise once its last request finishes"""
+        with self._lock:
+            self.retired = True
+            close = self.inflight == 0
+        if close:
+            self.session.close()
+
+class SessionPool:
+    """Keeps one session per key and lets go of sessions that sit idle"""
+
+    def __init__(self, idle_timeout=SESSION_IDLE_TIMEOUT, maxsize=MAX_SESSIONS):
+        self.idle_timeout = idle_timeout
+        self.maxsize = maxsize
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        """Return the session for key, creating it with factory() when there is none"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(key)
+            if entry is None:
+                entry = self._sessions[key] = _PooledSession(mount_pool(factory()), now)
+                self.created += 1
+            else:
+                entry.last_used = now
+                self.reused += 1
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.maxsize:
+                _, oldest = self._sessions.popitem(last=False)
+                oldest.retire()
+                self.evicted += 1
+            return entry.session
+
+    def _evict_idle(self, now):
+        while self._sessions:
+            key, entry = next(iter(self._sessions.items()))
+            if now - entry.last_used < self.idle_timeout:
+                break
+            del self._sessions[key]
+            entry.retire()
+            self.evicted += 1
+
+    def close_all(self):
+        with self._lock:
+            for entry in self._sessions.values():
+                entry.retire()
+            self._sessions.clear()
+
+    def stats(self):
+        return {
+            "sessions": len(self._sessions),
+            "created": self.created,
+            "reused": self.reused,
+            "evicted": self.evicted
+        }
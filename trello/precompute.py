@@ -0,0 +1,340 @@
+"""
+Background precompute: keeps the snapshots and reports of often viewed boards warm, so their
+pages load from cache instead of waiting on a full Trello fetch and the report backend
+
+    python -m trello.precompute          # run the scheduler on its own (PRECOMPUTE_MODE=worker)
+    python -m trello.precompute --once   # warm every tracked board once, e.g. from cron before the working day
+"""
+import argparse
+import fcntl
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+
+# Loaded before the trello modules read their settings, for when this runs as the worker
+load_dotenv()
+
+from trello.api import get_trello_client
+from trello.cache import LRUCache, SQLiteCache
+from trello.jobs import JobRunner
+from trello.session_store import SESSION_TTL, make_session_interface
+from trello.snapshots import SNAPSHOT_STORE_PATH, sync_snapshot, snapshot_fingerprint
+from trello import agent
+
+# SQLite file board views are counted in; needed for a separate worker, or several web processes, to see the same views
+PRECOMPUTE_STORE_PATH = os.environ.get("PRECOMPUTE_STORE_PATH")
+# "app" runs the scheduler in the web processes, "worker" leaves it to `python -m trello.precompute`, "off" disables it.
+# Off by default without PRECOMPUTE_STORE_PATH, since each process would count only its own share of the views
+PRECOMPUTE_MODE = os.environ.get("PRECOMPUTE_MODE", "app" if PRECOMPUTE_STORE_PATH else "off")
+# Boards refreshed at once; their reports also count against GEMINI_CONCURRENCY
+PRECOMPUTE_CONCURRENCY = int(os.environ.get("PRECOMPUTE_CONCURRENCY", "2"))
+# Seconds between refreshes of one board, varied by up to PRECOMPUTE_JITTER of it either way
+PRECOMPUTE_INTERVAL = float(os.environ.get("PRECOMPUTE_INTERVAL", "900"))
+PRECOMPUTE_JITTER = float(os.environ.get("PRECOMPUTE_JITTER", "0.2"))
+# A board that changed since the last refresh is looked at again this many seconds later,
+# and its report is only regenerated once it stops changing
+PRECOMPUTE_SETTLE = float(os.environ.get("PRECOMPUTE_SETTLE", "120"))
+# Views count for half as much after this many seconds. Boards with fewer views than
+# PRECOMPUTE_MIN_VIEWS aren't refreshed; 1.5 takes two views within about a half-life
+PRECOMPUTE_HALF_LIFE = float(os.environ.get("PRECOMPUTE_HALF_LIFE", str(24 * 3600)))
+PRECOMPUTE_MIN_VIEWS = float(os.environ.get("PRECOMPUTE_MIN_VIEWS", "1.5"))
+# Most boards kept warm, the most viewed first; keep it well under SNAPSHOT_CACHE_SIZE
+PRECOMPUTE_MAX_BOARDS = int(os.environ.get("PRECOMPUTE_MAX_BOARDS", "100"))
+# A board is forgotten this many seconds after its last view
+PRECOMPUTE_FORGET_AFTER = int(os.environ.get("PRECOMPUTE_FORGET_AFTER", str(7 * 24 * 3600)))
+# Hours of the day (server time) refreshes run in, e.g. "5-8,22-2"; empty for any hour
+PRECOMPUTE_HOURS = os.environ.get("PRECOMPUTE_HOURS", "")
+
+# Seconds between looks for due boards while every refresh slot is idle
+_TICK = 30
+
+def parse_hours(spec):
+    """The set of hours in a spec like "5-8,22-2" (ranges are inclusive and may wrap midnight), or None for any hour"""
+    if not spec.strip():
+        return None
+    hours = set()
+    for part in spec.split(","):
+        start, _, end = part.strip().partition("-")
+        start = int(start)
+        end = int(end) if end else start
+        if not (0 <= start <= 23 and 0 <= end <= 23):
+            raise ValueError(f"Hour out of range in PRECOMPUTE_HOURS: {part!r}")
+        hour = start
+        hours.add(hour)
+        while hour != end:
+            hour = (hour + 1) % 24
+            hours.add(hour)
+    return hours
+
+def _make_view_store():
+    """Board views in SQLite when PRECOMPUTE_STORE_PATH is set, so every process sees them, otherwise in memory"""
+    if PRECOMPUTE_STORE_PATH:
+        return SQLiteCache(PRECOMPUTE_STORE_PATH, ttl=PRECOMPUTE_FORGET_AFTER, table="board_views")
+    return LRUCache(maxsize=PRECOMPUTE_MAX_BOARDS * 10, ttl=PRECOMPUTE_FORGET_AFTER)
+
+# Board id -> {"views": decayed view count as of "at", "at", and its latest viewer}. The viewer
+# is their server-side session id, whose token refreshes the board for as long as the session
+# lasts, or a key into _viewer_tokens for cookie sessions. No token is stored with the views.
+board_views = _make_view_store()
+_board_views_lock = threading.Lock()
+# Viewer key -> (token, secret) of viewers with cookie sessions: in memory only, dropped on logout
+_viewer_tokens = LRUCache(maxsize=PRECOMPUTE_MAX_BOARDS * 10, ttl=SESSION_TTL)
+# Server-side session store the viewers' tokens are read from, set by the app or the worker
+session_store = None
+
+def use_session_store(store):
+    global session_store
+    session_store = store
+
+def _viewer_key(access_token):
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:32]
+
+def decayed_views(record, now):
+    return record["views"] * math.pow(0.5, max(now - record["at"], 0) / PRECOMPUTE_HALF_LIFE)
+
+def record_view(board_id, access_token, access_token_secret, session_id=None):
+    """
+    Count a view of a board. The viewer's token is what the scheduler refreshes the board with:
+    read from their session while it lasts when session_id is given, otherwise kept in memory.
+    """
+    if PRECOMPUTE_MODE == "off":
+        return
+    if session_id and session_store is not None:
+        viewer = {"session": session_id}
+    else:
+        viewer = {"viewer": _viewer_key(access_token)}
+        _viewer_tokens.set(viewer["viewer"], (access_token, access_token_secret))
+    now = time.time()
+    with _board_views_lock:
+        record = board_views.get(board_id)
+        views = decayed_views(record, now) if record else 0.0
+        board_views.set(board_id, dict(viewer, views=views + 1, at=now))
+    if PRECOMPUTE_MODE == "app":
+        scheduler.ensure_running()
+
+def is_popular(board_id, now=None):
+    """Whether a board has had PRECOMPUTE_MIN_VIEWS views lately, as the boards the scheduler keeps warm have"""
+    record = board_views.get(board_id)
+    return record is not None and decayed_views(record, time.time() if now is None else now) >= PRECOMPUTE_MIN_VIEWS
+
+def forget_viewer(access_token):
+    """Drop a viewer's token on logout; a server-side session's goes with the session"""
+    _viewer_tokens.delete(_viewer_key(access_token))
+
+def viewer_credentials(record):
+    """(token, secret) of a board's latest viewer, or None once they logged out or their session expired"""
+    if record.get("session"):
+        data = session_store.get(record["session"]) if session_store is not None else None
+        if not data or "access_token" not in data:
+            return None
+        return data["access_token"], data["access_token_secret"]
+    if record.get("viewer"):
+        return _viewer_tokens.get(record["viewer"])
+    return None
+
+class PrecomputeScheduler:
+    """
+    Refreshes the most viewed boards in the background. Each refresh syncs the board's snapshot
+    and, once the board has stopped changing, makes sure its report is cached. Refreshes run
+    on a pool of concurrency threads, the most viewed due boards first, and are spread out
+    by jitter so boards first seen together don't stay due together.
+    """
+
+    def __init__(self, views, concurrency=PRECOMPUTE_CONCURRENCY, interval=PRECOMPUTE_INTERVAL,
+                 jitter=PRECOMPUTE_JITTER, settle=PRECOMPUTE_SETTLE, hours=PRECOMPUTE_HOURS):
+        self.views = views
+        self.concurrency = concurrency
+        self.interval = interval
+        self.jitter = jitter
+        self.settle = settle
+        self.hours = parse_hours(hours)
+        self.refreshed = 0
+        self.reports = 0
+        self.failed = 0
+        self.no_viewer = 0
+        self._runner = JobRunner(concurrency, retention=0, name="precompute")
+        # Board id -> {"due": when to refresh next, "fingerprint": content at the last refresh}
+        self._boards = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._lock_file = None
+
+    def ensure_running(self):
+        """Start the scheduler thread in this process, once (again in forked workers)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # A lock file inherited from the parent process is its lock, not this one's
+            self._lock_file = None
+            threading.Thread(target=self.run_forever, name="precompute-scheduler", daemon=True).start()
+
+    def run_forever(self):
+        print(f"Precompute scheduler started: {self.concurrency} at a time, every {self.interval:.0f}s")
+        while True:
+            try:
+                if self._hold_lock():
+                    self.run_due()
+            except Exception as e:
+                print(f"Precompute scheduler: {str(e)}")
+            self._wake.wait(_TICK)
+            self._wake.clear()
+
+    def _hold_lock(self):
+        """
+        Whether this process is the one refreshing boards. With views in PRECOMPUTE_STORE_PATH, every
+        web process and worker sees the same boards, so only the process holding a lock next to it
+        refreshes them; another takes over if that process exits.
+        """
+        if not PRECOMPUTE_STORE_PATH:
+            return True
+        if self._lock_file is None:
+            lock_file = open(PRECOMPUTE_STORE_PATH + ".lock", "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        return True
+
+    def _spread(self, delay):
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def candidates(self, now):
+        """(board id, view record) of the boards worth keeping warm, most viewed first"""
+        ranked = []
+        for board_id in self.views.keys():
+            record = self.views.get(board_id)
+            if record is None:
+                continue
+            views = decayed_views(record, now)
+            if views >= PRECOMPUTE_MIN_VIEWS:
+                ranked.append((-views, board_id, record))
+        ranked.sort(key=lambda entry: entry[:2])
+        return [(board_id, record) for _, board_id, record in ranked[:PRECOMPUTE_MAX_BOARDS]]
+
+    def run_due(self, now=None):
+        """Start refreshes of the most viewed due boards, as many as there are idle slots; returns their ids"""
+        now = time.time() if now is None else now
+        if self.hours is not None and time.localtime(now).tm_hour not in self.hours:
+            return []
+        candidates = self.candidates(now)
+        with self._lock:
+            # Boards no longer viewed enough are forgotten, unless a refresh of them is running
+            wanted = {board_id for board_id, _ in candidates}
+            for board_id in [board_id for board_id, state in self._boards.items() if board_id not in wanted and state.get("due") != float("inf")]:
+                del self._boards[board_id]
+        idle = self.concurrency - self._runner.stats()["inflight"]
+        started = []
+        for board_id, record in candidates:
+            if len(started) >= idle:
+                break
+            with self._lock:
+                state = self._boards.get(board_id)
+                if state is None:
+                    # Boards first seen together are first refreshed at scattered times
+                    state = self._boards[board_id] = {"due": now + random.uniform(0, self.jitter * self.interval), "fingerprint": None}
+                if state["due"] > now:
+                    continue
+                # Not due again until this refresh sets when
+                state["due"] = float("inf")
+            self._runner.submit(board_id, self._refresh, board_id, record)
+            started.append(board_id)
+        return started
+
+    def warm_all(self):
+        """Refresh every board worth keeping warm now, whatever its due time, and wait for them all"""
+        jobs = [self._runner.submit(board_id, self._refresh, board_id, record) for board_id, record in self.candidates(time.time())]
+        for job in jobs:
+            job.wait()
+        return len(jobs)
+
+    def _refresh(self, board_id, record):
+        """Sync one board with its latest viewer's token, and warm its report unless it just changed"""
+        delay = self.interval
+        try:
+            credentials = viewer_credentials(record)
+            if credentials is None:
+                # Left until someone signed in views the board again
+                self.no_viewer += 1
+                return
+            trello = get_trello_client(*credentials)
+            snapshot = sync_snapshot(trello, board_id)
+            content = snapshot_fingerprint(snapshot)
+            with self._lock:
+                state = self._boards.setdefault(board_id, {"fingerprint": None})
+                changed = state["fingerprint"] not in (None, content)
+                state["fingerprint"] = content
+            self.refreshed += 1
+            if changed:
+                # Still being edited; the report waits until the board settles
+                delay = self.settle
+            elif agent.report_backend_problem() is None:
+                self._warm_report((snapshot["board"], snapshot["lists"]), content)
+        except Exception as e:
+            self.failed += 1
+            print(f"Precompute of board {board_id} failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._boards.setdefault(board_id, {"fingerprint": None})["due"] = time.time() + self._spread(delay)
+            self._wake.set()
+
+    def _warm_report(self, details, content):
+        if agent.get_cached_board_report(details, content) is not None:
+            return
+        # Shares the job of a summary already being generated for the same content
+        job = agent.start_board_report(details, content)
+        # A report slower than a refresh interval stops holding up the slot; it is still cached when done
+        job.wait(self.interval)
+        if job.status == "done" and not job.result.startswith("Error:"):
+            self.reports += 1
+
+    def stats(self):
+        with self._lock:
+            scheduled = len(self._boards)
+        return {
+            "mode": PRECOMPUTE_MODE,
+            "running": self._pid == os.getpid(),
+            "tracked_boards": len(self.views),
+            "scheduled_boards": scheduled,
+            "refreshed": self.refreshed,
+            "reports": self.reports,
+            "failed": self.failed,
+            "no_viewer": self.no_viewer,
+            "jobs": self._runner.stats()
+        }
+
+scheduler = PrecomputeScheduler(board_views)
+
+def precompute_stats():
+    return scheduler.stats()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the snapshots and reports of often viewed boards warm")
+    parser.add_argument("--once", action="store_true", help="refresh every tracked board once and exit")
+    args = parser.parse_args()
+
+    if not PRECOMPUTE_STORE_PATH:
+        parser.error("set PRECOMPUTE_STORE_PATH to the file the app counts board views in")
+    worker_sessions = make_session_interface()
+    if worker_sessions is None or not isinstance(worker_sessions.store, SQLiteCache):
+        parser.error("the worker reads viewers' tokens from their sessions, so it needs SESSION_BACKEND=sqlite")
+    use_session_store(worker_sessions.store)
+    if not SNAPSHOT_STORE_PATH or agent.REPORT_CACHE_BACKEND not in ("disk", "tiered"):
+        print("Warning: the app only sees what this worker warms with SNAPSHOT_STORE_PATH set and REPORT_CACHE_BACKEND=disk or tiered")
+    if args.once:
+        started = time.time()
+        warmed = scheduler.warm_all()
+        print(f"Warmed {warmed} boards in {time.time() - started:.1f}s: {scheduler.stats()}")
+    else:
+        scheduler._pid = os.getpid()
+        scheduler.run_forever()
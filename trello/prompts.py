@@ -0,0 +1,200 @@
+"""
+Compact, token-budgeted prompts for board reports
+"""
+import os
+
+from trello.metrics import compute_board_metrics
+
+# Rough size limit for a single report prompt, in tokens
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "24000"))
+# Card descriptions are cut to this many characters
+PROMPT_DESC_LIMIT = int(os.environ.get("PROMPT_DESC_LIMIT", "160"))
+# Average characters per token used to estimate prompt size; report backends with a
+# tokenizer that packs text less tightly pass their own
+CHARS_PER_TOKEN = 4
+
+# Detail levels tried in order until a prompt fits: (description limit, cards shown per list)
+DETAIL_LEVELS = [
+    (PROMPT_DESC_LIMIT, None),
+    (PROMPT_DESC_LIMIT // 4, None),
+    (0, None),
+    (0, 50),
+    (0, 10),
+    (0, 0)
+]
+
+REPORT_INSTRUCTIONS = (
+    "\nBased on this data, please build a comprehensive report that includes:\n"
+    "1. Overall board status and progress\n"
+    "2. Key metrics (number of cards in each list, completion percentage), taken from the computed metrics above\n"
+    "3. Task distribution among team members\n"
+    "4. Upcoming deadlines and priority items\n"
+    "5. Recommendations for improving workflow or addressing bottlenecks\n"
+    "\nThe computed metrics are exact. Quote them rather than counting cards yourself."
+    "\nIMPORTANT: Format the report in a clear, professional structure with plain text headings. DO NOT use markdown formatting like **, ##, or any other markdown syntax. The report should look like a natural document without any markdown formatting."
+)
+
+LIST_SUMMARY_INSTRUCTIONS = (
+    "\nSummarize this list in under 150 words of plain text: what the work is, its progress, "
+    "overdue or soon-due items, who owns the work and any risks. Do not use markdown formatting."
+)
+
+def estimate_tokens(text, chars_per_token=CHARS_PER_TOKEN):
+    """Estimate how many tokens a prompt will use"""
+    return int(len(text) / chars_per_token) + 1
+
+def _cell(text):
+    """Flatten text so it fits in one table cell"""
+    return " ".join(text.split()).replace("|", "/")
+
+def _clip(text, limit):
+    if len(text) <= limit:
+        return text
+    return text[:max(limit - 1, 0)].rstrip() + "…"
+
+def _list_stats(list_metrics):
+    return (f"cards={list_metrics['cards']} completed={list_metrics['completed']} "
+            f"overdue={list_metrics['overdue']} due_soon={list_metrics['due_soon']}")
+
+def _metrics_lines(metrics, card_lines=True):
+    """Render computed board metrics as compact prompt lines; card_lines names the overdue and upcoming cards"""
+    totals = metrics["totals"]
+    due = metrics["due"]
+    lines = [
+        "\nComputed metrics:",
+        f"Totals: lists={totals['lists']} cards={totals['cards']} completed={totals['completed']} "
+        f"({totals['completion_pct']}%) unassigned={totals['unassigned']}",
+        f"Due dates: overdue={due['overdue']} due_today={due['due_today']} due_this_week={due['due_soon']} "
+        f"due_later={due['due_later']} no_due_date={due['no_due']} done={due['completed_due']}"
+    ]
+    if metrics["members"]:
+        lines.append("Cards per member: " + ", ".join(
+            f"{_cell(member['name'])}={member['cards']} ({member['overdue']} overdue)" for member in metrics["members"]
+        ))
+    if metrics["labels"]:
+        lines.append("Labels: " + ", ".join(f"{_cell(label['name'])}={label['cards']}" for label in metrics["labels"]))
+    for title, cards in (("Overdue cards", metrics["overdue_cards"]), ("Due this week", metrics["upcoming_cards"])):
+        if cards and card_lines:
+            lines.append(f"{title}: " + "; ".join(
+                f"{_cell(card['name'])} ({_cell(card['list'])}, {card['due'][:10]}"
+                + (f", {', '.join(card['members'])}" if card["members"] else "") + ")"
+                for card in cards
+            ))
+    return lines
+
+class _EncodedList:
+    """
+    A list's card table rows, built once and rendered at any detail level.
+    card_ids, if given, limits the rows to those cards.
+    """
+
+    def __init__(self, lst, list_metrics, card_ids=None):
+        self.header = f"\nList: {_cell(list_metrics['name'])} | {_list_stats(list_metrics)}"
+        self.filtered = card_ids is not None
+        self.rows = []
+        for card in lst.get("cards", []):
+            if self.filtered and card.get("id") not in card_ids:
+                continue
+            members = ", ".join(member.get("fullName", "N/A") for member in card.get("members", []))
+            labels = ", ".join(label.get("name") or label.get("color") or "N/A" for label in card.get("labels", []))
+            status = "done" if list_metrics["done_list"] or card.get("dueComplete") else "open"
+            row = f"  {_cell(card.get('name', 'Unnamed Card'))} | {status} | {(card.get('due') or '-')[:10]} | {_cell(labels) or '-'} | {_cell(members) or '-'}"
+            # Only the start of a description can ever be shown, so skip cleaning the rest
+            desc = card.get("desc") or ""
+            self.rows.append((row, _cell(desc[:PROMPT_DESC_LIMIT * 2]) if desc else ""))
+
+    def size(self, desc_limit, max_cards=None):
+        """Characters lines() would produce, without building the strings"""
+        shown = self.rows if max_cards is None else self.rows[:max_cards]
+        total = len(self.header) + 60
+        for row, desc in shown:
+            total += len(row) + 1
+            if desc_limit and desc:
+                total += 3 + min(len(desc), desc_limit)
+        return total
+
+    def lines(self, desc_limit, max_cards=None):
+        lines = [self.header]
+        if not self.rows:
+            if not self.filtered:
+                lines.append("  (no cards)")
+            return lines
+        shown = self.rows if max_cards is None else self.rows[:max_cards]
+        if shown:
+            lines.append("  card | status | due | labels | members" + (" | description" if desc_limit else ""))
+            if desc_limit:
+                lines.extend(f"{row} | {_clip(desc, desc_limit)}" if desc else row for row, desc in shown)
+            else:
+                lines.extend(row for row, _ in shown)
+        if len(shown) < len(self.rows):
+            lines.append(f"  ... {len(self.rows) - len(shown)} more cards not shown")
+        return lines
+
+def _board_header(board_data, metrics, card_lines=True):
+    """Board description and computed metrics shared by the report and merge prompts"""
+    lines = [
+        "Analyze the following Trello board data and build a comprehensive report.\n",
+        f"Board Name: {board_data.get('name') or 'N/A'}",
+        f"Board Description: {_cell(board_data.get('desc') or 'No description')}"
+    ]
+    return lines + _metrics_lines(metrics, card_lines)
+
+def _fit(head, encoded_lists, tail, budget, chars_per_token):
+    """Render at the most detailed level within budget, returning (prompt, fits at full detail)"""
+    fixed = sum(len(line) + 1 for line in head) + len(tail)
+    chosen = len(DETAIL_LEVELS) - 1
+    for level, (desc_limit, max_cards) in enumerate(DETAIL_LEVELS):
+        size = fixed + sum(encoded.size(desc_limit, max_cards) for encoded in encoded_lists)
+        if int(size / chars_per_token) + 1 <= budget:
+            chosen = level
+            break
+
+    desc_limit, max_cards = DETAIL_LEVELS[chosen]
+    lines = list(head)
+    for encoded in encoded_lists:
+        lines.extend(encoded.lines(desc_limit, max_cards))
+    lines.append(tail)
+    prompt = "\n".join(lines)
+    return prompt, chosen == 0 and estimate_tokens(prompt, chars_per_token) <= budget
+
+def build_board_prompt(board_data, budget=None, metrics=None, chars_per_token=CHARS_PER_TOKEN):
+    """
+    Builds the report prompt for {"name", "desc", "lists"} board data: the computed metrics,
+    with card rows only for the overdue and upcoming cards they pick out.
+    Detail is reduced until the prompt fits the token budget. Returns (prompt, fits), where
+    fits says whether the board fit at full detail.
+    """
+    budget = budget or PROMPT_TOKEN_BUDGET
+    lists = board_data.get("lists", [])
+    metrics = metrics or compute_board_metrics(board_data, lists)
+    head = _board_header(board_data, metrics, card_lines=False)
+    if not lists:
+        return "\n".join(head + ["\nThe board has no lists or cards.", REPORT_INSTRUCTIONS]), True
+    card_ids = {card["id"] for card in metrics["overdue_cards"] + metrics["upcoming_cards"]}
+    encoded_lists = [_EncodedList(lst, list_metrics, card_ids) for lst, list_metrics in zip(lists, metrics["lists"])]
+    return _fit(head + ["\nLists, with a row for each overdue or upcoming card:"], encoded_lists, REPORT_INSTRUCTIONS, budget, chars_per_token)
+
+def build_list_prompts(board_data, budget=None, metrics=None, chars_per_token=CHARS_PER_TOKEN):
+    """
+    Builds one prompt per list for the map step of a map-reduce report. Each carries all of
+    its list's cards, since the list summaries stand in for the cards in the merge prompt.
+    """
+    budget = budget or PROMPT_TOKEN_BUDGET
+    lists = board_data.get("lists", [])
+    metrics = metrics or compute_board_metrics(board_data, lists)
+    head = [f"The following is one list from the Trello board \"{_cell(board_data.get('name') or 'N/A')}\"."]
+    return [
+        _fit(head, [_EncodedList(lst, list_metrics)], LIST_SUMMARY_INSTRUCTIONS, budget, chars_per_token)[0]
+        for lst, list_metrics in zip(lists, metrics["lists"])
+    ]
+
+def build_merge_prompt(board_data, list_summaries, metrics=None):
+    """Builds the reduce step prompt from per-list summaries"""
+    metrics = metrics or compute_board_metrics(board_data, board_data.get("lists", []))
+    lines = _board_header(board_data, metrics)
+    lines.append("\nList summaries:")
+    for list_metrics, summary in zip(metrics["lists"], list_summaries):
+        lines.append(f"\nList: {_cell(list_metrics['name'])} | {_list_stats(list_metrics)}")
+        lines.append(summary.strip())
+    lines.append(REPORT_INSTRUCTIONS)
+    return "\n".join(lines)
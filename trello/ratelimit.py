@@ -0,0 +1,244 @@
+"""
+Client-side rate limiting and retries for Trello and Gemini requests
+"""
+import email.utils
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+import urllib3
+
+# Trello allows 100 requests per 10 seconds per token and 300 per 10 seconds per API key
+TRELLO_TOKEN_RATE = float(os.environ.get("TRELLO_TOKEN_RATE", "10"))
+TRELLO_TOKEN_BURST = int(os.environ.get("TRELLO_TOKEN_BURST", "100"))
+TRELLO_KEY_RATE = float(os.environ.get("TRELLO_KEY_RATE", "30"))
+TRELLO_KEY_BURST = int(os.environ.get("TRELLO_KEY_BURST", "300"))
+GEMINI_RATE = float(os.environ.get("GEMINI_RATE", "2"))
+GEMINI_BURST = int(os.environ.get("GEMINI_BURST", "10"))
+
+# Attempts after the first, and the backoff bounds between them in seconds
+RETRY_ATTEMPTS = int(os.environ.get("RETRY_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", "20"))
+RETRY_STATUSES = {429, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Token bucket whose refill rate adapts to the server: each overload (a burst of 429s)
+    cuts the rate by a quarter, and it creeps back up by RECOVERY_RATE of the configured
+    rate per second while no 429s arrive.
+    """
+
+    # Share of the configured rate regained per second without a 429
+    RECOVERY_RATE = 0.02
+
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.throttled = 0
+        self.overloads = 0
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # Nothing accrues while blocked, so requests queued during a pause are spread out after it
+        elapsed = now - max(self._updated, self._blocked_until)
+        if elapsed > 0:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * self.RECOVERY_RATE * elapsed)
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Take a token and return how long to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(self._blocked_until - now, 0.0) + (-self.tokens / self.rate if self.tokens < 0 else 0.0)
+            if wait > 0:
+                self.throttled += 1
+            return wait
+
+    def penalize(self, delay):
+        """Back off after a rate limit response: pause for delay seconds and slow down"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Requests already in flight get 429s for the same overload, which only counts once
+            if now >= self._blocked_until:
+                self.overloads += 1
+                self.rate = max(self.max_rate / 16, self.rate * 0.75)
+            self._blocked_until = max(self._blocked_until, now + delay)
+            self.tokens = min(self.tokens, 0.0)
+
+    def stats(self):
+        return {
+            "rate": round(self.rate, 2),
+            "max_rate": self.max_rate,
+            "burst": self.burst,
+            "throttled": self.throttled,
+            "overloads": self.overloads
+        }
+
+class RateLimiter:
+    """Token buckets by key, such as one per access token, created on first use"""
+
+    def __init__(self, rate, burst, maxsize=4096):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bucket(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                while len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket
+
+    def stats(self):
+        with self._lock:
+            buckets = list(self._buckets.values())
+        return {
+            "buckets": len(buckets),
+            "throttled": sum(bucket.throttled for bucket in buckets),
+            "overloads": sum(bucket.overloads for bucket in buckets),
+            "slowed": sum(1 for bucket in buckets if bucket.rate < bucket.max_rate)
+        }
+
+def retry_after(response):
+    """Seconds a response asks us to wait through Retry-After, or None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def backoff(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Full-jitter exponential backoff for the given retry attempt (0 for the first retry)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def _never_sent(error):
+    """Whether a requests error shows the request never reached the server: a refused or timed out connect"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+def send_with_retries(send, buckets, attempts=RETRY_ATTEMPTS, slot=None, idempotent=True):
+    """
+    Call send() once every bucket has a token, retrying rate limited, unavailable and failed
+    connections with jittered backoff. A Retry-After longer than RETRY_MAX_DELAY is not waited
+    out; the response is returned for the caller to fail fast.
+
+    A request that isn't idempotent (a POST) is only retried after a failed connection when it
+    never reached the server; a read timeout or a dropped connection may have done the work already.
+    slot, a semaphore, is acquired for each attempt and released before any wait, so backoff
+    doesn't hold it; the returned response still holds it, for the caller to release when done.
+    """
+    for attempt in range(attempts + 1):
+        wait = max(bucket.reserve() for bucket in buckets) if buckets else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        if slot is not None:
+            slot.acquire()
+        try:
+            response = send()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if slot is not None:
+                slot.release()
+            if attempt == attempts or not (idempotent or _never_sent(e)):
+                raise
+            time.sleep(backoff(attempt))
+            continue
+        except BaseException:
+            if slot is not None:
+                slot.release()
+            raise
+
+        if response.status_code not in RETRY_STATUSES:
+            return response
+
+        delay = retry_after(response)
+        if response.status_code == 429:
+            for bucket in buckets:
+                bucket.penalize(delay if delay is not None else backoff(attempt))
+        if attempt == attempts or (delay is not None and delay > RETRY_MAX_DELAY):
+            return response
+        print(f"Upstream returned {response.status_code}, retrying (attempt {attempt + 1} of {attempts})")
+        response.close()
+        if slot is not None:
+            slot.release()
+        time.sleep(delay if delay is not None else backoff(attempt))
+    return response
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class Coalescer:
+    """Runs one call per key at a time; callers arriving while it runs share its result"""
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+trello_token_limiter = RateLimiter(TRELLO_TOKEN_RATE, TRELLO_TOKEN_BURST)
+trello_key_limiter = RateLimiter(TRELLO_KEY_RATE, TRELLO_KEY_BURST, maxsize=16)
+gemini_limiter = RateLimiter(GEMINI_RATE, GEMINI_BURST, maxsize=16)
+trello_requests = Coalescer()
+
+def limiter_stats():
+    return {
+        "trello_tokens": trello_token_limiter.stats(),
+        "trello_keys": trello_key_limiter.stats(),
+        "gemini": gemini_limiter.stats(),
+        "coalesced_requests": trello_requests.coalesced
+    }
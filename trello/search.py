@@ -0,0 +1,344 @@
+"""
+In-process search over the cards of every synced board: an inverted index of card names
+and descriptions, plus facet indexes on labels, members, lists, boards and due dates.
+Boards are indexed as their snapshots are stored, so queries never call Trello.
+"""
+import bisect
+import heapq
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime
+
+from trello.pages import CARD_DESC_PREVIEW
+
+# Boards kept in the index; the least recently synced ones are dropped past this
+SEARCH_MAX_BOARDS = int(os.environ.get("SEARCH_MAX_BOARDS", "1000"))
+SEARCH_MAX_RESULTS = 200
+# Values listed per facet in search results
+SEARCH_FACET_SIZE = int(os.environ.get("SEARCH_FACET_SIZE", "10"))
+# Query terms at least this long also match longer words they start
+PREFIX_MIN_LENGTH = 3
+# Ranking weight of a word in a card's name, against 1 for its description
+NAME_WEIGHT = 3
+DUE_SOON_DAYS = 7
+
+FACETS = ("label", "member", "list", "board")
+_WORD = re.compile(r"\w+")
+
+def tokenize(text):
+    """Lowercase words in text"""
+    return _WORD.findall(text.lower()) if text else []
+
+def parse_due(due):
+    """A Trello due date (ISO 8601) as a Unix timestamp, or None"""
+    if not due:
+        return None
+    try:
+        return datetime.fromisoformat(due.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+def _card_signature(board, trello_list, card):
+    """Everything the index keeps about a card; a card is reindexed when this changes"""
+    return (
+        card.get("name"), card.get("desc"), card.get("due"), bool(card.get("dueComplete")),
+        tuple((label.get("id"), label.get("name"), label.get("color")) for label in card.get("labels", [])),
+        tuple((member.get("id"), member.get("fullName"), member.get("username")) for member in card.get("members", [])),
+        trello_list["id"], trello_list.get("name"), board.get("name")
+    )
+
+class _IndexedCard:
+    """
+    What the index keeps about a card. Results are built from these fields and the facets
+    when a query returns the card, rather than keeping a card_view dict for every card.
+    """
+    __slots__ = ("card_id", "board_id", "name", "desc", "desc_truncated", "due_text", "due_complete", "terms", "facets", "due", "sort_key")
+
+    def view(self):
+        """The card as pages.card_view shows it, with its board and list"""
+        view = {
+            "id": self.card_id,
+            "name": self.name,
+            "desc": self.desc,
+            "desc_truncated": self.desc_truncated,
+            "due": self.due_text,
+            "dueComplete": self.due_complete,
+            "labels": [],
+            "members": []
+        }
+        for facet, value_id, name, aliases in self.facets:
+            if facet == "label":
+                view["labels"].append({"name": aliases[0], "color": aliases[1]})
+            elif facet == "member":
+                view["members"].append(name or "N/A")
+            else:
+                view[facet] = {"id": value_id, "name": name}
+        return view
+
+class SearchIndex:
+    """Inverted and facet indexes over the cards of many boards, updated a board at a time"""
+
+    def __init__(self, max_boards=SEARCH_MAX_BOARDS):
+        self.max_boards = max_boards
+        self._lock = threading.RLock()
+        # board id -> {"fingerprint", "cards": {card id: signature}}, least recently updated first
+        self._boards = OrderedDict()
+        self._cards = {}
+        # word -> {card id: weight}
+        self._postings = {}
+        self._vocabulary = []
+        self._vocabulary_stale = False
+        # facet -> value id -> card ids, and facet -> value id -> (display name, lowercase aliases, raw aliases)
+        self._facets = {facet: defaultdict(set) for facet in FACETS}
+        self._facet_names = {facet: {} for facet in FACETS}
+        # (due timestamp, card id), sorted, for due date ranges
+        self._due = []
+        self.updates = 0
+        self.cards_indexed = 0
+
+    def update_board(self, board_id, snapshot):
+        """Index a board's snapshot, touching only the cards that changed since it was last indexed"""
+        board = snapshot["board"]
+        fingerprint = snapshot.get("fingerprint")
+        with self._lock:
+            state = self._boards.get(board_id)
+            if state is not None and fingerprint and state["fingerprint"] == fingerprint:
+                self._boards.move_to_end(board_id)
+                return
+
+            previous = state["cards"] if state is not None else {}
+            current = {}
+            for trello_list in snapshot["lists"]:
+                for card in trello_list.get("cards", []):
+                    signature = _card_signature(board, trello_list, card)
+                    current[card["id"]] = signature
+                    if previous.get(card["id"]) != signature:
+                        entry = self._cards.get(card["id"])
+                        if entry is not None and entry.board_id != board_id and entry.board_id in self._boards:
+                            # Moved here from another board
+                            self._boards[entry.board_id]["cards"].pop(card["id"], None)
+                        self._remove_card(card["id"])
+                        self._add_card(board_id, board, trello_list, card)
+            for card_id in previous.keys() - current.keys():
+                self._remove_card(card_id, board_id)
+
+            self._boards[board_id] = {"fingerprint": fingerprint, "cards": current}
+            self._boards.move_to_end(board_id)
+            self.updates += 1
+            while len(self._boards) > self.max_boards:
+                self.remove_board(next(iter(self._boards)))
+
+    def remove_board(self, board_id):
+        with self._lock:
+            state = self._boards.pop(board_id, None)
+            if state is not None:
+                for card_id in state["cards"]:
+                    self._remove_card(card_id, board_id)
+
+    def has_board(self, board_id):
+        with self._lock:
+            return board_id in self._boards
+
+    def _add_card(self, board_id, board, trello_list, card):
+        card_id = card["id"]
+        entry = _IndexedCard()
+        entry.card_id = card_id
+        entry.board_id = board_id
+        entry.name = card.get("name", "Unnamed Card")
+        desc = card.get("desc") or ""
+        entry.desc_truncated = len(desc) > CARD_DESC_PREVIEW
+        entry.desc = desc[:CARD_DESC_PREVIEW].rstrip() + "…" if entry.desc_truncated else desc
+        entry.due_text = card.get("due")
+        entry.due_complete = bool(card.get("dueComplete"))
+
+        # Interned, so a word is held once however many cards use it
+        terms = Counter(map(sys.intern, tokenize(card.get("desc"))))
+        for word in map(sys.intern, tokenize(card.get("name"))):
+            terms[word] += NAME_WEIGHT
+        for word, weight in terms.items():
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                self._vocabulary_stale = True
+            postings[card_id] = weight
+        entry.terms = tuple(terms)
+
+        facets = []
+        for label in card.get("labels", []):
+            name = label.get("name") or label.get("color") or ""
+            facets.append(("label", label.get("id") or name, name, (label.get("name"), label.get("color"))))
+        for member in card.get("members", []):
+            facets.append(("member", member["id"], member.get("fullName"), (member.get("fullName"), member.get("username"))))
+        facets.append(("list", trello_list["id"], trello_list.get("name"), (trello_list.get("name"),)))
+        facets.append(("board", board_id, board.get("name"), (board.get("name"),)))
+        entry.facets = tuple(facets)
+        for facet, value_id, name, aliases in entry.facets:
+            self._facets[facet][value_id].add(card_id)
+            names = self._facet_names[facet]
+            known = names.get(value_id)
+            # The latest name seen for a label, member, list or board is the one it's found by
+            if known is None or known[2] != aliases:
+                names[value_id] = (name, {alias.lower() for alias in aliases if alias} | {value_id.lower()}, aliases)
+
+        entry.due = parse_due(card.get("due"))
+        if entry.due is not None:
+            bisect.insort(self._due, (entry.due, card_id))
+        # Without a text query, results come soonest due first, then by name
+        entry.sort_key = (entry.due if entry.due is not None else float("inf"), entry.name.lower(), card_id)
+
+        self._cards[card_id] = entry
+        self.cards_indexed += 1
+
+    def _remove_card(self, card_id, board_id=None):
+        """Drop a card, unless board_id is given and the card is now indexed under another board"""
+        entry = self._cards.get(card_id)
+        if entry is None or (board_id is not None and entry.board_id != board_id):
+            return
+        del self._cards[card_id]
+
+        for word in entry.terms:
+            postings = self._postings[word]
+            postings.pop(card_id, None)
+            if not postings:
+                del self._postings[word]
+                self._vocabulary_stale = True
+        for facet, value_id, _, _ in entry.facets:
+            card_ids = self._facets[facet].get(value_id)
+            if card_ids is not None:
+                card_ids.discard(card_id)
+                if not card_ids:
+                    del self._facets[facet][value_id]
+                    self._facet_names[facet].pop(value_id, None)
+        if entry.due is not None:
+            index = bisect.bisect_left(self._due, (entry.due, card_id))
+            if index < len(self._due) and self._due[index] == (entry.due, card_id):
+                del self._due[index]
+
+    def _term_matches(self, term):
+        """{card id: weight} for cards with the word term, or a word starting with it"""
+        if len(term) < PREFIX_MIN_LENGTH:
+            return self._postings.get(term, {})
+        if self._vocabulary_stale:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_stale = False
+        matches = {}
+        start = bisect.bisect_left(self._vocabulary, term)
+        for word in self._vocabulary[start:]:
+            if not word.startswith(term):
+                break
+            for card_id, weight in self._postings[word].items():
+                matches[card_id] = matches.get(card_id, 0) + weight
+        return matches
+
+    def _facet_cards(self, facet, value):
+        """Cards with a facet value, matched by id or case-insensitively by name"""
+        value = value.lower()
+        card_ids = set()
+        for value_id, (_, aliases, _) in self._facet_names[facet].items():
+            if value in aliases:
+                card_ids |= self._facets[facet][value_id]
+        return card_ids
+
+    def _due_cards(self, start=None, end=None):
+        """Cards due at or after start and before end"""
+        low = 0 if start is None else bisect.bisect_left(self._due, (start,))
+        high = len(self._due) if end is None else bisect.bisect_left(self._due, (end,))
+        return {card_id for _, card_id in self._due[low:high]}
+
+    def _due_filter(self, due, now):
+        if due == "overdue":
+            return {card_id for card_id in self._due_cards(end=now) if not self._cards[card_id].due_complete}
+        if due == "soon":
+            return {card_id for card_id in self._due_cards(now, now + DUE_SOON_DAYS * 86400) if not self._cards[card_id].due_complete}
+        if due == "any":
+            return {card_id for _, card_id in self._due}
+        if due == "none":
+            return {card_id for card_id, entry in self._cards.items() if entry.due is None}
+        raise ValueError("due must be one of overdue, soon, any or none.")
+
+    def search(self, query="", filters=None, board_ids=None, due=None, due_after=None, due_before=None,
+               limit=50, offset=0, now=None):
+        """
+        Cards matching every word of query (words of 3+ letters also match as prefixes) and every
+        filter ({facet: value}), within board_ids. due is "overdue", "soon", "any" or "none";
+        due_after and due_before are Unix timestamps. Returns the page of results with the
+        total and per-facet counts over all matches.
+        """
+        now = time.time() if now is None else now
+        limit = max(0, min(limit, SEARCH_MAX_RESULTS))
+        with self._lock:
+            sets = []
+            if board_ids is not None:
+                scope = set()
+                for board_id in board_ids:
+                    scope |= self._facets["board"].get(board_id, set())
+                sets.append(scope)
+            for facet, value in (filters or {}).items():
+                sets.append(self._facet_cards(facet, value))
+            if due:
+                sets.append(self._due_filter(due, now))
+            if due_after is not None or due_before is not None:
+                sets.append(self._due_cards(due_after, due_before))
+
+            scores = None
+            for term in dict.fromkeys(tokenize(query)):
+                matches = self._term_matches(term)
+                if scores is None:
+                    scores = dict(matches)
+                else:
+                    scores = {card_id: score + matches[card_id] for card_id, score in scores.items() if card_id in matches}
+
+            if scores is not None:
+                sets.append(scores.keys())
+            if sets:
+                sets.sort(key=len)
+                card_ids = set(sets[0])
+                for other in sets[1:]:
+                    card_ids.intersection_update(other)
+            else:
+                card_ids = set(self._cards)
+
+            cards = self._cards
+            if scores is not None:
+                # Best text match first
+                ranked = [(-scores[card_id],) + cards[card_id].sort_key for card_id in card_ids]
+            else:
+                ranked = [cards[card_id].sort_key for card_id in card_ids]
+            # Sort keys end with the card id
+            page = heapq.nsmallest(offset + limit, ranked)[offset:]
+            return {
+                "total": len(card_ids),
+                "results": [cards[key[-1]].view() for key in page],
+                "facets": self._facet_counts(card_ids)
+            }
+
+    def _facet_counts(self, card_ids):
+        """The most common values of each facet among card_ids"""
+        facets = {}
+        for facet in FACETS:
+            counts = []
+            for value_id, value_cards in self._facets[facet].items():
+                count = len(card_ids.intersection(value_cards))
+                if count:
+                    counts.append((count, value_id))
+            facets[facet] = [
+                {"id": value_id, "name": self._facet_names[facet][value_id][0], "count": count}
+                for count, value_id in heapq.nlargest(SEARCH_FACET_SIZE, counts, key=lambda item: item[0])
+            ]
+        return facets
+
+    def stats(self):
+        with self._lock:
+            return {
+                "boards": len(self._boards),
+                "cards": len(self._cards),
+                "words": len(self._postings),
+                "updates": self.updates,
+                "cards_indexed": self.cards_indexed
+            }
+
+search_index = SearchIndex()
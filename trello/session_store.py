@@ -0,0 +1,131 @@
+"""
+Server-side Flask sessions: the cookie carries only a random session id and the data stays
+in an in-memory LRU or a SQLite file shared by the workers on a host
+"""
+import os
+import secrets
+
+from flask.sessions import SessionInterface, SessionMixin
+
+from trello.cache import LRUCache, SQLiteCache, Sweeper
+
+# "sqlite" (shared by workers), "memory" (single worker) or "cookie" (Flask's signed cookie)
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "sqlite")
+SESSION_STORE_PATH = os.environ.get("SESSION_STORE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "sessions.db"))
+# Sessions expire this many seconds after they were last changed
+SESSION_TTL = int(os.environ.get("SESSION_TTL", str(7 * 24 * 3600)))
+SESSION_MAX_ENTRIES = int(os.environ.get("SESSION_MAX_ENTRIES", "10000"))
+SESSION_SWEEP_INTERVAL = int(os.environ.get("SESSION_SWEEP_INTERVAL", "600"))
+
+class ServerSession(SessionMixin):
+    """Session dict that reads its data from the store the first time it is used"""
+
+    def __init__(self, store, sid=None):
+        self.store = store
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self.retired_sid = None
+        self._data = None
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self.accessed = True
+            stored = self.store.get(self.sid) if self.sid else None
+            if stored is None:
+                # Unknown or expired ids are never reused, a write gets a fresh one
+                self.sid = None
+            self._data = dict(stored) if stored else {}
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def regenerate(self):
+        """Move the data to a new session id when the session is saved, so an id known before login is useless after it"""
+        # Loaded first, since the data is read through the old id
+        self.data
+        if self.sid:
+            self.retired_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+    def clear(self):
+        # Clearing doesn't need the old data
+        self.accessed = True
+        self._data = {}
+        self.modified = True
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface storing session dicts in a cache keyed by the cookie's session id"""
+
+    def __init__(self, store, ttl=SESSION_TTL, sweep_interval=SESSION_SWEEP_INTERVAL):
+        self.store = store
+        self.ttl = ttl
+        self._sweeper = Sweeper(store, sweep_interval, name="session-sweeper")
+
+    def open_session(self, app, request):
+        # No store I/O here, routes that never touch the session never load it
+        return ServerSession(self.store, request.cookies.get(self.get_cookie_name(app)))
+
+    def save_session(self, app, session, response):
+        if session.accessed:
+            response.vary.add("Cookie")
+        if not session.loaded or not session.modified:
+            return
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.retired_sid:
+            self.store.delete(session.retired_sid)
+        if not session.data:
+            if session.sid or session.retired_sid:
+                if session.sid:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        self._sweeper.ensure_running()
+        sid = session.sid or secrets.token_urlsafe(32)
+        self.store.set(sid, session.data, self.ttl)
+        if sid != session.sid or session.permanent:
+            response.set_cookie(
+                name,
+                sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+
+def make_session_interface(backend=None):
+    """Create the session interface for the configured backend, or None to keep Flask's cookie sessions"""
+    backend = backend or SESSION_BACKEND
+    if backend == "cookie":
+        return None
+    if backend == "memory":
+        return ServerSessionInterface(LRUCache(maxsize=SESSION_MAX_ENTRIES, ttl=SESSION_TTL))
+    return ServerSessionInterface(SQLiteCache(SESSION_STORE_PATH, ttl=SESSION_TTL, table="sessions"))
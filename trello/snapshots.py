@@ -0,0 +1,385 @@
+"""
+Local board snapshots kept current by applying Trello actions instead of refetching boards
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from datetime import datetime, timezone
+
+from trello.api import _get_json, _user_key, attach_members, fetch_board, CARD_FIELDS, LIST_FIELDS
+from trello.cache import make_cache, LRUCache
+from trello.compact import compact_snapshot
+from trello.search import search_index
+from trello.tracing import traced
+from trello.workers import fetch_all
+
+SNAPSHOT_CACHE_SIZE = int(os.environ.get("SNAPSHOT_CACHE_SIZE", "256"))
+SNAPSHOT_TTL = int(os.environ.get("SNAPSHOT_TTL", str(7 * 24 * 3600)))
+SNAPSHOT_STORE_PATH = os.environ.get("SNAPSHOT_STORE_PATH")
+# Keep snapshots in memory as compact records (trello.compact) rather than Trello's nested dicts
+SNAPSHOT_COMPACT = os.environ.get("SNAPSHOT_COMPACT", "1") == "1"
+# Trello returns at most 1000 actions per call; a board with more changes is refetched whole
+ACTIONS_LIMIT = 1000
+# Past this many cards to refetch individually, one full board fetch is cheaper
+MAX_CARD_REFETCH = int(os.environ.get("SNAPSHOT_MAX_CARD_REFETCH", "20"))
+# A snapshot kept current by webhooks is served without asking Trello for this many seconds
+# after its last sync or delivery, to users who have read the board within the same window
+SNAPSHOT_LIVE_TTL = int(os.environ.get("SNAPSHOT_LIVE_TTL", "300"))
+# Webhook deliveries reach one worker, so snapshots are only served as webhook-fed, and
+# webhooks only registered, when every worker reads the same store
+SNAPSHOTS_SHARED = bool(SNAPSHOT_STORE_PATH)
+
+# Action types that can change what a board view shows
+SYNC_ACTIONS = (
+    "createCard,copyCard,updateCard,deleteCard,moveCardToBoard,moveCardFromBoard,"
+    "convertToCardFromCheckItem,addMemberToCard,removeMemberFromCard,"
+    "addLabelToCard,removeLabelFromCard,createList,updateList,moveListToBoard,"
+    "moveListFromBoard,updateBoard"
+)
+# Queries for refetching a board's lists and single cards marked dirty
+LISTS_PARAMS = {"fields": LIST_FIELDS, "filter": "open"}
+CARD_PARAMS = {"fields": CARD_FIELDS + ",idBoard,closed"}
+# Card fields an updateCard action carries its new value for
+PATCHABLE_CARD_FIELDS = {"name", "desc", "due", "dueComplete", "pos", "idList", "closed"}
+
+snapshot_store = make_cache(
+    SNAPSHOT_CACHE_SIZE, ttl=SNAPSHOT_TTL, path=SNAPSHOT_STORE_PATH, table="snapshots",
+    prepare=compact_snapshot if SNAPSHOT_COMPACT else None
+)
+# "<user>:<board id>" keys for users whose token recently read a board
+board_access = LRUCache(maxsize=SNAPSHOT_CACHE_SIZE * 16, ttl=SNAPSHOT_LIVE_TTL)
+
+# A board's lock lasts while someone holds or waits on it, so boards synced once don't keep theirs
+_board_locks = weakref.WeakValueDictionary()
+_board_locks_guard = threading.Lock()
+
+def save_snapshot(board_id, snapshot):
+    """Store a board's changed snapshot and bring the search index up to date with it"""
+    snapshot_store.set(board_id, snapshot)
+    search_index.update_board(board_id, snapshot)
+
+def index_stored_boards(board_ids):
+    """Add stored snapshots of these boards to the search index if they aren't in it yet; returns the boards with no snapshot"""
+    missing = []
+    for board_id in board_ids:
+        if search_index.has_board(board_id):
+            continue
+        snapshot = snapshot_store.get(board_id)
+        if snapshot is None:
+            missing.append(board_id)
+        else:
+            search_index.update_board(board_id, snapshot)
+    return missing
+
+def board_lock(board_id):
+    """Lock serializing updates to one board's snapshot within this process"""
+    with _board_locks_guard:
+        lock = _board_locks.get(board_id)
+        if lock is None:
+            lock = _board_locks[board_id] = threading.Lock()
+        return lock
+
+def fingerprint(board, lists):
+    """Strong validator for a board's content: the same board and lists always give the same value"""
+    encoded = json.dumps([board, lists], sort_keys=True, separators=(",", ":"), default=_json_value)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32]
+
+def _json_value(value):
+    # Compact records encode as the dicts they stand for
+    return value.to_json() if hasattr(value, "to_json") else str(value)
+
+def snapshot_fingerprint(snapshot):
+    """A snapshot's content fingerprint, computed for snapshots stored before fingerprints existed"""
+    return snapshot.get("fingerprint") or fingerprint(snapshot["board"], snapshot["lists"])
+
+def _new_snapshot(board, lists, latest_action):
+    return {
+        "board": board,
+        "lists": lists,
+        "fingerprint": fingerprint(board, lists),
+        "last_action_id": latest_action["id"] if latest_action else None,
+        "last_action_date": latest_action["date"] if latest_action else None,
+        "dirty_cards": [],
+        "lists_dirty": False,
+        "stale": False,
+        "synced_at": time.time()
+    }
+
+class _SnapshotEditor:
+    """
+    Applies changes to a copy of a snapshot. Lists are copied shallowly and changed cards are
+    replaced rather than edited, so readers of the original snapshot never see partial updates.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = dict(snapshot)
+        self.board = dict(snapshot["board"])
+        self.lists = [dict(trello_list, cards=list(trello_list["cards"])) for trello_list in snapshot["lists"]]
+        self.lists_by_id = {trello_list["id"]: trello_list for trello_list in self.lists}
+        self.card_lists = {card["id"]: trello_list for trello_list in self.lists for card in trello_list["cards"]}
+        self.dirty_cards = set(snapshot.get("dirty_cards", []))
+        self.lists_dirty = snapshot.get("lists_dirty", False)
+        self.stale = snapshot.get("stale", False)
+        self.touched_lists = set()
+
+    def find_card(self, card_id):
+        trello_list = self.card_lists.get(card_id)
+        if trello_list is None:
+            return None
+        for card in trello_list["cards"]:
+            if card["id"] == card_id:
+                return card
+        return None
+
+    def remove_card(self, card_id):
+        trello_list = self.card_lists.pop(card_id, None)
+        if trello_list is not None:
+            trello_list["cards"] = [card for card in trello_list["cards"] if card["id"] != card_id]
+        self.dirty_cards.discard(card_id)
+
+    def put_card(self, card):
+        """Insert or replace a card, placing it in the list named by its idList"""
+        self.remove_card(card["id"])
+        if card.get("closed"):
+            return
+        trello_list = self.lists_by_id.get(card.get("idList"))
+        if trello_list is None:
+            # The card moved to a list we don't know yet; refresh the lists before placing it
+            self.lists_dirty = True
+            self.dirty_cards.add(card["id"])
+            return
+        trello_list["cards"].append(card)
+        self.card_lists[card["id"]] = trello_list
+        self.touched_lists.add(trello_list["id"])
+
+    def apply(self, action):
+        """Apply one Trello action, marking cards or lists for refetch when the action lacks the data"""
+        action_type = action.get("type")
+        data = action.get("data", {})
+        card_data = data.get("card") or {}
+        card_id = card_data.get("id")
+
+        if action_type == "updateCard" and card_id:
+            changed = set(data.get("old", {}))
+            card = self.find_card(card_id)
+            if card is None or not changed <= PATCHABLE_CARD_FIELDS:
+                self.dirty_cards.add(card_id)
+                return
+            updated = dict(card)
+            for field in changed:
+                updated[field] = card_data.get(field)
+            if "idList" in changed:
+                updated["idList"] = (data.get("listAfter") or {}).get("id", card_data.get("idList"))
+            self.put_card(updated)
+        elif action_type in ("deleteCard", "moveCardFromBoard") and card_id:
+            self.remove_card(card_id)
+        elif card_id:
+            # Creations, label and member changes: the action doesn't carry the whole card
+            self.dirty_cards.add(card_id)
+        elif action_type == "updateBoard":
+            for field in ("name", "desc"):
+                if field in data.get("old", {}):
+                    self.board[field] = (data.get("board") or {}).get(field)
+        elif action_type == "moveListToBoard" or (
+                action_type == "updateList" and "closed" in data.get("old", {}) and not (data.get("list") or {}).get("closed")):
+            # A list arriving from another board or the archive brings cards we have never seen
+            self.stale = True
+        elif action_type in ("createList", "updateList", "moveListFromBoard"):
+            self.lists_dirty = True
+
+    def replace_lists(self, fetched_lists):
+        """Swap in a fresh list of lists, keeping cards of lists that still exist"""
+        lists = []
+        for fetched in fetched_lists:
+            existing = self.lists_by_id.get(fetched["id"])
+            lists.append(dict(fetched, cards=existing["cards"] if existing else []))
+        self.lists = lists
+        self.lists_by_id = {trello_list["id"]: trello_list for trello_list in lists}
+        self.card_lists = {card["id"]: trello_list for trello_list in lists for card in trello_list["cards"]}
+        self.lists_dirty = False
+
+    def result(self):
+        for trello_list in self.lists:
+            if trello_list["id"] in self.touched_lists:
+                trello_list["cards"].sort(key=lambda card: card.get("pos", 0))
+        self.snapshot.update(
+            board=self.board,
+            lists=self.lists,
+            dirty_cards=sorted(self.dirty_cards),
+            lists_dirty=self.lists_dirty,
+            stale=self.stale,
+            fingerprint=fingerprint(self.board, self.lists)
+        )
+        return self.snapshot
+
+def apply_actions(snapshot, actions, advance=True):
+    """
+    Returns a new snapshot with actions (oldest first) applied. Changes the actions don't fully
+    describe are recorded in dirty_cards and lists_dirty for the next sync to refetch, and
+    changes that need the whole board refetched set stale. With advance=False the watermark
+    stays put, so the next actions sync replays them and fills in anything missed.
+    """
+    editor = _SnapshotEditor(snapshot)
+    for action in actions:
+        editor.apply(action)
+    snapshot = editor.result()
+    if actions and advance:
+        snapshot["last_action_id"] = actions[-1]["id"]
+        snapshot["last_action_date"] = actions[-1].get("date")
+    return snapshot
+
+def _refetch(trello, board_id, snapshot):
+    """Fetch the lists and cards a snapshot has marked dirty; returns None if a full fetch is needed"""
+    editor = _SnapshotEditor(snapshot)
+    if editor.lists_dirty:
+        # New lists start empty; cards moved onto them are already marked dirty
+        editor.replace_lists(_get_json(trello, f"/boards/{board_id}/lists", params=LISTS_PARAMS))
+
+    card_ids = sorted(editor.dirty_cards)
+    calls = [
+        lambda card_id=card_id: _get_card(trello, card_id)
+        for card_id in card_ids
+    ]
+    cards = [card for card in fetch_all(calls, user_key=_user_key(trello)) if card is not None]
+    attach_members(trello, cards)
+    return _apply_refetched(editor, board_id, card_ids, cards)
+
+def _apply_refetched(editor, board_id, card_ids, cards):
+    """Put refetched cards into the editor's snapshot, dropping dirty cards that are gone or left the board"""
+    fetched_ids = set()
+    for card in cards:
+        fetched_ids.add(card["id"])
+        if card.get("idBoard", board_id) != board_id:
+            editor.remove_card(card["id"])
+        else:
+            editor.put_card(card)
+    for card_id in card_ids:
+        if card_id not in fetched_ids:
+            editor.remove_card(card_id)
+    editor.dirty_cards.clear()
+    snapshot = editor.result()
+    # A card put on a list we still don't know about means the board changed under us
+    return None if snapshot["lists_dirty"] or snapshot["dirty_cards"] else snapshot
+
+def _get_card(trello, card_id):
+    """Fetch one card, or None if it no longer exists"""
+    try:
+        card = _get_json(trello, f"/cards/{card_id}", params=CARD_PARAMS)
+    except Exception as e:
+        if getattr(getattr(e, "response", None), "status_code", None) == 404:
+            return None
+        raise
+    return None if card.get("closed") else card
+
+def _full_sync(trello, board_id, previous=None):
+    return _store_fetched(board_id, fetch_board(trello, board_id), previous)
+
+def _store_fetched(board_id, fetched, previous=None):
+    """Store a freshly fetched (board, lists, latest_action) as the board's snapshot"""
+    board, lists, latest_action = fetched
+    snapshot = _new_snapshot(board, lists, latest_action)
+    if previous is not None and previous.get("webhook_id"):
+        snapshot["webhook_id"] = previous["webhook_id"]
+    save_snapshot(board_id, snapshot)
+    return snapshot
+
+def is_clean(snapshot):
+    """Whether a snapshot has nothing waiting to be refetched"""
+    return not snapshot["dirty_cards"] and not snapshot["lists_dirty"] and not snapshot.get("stale")
+
+def current_snapshot(board_id):
+    """
+    A board's stored snapshot as the shared store has it. Another worker may have applied a
+    webhook delivery since this one's in-memory copy was read.
+    """
+    return getattr(snapshot_store, "disk", snapshot_store).get(board_id)
+
+def _is_live(snapshot, user_key, board_id):
+    """Whether a webhook-fed snapshot can be served to this user without asking Trello"""
+    return (
+        SNAPSHOTS_SHARED
+        and user_key is not None
+        and snapshot.get("webhook_id")
+        and is_clean(snapshot)
+        and time.time() - snapshot["synced_at"] < SNAPSHOT_LIVE_TTL
+        and board_access.get(f"{user_key}:{board_id}") is not None
+    )
+
+@traced()
+def sync_snapshot(trello, board_id):
+    """
+    Bring the stored snapshot of a board up to date and return it. The first sync fetches
+    the whole board; later ones fetch only the actions since the last one seen, plus any cards
+    those actions don't describe fully.
+    """
+    user_key = _user_key(trello)
+    snapshot = current_snapshot(board_id) if SNAPSHOTS_SHARED else None
+    if snapshot is not None and _is_live(snapshot, user_key, board_id):
+        return snapshot
+
+    # Concurrent loads of one board share a single sync instead of racing each other
+    with board_lock(board_id):
+        snapshot = _sync_from_trello(trello, board_id, snapshot_store.get(board_id))
+    if user_key is not None:
+        board_access.set(f"{user_key}:{board_id}", True)
+    return snapshot
+
+def actions_params(snapshot):
+    """Query for the board actions since a snapshot's watermark"""
+    since = snapshot["last_action_date"] or datetime.fromtimestamp(snapshot["synced_at"], timezone.utc).isoformat()
+    return {
+        "filter": SYNC_ACTIONS,
+        "since": since,
+        "limit": ACTIONS_LIMIT,
+        "fields": "type,date,data",
+        "memberCreator": "false"
+    }
+
+def new_actions(snapshot, actions):
+    """Actions from the actions endpoint that a snapshot hasn't seen, oldest first"""
+    # Trello lists newest actions first, and may repeat the action the watermark came from
+    return [action for action in reversed(actions) if action["id"] != snapshot["last_action_id"]]
+
+def _confirm_current(board_id, snapshot):
+    """Record that Trello had no changes for a snapshot"""
+    if snapshot.get("webhook_id"):
+        # Confirmed current, so the snapshot can be served live again
+        snapshot = dict(snapshot, synced_at=time.time())
+        snapshot_store.set(board_id, snapshot)
+    return snapshot
+
+def _sync_from_trello(trello, board_id, snapshot):
+    if snapshot is None:
+        return _full_sync(trello, board_id)
+
+    actions = _get_json(trello, f"/boards/{board_id}/actions", params=actions_params(snapshot))
+    if len(actions) >= ACTIONS_LIMIT:
+        return _full_sync(trello, board_id, snapshot)
+
+    actions = new_actions(snapshot, actions)
+    if not actions and is_clean(snapshot):
+        return _confirm_current(board_id, snapshot)
+
+    previous = snapshot
+    snapshot = apply_actions(snapshot, actions)
+    if snapshot["stale"]:
+        return _full_sync(trello, board_id, previous)
+    if snapshot["lists_dirty"] or snapshot["dirty_cards"]:
+        if len(snapshot["dirty_cards"]) > MAX_CARD_REFETCH:
+            return _full_sync(trello, board_id, previous)
+        refetched = _refetch(trello, board_id, snapshot)
+        if refetched is None:
+            return _full_sync(trello, board_id, previous)
+        snapshot = refetched
+
+    snapshot["synced_at"] = time.time()
+    save_snapshot(board_id, snapshot)
+    return snapshot
+
+def sync_board(trello, board_id):
+    """Get details for a board from its synced snapshot, in the (board, lists) shape of get_board_details"""
+    snapshot = sync_snapshot(trello, board_id)
+    return snapshot["board"], snapshot["lists"]
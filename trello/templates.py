@@ -1,6 +1,19 @@
 """
 Templates for rendering HTML pages
 """
+import hashlib
+import os
+
+from flask import Response, current_app, stream_with_context, url_for
+from jinja2 import ChoiceLoader, DictLoader
+
+from trello.tracing import traced_iter
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
+# Template output pieces sent per chunk when a page is streamed
+STREAM_BUFFER_ITEMS = 100
+# Static assets are requested with a content hash, so browsers may keep them for a year
+STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", str(365 * 24 * 3600)))
 
 # Template for the index page
 INDEX_TEMPLATE = """
@@ -8,31 +21,9 @@ INDEX_TEMPLATE = """
 <html>
 <head>
     <title>Trello OAuth</title>
-    <style>
-        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f9f9f9; }
-        h1 { color: #0079BF; }
-        .login-button { 
-            display: inline-block; 
-            padding: 10px 20px; 
-            background-color: #0079BF; 
-            color: white; 
-            text-decoration: none; 
-            border-radius: 5px;
-            font-weight: bold;
-        }
-        .login-button:hover { background-color: #005b8f; }
-        .container { 
-            max-width: 600px; 
-            margin: 100px auto; 
-            text-align: center;
-            padding: 20px;
-            background-color: white;
-            border-radius: 8px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('app.css') }}">
 </head>
-<body>
+<body class="index-page">
     <div class="container">
         <h1>Trello OAuth Demo</h1>
         <p>Connect with your Trello account to view your boards and cards.</p>
@@ -48,36 +39,9 @@ DASHBOARD_TEMPLATE = """
 <html>
 <head>
     <title>Trello Boards</title>
-    <style>
-        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f9f9f9; }
-        h1 { color: #0079BF; }
-        .container { 
-            max-width: 800px; 
-            margin: 0 auto; 
-            padding: 20px;
-            background-color: white;
-            border-radius: 8px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }
-        ul { list-style-type: none; padding: 0; }
-        li { margin: 10px 0; padding: 15px; background-color: #f0f0f0; border-radius: 5px; transition: all 0.2s ease; }
-        li:hover { transform: translateY(-2px); box-shadow: 0 4px 6px rgba(0,0,0,0.1); }
-        a { text-decoration: none; color: #0079BF; display: block; }
-        a:hover { text-decoration: underline; }
-        .logout { 
-            margin-top: 20px; 
-            display: inline-block; 
-            padding: 10px 20px; 
-            background-color: #EB5A46; 
-            color: white; 
-            border-radius: 5px;
-            text-decoration: none;
-        }
-        .logout:hover { background-color: #CF513D; }
-        .header { display: flex; justify-content: space-between; align-items: center; }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('app.css') }}">
 </head>
-<body>
+<body class="dashboard-page">
     <div class="container">
         <div class="header">
             <h1>Your Trello Boards</h1>
@@ -97,114 +61,34 @@ DASHBOARD_TEMPLATE = """
 
 # Template for the board view page
 BOARD_TEMPLATE = """
+{% macro render_card(card) %}
+<div class="card{% if card.dueComplete %} completed{% endif %}">
+<div class="card-title">{{ card.name }}</div>
+{% if card.desc %}
+<div class="card-desc">{{ card.desc }}{% if card.desc_truncated %} <a href="#" class="card-more" data-card="{{ card.id }}">more</a>{% endif %}</div>
+{% endif %}
+{% if card.due %}
+<div class="card-due">Due: {{ card.due }}</div>
+{% endif %}
+{% if card.labels %}
+<div class="card-labels">
+{% for label in card.labels %}
+<div class="card-label"{% if label.color %} style="background-color: {{ label.color }};"{% endif %} title="{{ label.name }}"></div>
+{% endfor %}
+</div>
+{% endif %}
+{% if card.members %}
+<div class="card-members">Members: {{ card.members|join(", ") }}</div>
+{% endif %}
+</div>
+{% endmacro %}
 <!DOCTYPE html>
 <html>
 <head>
     <title>{{ board.name }} - Trello Board</title>
-    <style>
-        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f9f9f9; }
-        h1 { color: #0079BF; margin: 0; }
-        .header { 
-            display: flex; 
-            justify-content: space-between; 
-            align-items: center; 
-            margin-bottom: 20px;
-            padding: 20px;
-            background-color: white;
-            border-radius: 8px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }
-        .board-container { 
-            display: flex; 
-            overflow-x: auto; 
-            padding-bottom: 20px; 
-            margin: 0 -10px; /* Offset for list padding */
-        }
-        .list { 
-            min-width: 300px; 
-            margin: 0 10px; 
-            background-color: #ebecf0; 
-            border-radius: 5px; 
-            padding: 10px; 
-            height: fit-content;
-            max-height: 80vh;
-            overflow-y: auto;
-        }
-        .list-header { 
-            font-weight: bold; 
-            margin-bottom: 10px; 
-            padding-bottom: 10px; 
-            border-bottom: 1px solid #ddd;
-        }
-        .card { 
-            background-color: white; 
-            padding: 10px; 
-            margin-bottom: 10px; 
-            border-radius: 3px; 
-            box-shadow: 0 1px 0 rgba(9,30,66,.25);
-            transition: all 0.2s ease;
-        }
-        .card:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 3px 5px rgba(9,30,66,.2);
-        }
-        .card-title { font-weight: bold; }
-        .card-desc { font-size: 14px; margin-top: 5px; color: #5e6c84; }
-        .card-due { font-size: 12px; color: #5e6c84; margin-top: 5px; }
-        .card-labels { display: flex; flex-wrap: wrap; margin-top: 5px; }
-        .card-label { 
-            height: 8px; 
-            width: 40px; 
-            border-radius: 4px; 
-            margin-right: 4px; 
-            margin-bottom: 4px; 
-        }
-        .card-members { font-size: 12px; color: #5e6c84; margin-top: 5px; }
-        .back-link { 
-            display: inline-block; 
-            color: #0079BF; 
-            text-decoration: none;
-            padding: 5px 10px;
-            border-radius: 3px;
-            transition: background-color 0.2s ease;
-        }
-        .back-link:hover { 
-            background-color: rgba(0, 121, 191, 0.1);
-            text-decoration: underline;
-        }
-        .completed { text-decoration: line-through; opacity: 0.7; }
-        .ai-report {
-            background-color: #e6f7ff; /* Light blue background */
-            border: 1px solid #91d5ff; /* Blue border */
-            border-radius: 5px;
-            padding: 15px;
-            margin-bottom: 20px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.05);
-        }
-        .ai-report h2 {
-            margin-top: 0;
-            color: #0050b3; /* Darker blue for heading */
-            font-size: 1.2em;
-        }
-        .ai-report h3 {
-            color: #0050b3; /* Darker blue for heading */
-            font-size: 1.1em;
-            margin-top: 15px;
-            margin-bottom: 10px;
-            border-bottom: 1px solid #91d5ff;
-            padding-bottom: 5px;
-        }
-        .ai-report p {
-            white-space: pre-wrap; /* Preserve line breaks from the report */
-            line-height: 1.6;
-        }
-        .ai-report ul {
-            margin-top: 5px;
-            padding-left: 20px;
-        }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('app.css') }}">
 </head>
-<body>
+<body class="board-page">
     <div class="header">
         <div>
             <a href="/dashboard" class="back-link">← Back to Boards</a>
@@ -218,34 +102,194 @@ BOARD_TEMPLATE = """
         <h2>AI Generated Board Report</h2>
         <p>{{ board_summary|safe }}</p>
     </div>
+    {% elif report_stream_url %}
+    <div class="ai-report">
+        <h2>AI Generated Board Report</h2>
+        <p id="ai-report-text">Generating report...</p>
+    </div>
+    <script>
+        (function streamReport() {
+            var reportText = document.getElementById("ai-report-text");
+            var source = new EventSource("{{ report_stream_url }}");
+            var started = false;
+            source.addEventListener("chunk", function (event) {
+                if (!started) {
+                    reportText.textContent = "";
+                    started = true;
+                }
+                reportText.textContent += JSON.parse(event.data).text;
+            });
+            source.addEventListener("done", function () { source.close(); });
+            source.addEventListener("failed", function (event) {
+                reportText.textContent = JSON.parse(event.data).error;
+                source.close();
+            });
+            source.onerror = function () {
+                if (!started) {
+                    reportText.textContent = "Could not generate a board report.";
+                }
+                source.close();
+            };
+        })();
+    </script>
     {% endif %}
     
     <div class="board-container">
         {% for list in lists %}
             <div class="list">
-                <div class="list-header">{{ list.name }}</div>
+                <div class="list-header">{{ list.name }} <span class="list-count">{{ list.total }}</span></div>
+                <div class="list-cards">
                 {% for card in list.cards %}
-                    <div class="card{% if card.dueComplete %} completed{% endif %}">
-                        <div class="card-title">{{ card.name }}</div>
-                        {% if card.desc %}<div class="card-desc">{{ card.desc }}</div>{% endif %}
-                        {% if card.due %}<div class="card-due">Due: {{ card.due }}</div>{% endif %}
-                        {% if card.labels %}
-                            <div class="card-labels">
-                                {% for label in card.labels %}
-                                    <div class="card-label" style="background-color: {% if label.color %}{{ label.color }}{% else %}#b3b3b3{% endif %};" title="{{ label.name }}"></div>
-                                {% endfor %}
-                            </div>
-                        {% endif %}
-                        {% if card.members %}
-                            <div class="card-members">
-                                Members: {% for member in card.members %}{{ member.fullName }}{% if not loop.last %}, {% endif %}{% endfor %}
-                            </div>
-                        {% endif %}
-                    </div>
+                    {{ render_card(card) }}
                 {% endfor %}
+                </div>
+                {% if list.remaining %}
+                    <button class="load-more" data-list="{{ list.id }}" data-offset="{{ list.cards|length }}">Load {{ list.remaining }} more cards</button>
+                {% endif %}
             </div>
         {% endfor %}
     </div>
+    <script>
+        (function lazyCards() {
+            var cardsUrl = "{{ cards_url }}";
+
+            function element(tag, className, text) {
+                var node = document.createElement(tag);
+                if (className) { node.className = className; }
+                if (text) { node.textContent = text; }
+                return node;
+            }
+
+            function renderCard(card) {
+                var node = element("div", "card" + (card.dueComplete ? " completed" : ""));
+                node.appendChild(element("div", "card-title", card.name));
+                if (card.desc) {
+                    var desc = element("div", "card-desc", card.desc);
+                    if (card.desc_truncated) {
+                        var more = element("a", "card-more", "more");
+                        more.href = "#";
+                        more.setAttribute("data-card", card.id);
+                        desc.appendChild(document.createTextNode(" "));
+                        desc.appendChild(more);
+                    }
+                    node.appendChild(desc);
+                }
+                if (card.due) { node.appendChild(element("div", "card-due", "Due: " + card.due)); }
+                if (card.labels.length) {
+                    var labels = element("div", "card-labels");
+                    card.labels.forEach(function (label) {
+                        var labelNode = element("div", "card-label");
+                        if (label.color) { labelNode.style.backgroundColor = label.color; }
+                        labelNode.title = label.name || "";
+                        labels.appendChild(labelNode);
+                    });
+                    node.appendChild(labels);
+                }
+                if (card.members.length) { node.appendChild(element("div", "card-members", "Members: " + card.members.join(", "))); }
+                return node;
+            }
+
+            function loadMore(button) {
+                if (button.disabled) { return; }
+                button.disabled = true;
+                var url = cardsUrl + "?list=" + encodeURIComponent(button.getAttribute("data-list")) + "&offset=" + button.getAttribute("data-offset");
+                fetch(url, { credentials: "same-origin" })
+                    .then(function (response) { return response.json(); })
+                    .then(function (page) {
+                        var container = button.parentNode.querySelector(".list-cards");
+                        page.cards.forEach(function (card) { container.appendChild(renderCard(card)); });
+                        if (page.next_offset === null) {
+                            button.remove();
+                        } else {
+                            button.setAttribute("data-offset", page.next_offset);
+                            button.textContent = "Load " + (page.total - page.next_offset) + " more cards";
+                            button.disabled = false;
+                        }
+                    })
+                    .catch(function () {
+                        button.textContent = "Could not load cards, try again";
+                        button.disabled = false;
+                    });
+            }
+
+            // Load the next page as soon as a list is scrolled to its end
+            var observer = "IntersectionObserver" in window ? new IntersectionObserver(function (entries) {
+                entries.forEach(function (entry) {
+                    if (entry.isIntersecting) { loadMore(entry.target); }
+                });
+            }) : null;
+            document.querySelectorAll(".load-more").forEach(function (button) {
+                if (observer) { observer.observe(button); }
+            });
+
+            document.addEventListener("click", function (event) {
+                var target = event.target;
+                if (target.classList.contains("load-more")) {
+                    loadMore(target);
+                } else if (target.classList.contains("card-more")) {
+                    event.preventDefault();
+                    fetch(cardsUrl + "/" + encodeURIComponent(target.getAttribute("data-card")), { credentials: "same-origin" })
+                        .then(function (response) { return response.json(); })
+                        .then(function (card) { target.parentNode.textContent = card.desc; });
+                }
+            });
+        })();
+    </script>
 </body>
 </html>
 """
+
+# Page templates by name, compiled once by install_templates
+TEMPLATES = {
+    "index.html": INDEX_TEMPLATE,
+    "dashboard.html": DASHBOARD_TEMPLATE,
+    "board.html": BOARD_TEMPLATE
+}
+
+def _asset_versions():
+    """Short content hash of every static file, used to bust caches when a file changes"""
+    versions = {}
+    for root, _, files in os.walk(STATIC_DIR):
+        for filename in files:
+            path = os.path.join(root, filename)
+            with open(path, "rb") as f:
+                versions[os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")] = hashlib.sha256(f.read()).hexdigest()[:12]
+    return versions
+
+def _template_version():
+    """Changes whenever a page template or static file changes, for use in page ETags"""
+    digest = hashlib.sha256()
+    for name in sorted(TEMPLATES):
+        digest.update(TEMPLATES[name].encode("utf-8"))
+    for name, version in sorted(_asset_versions().items()):
+        digest.update(f"{name}={version}".encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+TEMPLATE_VERSION = _template_version()
+
+def install_templates(app):
+    """
+    Serve the page templates from app.jinja_env and compile them all up front, so
+    render_template("board.html") never parses template source during a request.
+    """
+    app.jinja_env.loader = ChoiceLoader([DictLoader(TEMPLATES), app.jinja_env.loader])
+    # Drop the indentation and blank lines block tags leave behind in large card loops
+    app.jinja_env.trim_blocks = True
+    app.jinja_env.lstrip_blocks = True
+    app.config["SEND_FILE_MAX_AGE_DEFAULT"] = STATIC_MAX_AGE
+
+    versions = _asset_versions()
+
+    def asset_url(filename):
+        return url_for("static", filename=filename, v=versions.get(filename))
+
+    app.jinja_env.globals["asset_url"] = asset_url
+    for name in TEMPLATES:
+        app.jinja_env.get_template(name)
+
+def stream_page(name, **context):
+    """Render a page template as a streamed response, so the top of the page is sent while the rest renders"""
+    current_app.update_template_context(context)
+    stream = current_app.jinja_env.get_template(name).stream(context)
+    stream.enable_buffering(STREAM_BUFFER_ITEMS)
+    return Response(stream_with_context(traced_iter(f"render {name}", stream)), mimetype="text/html")
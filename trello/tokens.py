@@ -0,0 +1,66 @@
+"""
+Expiring store for OAuth request tokens, kept in SQLite so every worker process can finish a login
+"""
+import os
+import time
+
+from trello.cache import LRUCache, SQLiteCache, Sweeper, _MISSING
+
+# "sqlite" is shared by all workers on a host, "memory" only works with a single worker
+TOKEN_STORE_BACKEND = os.environ.get("TOKEN_STORE_BACKEND", "sqlite")
+TOKEN_STORE_PATH = os.environ.get("TOKEN_STORE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "tokens.db"))
+# Trello request tokens are only good for a few minutes, so unfinished logins expire after this long
+REQUEST_TOKEN_TTL = int(os.environ.get("REQUEST_TOKEN_TTL", "900"))
+TOKEN_SWEEP_INTERVAL = int(os.environ.get("TOKEN_SWEEP_INTERVAL", "300"))
+
+class MemoryTokenStore(LRUCache):
+    """In-process token store; pending logins are lost on restart and not visible to other workers"""
+
+    def consume(self, key):
+        """Remove and return a token's data, so each token can be used only once"""
+        with self._lock:
+            value, expires_at = self._data.pop(key, (_MISSING, None))
+        if value is _MISSING or (expires_at is not None and expires_at <= time.time()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+class SQLiteTokenStore(SQLiteCache):
+    """Token store in a WAL-mode SQLite file, indexed by token and by expiry"""
+
+    def __init__(self, path, ttl=None, table="tokens"):
+        super().__init__(path, ttl=ttl, table=table)
+        self._connect().execute(f"CREATE INDEX IF NOT EXISTS {table}_expires_at ON {table} (expires_at)")
+
+    def consume(self, key):
+        """Remove and return a token's data, so each token can be used only once"""
+        value = self.get(key)
+        if value is None:
+            return None
+        # Only the worker whose DELETE removes the row gets to use the token
+        cursor = self._connect().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        return value if cursor.rowcount == 1 else None
+
+def make_token_store():
+    """Create the token store for the configured backend"""
+    if TOKEN_STORE_BACKEND == "memory":
+        return MemoryTokenStore(maxsize=100000, ttl=REQUEST_TOKEN_TTL)
+    return SQLiteTokenStore(TOKEN_STORE_PATH, ttl=REQUEST_TOKEN_TTL)
+
+token_store = make_token_store()
+_sweeper = Sweeper(token_store, TOKEN_SWEEP_INTERVAL, name="token-sweeper")
+
+def save_token(oauth_token, token_data, ttl=None):
+    """Store token data under oauth_token until it expires"""
+    _sweeper.ensure_running()
+    token_store.set(oauth_token, token_data, ttl)
+
+def get_token(oauth_token):
+    """Return token data for oauth_token, or None if it is unknown or expired"""
+    return token_store.get(oauth_token)
+
+def consume_token(oauth_token):
+    """Return token data for oauth_token and delete it, or None if it is unknown, expired or already used"""
+    _sweeper.ensure_running()
+    return token_store.consume(oauth_token)
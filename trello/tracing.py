@@ -0,0 +1,287 @@
+"""
+Lightweight request tracing: spans around each stage of a request and each upstream call,
+latency histograms, and their export in Prometheus text format for /metrics
+"""
+import asyncio
+import bisect
+import contextvars
+import functools
+import hmac
+import os
+import re
+import threading
+import time
+
+from flask import request
+
+# Set to 0 to turn spans and metrics off; traced functions are then left unwrapped
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "1") == "1"
+# Requests slower than this many milliseconds have their spans printed (0 disables)
+TRACE_SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", "1000"))
+# Send per-stage timings to the browser in a Server-Timing header
+TRACE_SERVER_TIMING = os.environ.get("TRACE_SERVER_TIMING", "1") == "1"
+# Bearer token a scraper must send for /metrics; the endpoint answers 404 while this is unset
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Histogram:
+    """Histogram with fixed buckets and labels"""
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Counts per bucket (the last is +Inf), then the sum of observed values
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((label_values, list(counts)) for label_values, counts in self._series.items())
+        for label_values, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {counts[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+request_seconds = Histogram("http_request_duration_seconds", "Time to handle a request, including streaming the body", ("endpoint", "method", "status"))
+request_upstream_calls = Histogram("http_request_upstream_calls", "Upstream API calls made while handling a request", ("endpoint",), buckets=COUNT_BUCKETS)
+stage_seconds = Histogram("stage_duration_seconds", "Time spent in each traced stage", ("stage",))
+upstream_seconds = Histogram("upstream_request_duration_seconds", "Upstream API call latency, including rate limit waits and retries", ("service", "method", "route"))
+upstream_requests = Counter("upstream_requests_total", "Upstream API calls by response status", ("service", "method", "route", "status"))
+METRICS = [request_seconds, request_upstream_calls, stage_seconds, upstream_seconds, upstream_requests]
+
+class Trace:
+    """The spans recorded while handling one request"""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []
+        self.upstream_calls = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+def current_trace():
+    return _current_trace.get()
+
+def _record(name, start, trace):
+    duration = time.perf_counter() - start
+    stage_seconds.observe(duration, name)
+    if trace is not None:
+        trace.spans.append((name, start - trace.start, duration))
+
+class _Span:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _record(self.name, self.start, _current_trace.get())
+
+class _NoopSpan:
+    status = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+def span(name):
+    """Context manager timing a stage of the current request"""
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return _Span(name)
+
+def traced(name=None):
+    """Decorator running a function (sync or async) in a span named after it"""
+    def decorate(fn):
+        if not TRACING_ENABLED:
+            return fn
+        stage = name or fn.__name__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    _record(stage, start, _current_trace.get())
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(stage, start, _current_trace.get())
+        return wrapper
+    return decorate
+
+def traced_iter(name, iterable):
+    """
+    Yield from iterable, timing the whole iteration as one span of the request it was
+    created in, e.g. a streamed template rendering after the view has returned
+    """
+    if not TRACING_ENABLED:
+        return iterable
+    return _traced_iter(name, iterable, _current_trace.get())
+
+def _traced_iter(name, iterable, trace):
+    start = time.perf_counter()
+    try:
+        yield from iterable
+    finally:
+        _record(name, start, trace)
+
+# Path segments kept in upstream route labels; any other segment is an id or a token and
+# becomes {id}, so routes stay a small set of label values and never carry credentials
+_ROUTE_SEGMENTS = frozenset((
+    "boards", "cards", "lists", "members", "webhooks", "actions", "tokens", "batch", "me",
+    "generateContent", "streamGenerateContent"
+))
+
+@functools.lru_cache(maxsize=4096)
+def upstream_route(path):
+    """A path with everything but known segments replaced, e.g. /boards/{id}/actions"""
+    return "/".join(
+        segment if not segment or segment in _ROUTE_SEGMENTS else "{id}"
+        for segment in path.split("?")[0].split("/")
+    )
+
+class _UpstreamSpan(_Span):
+    def __init__(self, service, method, path):
+        super().__init__(service)
+        self.method = method.upper()
+        self.route = upstream_route(path)
+        self.status = None
+
+    def __exit__(self, exc_type, *exc_info):
+        duration = time.perf_counter() - self.start
+        status = str(self.status) if self.status is not None else (exc_type.__name__ if exc_type else "unknown")
+        upstream_seconds.observe(duration, self.name, self.method, self.route)
+        upstream_requests.inc(self.name, self.method, self.route, status)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.upstream_calls += 1
+            trace.spans.append((f"{self.name} {self.method} {self.route}", self.start - trace.start, duration))
+
+def upstream_span(service, method, path):
+    """Context manager timing one upstream API call; set .status to the response status inside it"""
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return _UpstreamSpan(service, method, path)
+
+@functools.lru_cache(maxsize=1024)
+def _timing_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "-", name).strip("-")
+
+def _server_timing(trace):
+    """Server-Timing header value with each stage's total time"""
+    totals = {}
+    for name, _, duration in trace.spans:
+        totals[name] = totals.get(name, 0.0) + duration
+    entries = [f'{_timing_name(name)};dur={duration * 1000:.1f};desc="{name}"' for name, duration in totals.items()]
+    entries.append(f"total;dur={trace.elapsed() * 1000:.1f}")
+    return ", ".join(entries)
+
+def _finish(trace, endpoint, method, status):
+    duration = trace.elapsed()
+    request_seconds.observe(duration, endpoint, method, status)
+    request_upstream_calls.observe(trace.upstream_calls, endpoint)
+    if TRACE_SLOW_MS and duration * 1000 >= TRACE_SLOW_MS:
+        print(f"Slow request {trace.name}: {duration * 1000:.0f} ms, {trace.upstream_calls} upstream calls")
+        for name, offset, span_duration in sorted(trace.spans, key=lambda span: span[1]):
+            print(f"  +{offset * 1000:7.1f} ms {span_duration * 1000:8.1f} ms  {name}")
+
+def install_tracing(app):
+    """Trace every request to app: its latency, upstream calls and a Server-Timing header"""
+    if not TRACING_ENABLED:
+        return
+
+    @app.before_request
+    def start_trace():
+        _current_trace.set(Trace(f"{request.method} {request.path}"))
+
+    @app.after_request
+    def end_trace(response):
+        trace = _current_trace.get()
+        if trace is None:
+            return response
+        if TRACE_SERVER_TIMING:
+            response.headers["Server-Timing"] = _server_timing(trace)
+        endpoint, method, status = request.endpoint or "unmatched", request.method, str(response.status_code)
+        # Streamed bodies render after this point, so the request is finished once the body is closed
+        response.call_on_close(lambda: _finish(trace, endpoint, method, status))
+        return response
+
+def metrics_authorized(authorization):
+    """Whether an Authorization header carries METRICS_TOKEN as a bearer token"""
+    if not METRICS_TOKEN or not authorization or not authorization.startswith("Bearer "):
+        return False
+    return hmac.compare_digest(authorization[len("Bearer "):].encode("utf-8"), METRICS_TOKEN.encode("utf-8"))
+
+def render_metrics():
+    """Every metric in Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,164 @@
+"""
+Trello webhook ingestion: verify deliveries, apply them to board snapshots and keep reports warm
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import requests
+
+from trello.api import TRELLO_SECRET, create_webhook, get_token_webhooks
+from trello.cache import LRUCache
+from trello.snapshots import SYNC_ACTIONS, SNAPSHOTS_SHARED, snapshot_store, current_snapshot, save_snapshot, board_lock, apply_actions, is_clean
+from trello.precompute import is_popular
+from trello import agent
+
+# Public URL of the /webhooks/trello route; webhooks are only registered when this is set
+WEBHOOK_CALLBACK_URL = os.environ.get("WEBHOOK_CALLBACK_URL")
+# Seconds to wait after the last change to a board before regenerating its report
+WEBHOOK_REPORT_DELAY = float(os.environ.get("WEBHOOK_REPORT_DELAY", "30"))
+WEBHOOK_PRECOMPUTE_REPORTS = os.environ.get("WEBHOOK_PRECOMPUTE_REPORTS", "1") == "1"
+# Seconds to wait before trying again to register a board's webhook after Trello refused it
+WEBHOOK_RETRY_AFTER = float(os.environ.get("WEBHOOK_RETRY_AFTER", "600"))
+
+_SYNC_ACTION_TYPES = set(SYNC_ACTIONS.split(","))
+
+if WEBHOOK_CALLBACK_URL and not SNAPSHOTS_SHARED:
+    print("WEBHOOK_CALLBACK_URL is set without SNAPSHOT_STORE_PATH; boards are kept current by the actions sync, not webhooks")
+
+# When registering each board's webhook last failed; boards in here aren't tried again until their entry expires
+_webhook_failures = LRUCache(maxsize=4096, ttl=WEBHOOK_RETRY_AFTER)
+
+def sign_payload(body, callback_url, secret=None):
+    """Trello's X-Trello-Webhook signature: base64 HMAC-SHA1 of the raw body followed by the callback URL"""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    digest = hmac.new((secret or TRELLO_SECRET).encode("utf-8"), body + callback_url.encode("utf-8"), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+def verify_signature(body, callback_url, signature):
+    """Check a delivery's X-Trello-Webhook header against the body and callback URL"""
+    if not signature:
+        return False
+    return hmac.compare_digest(sign_payload(body, callback_url), signature)
+
+def ensure_board_webhook(trello, board_id):
+    """Register a webhook for a board with a synced snapshot, once, when the workers share a snapshot store"""
+    if not WEBHOOK_CALLBACK_URL or not SNAPSHOTS_SHARED:
+        return None
+    snapshot = current_snapshot(board_id)
+    if snapshot is None:
+        return None
+    if snapshot.get("webhook_id"):
+        return snapshot["webhook_id"]
+
+    if _webhook_failures.get(board_id) is not None:
+        return None
+
+    try:
+        webhook_id = create_webhook(trello, board_id, WEBHOOK_CALLBACK_URL, description=f"Board snapshot {board_id}")["id"]
+    except Exception as e:
+        # Trello answers 400 when this token already has the same webhook
+        webhook_id = _existing_webhook_id(trello, board_id) if getattr(getattr(e, "response", None), "status_code", None) == 400 else None
+        if webhook_id is None:
+            print(f"Could not register webhook for board {board_id}: {str(e)}")
+            _webhook_failures.set(board_id, time.time())
+            return None
+
+    with board_lock(board_id):
+        snapshot = current_snapshot(board_id)
+        if snapshot is not None:
+            snapshot_store.set(board_id, dict(snapshot, webhook_id=webhook_id))
+    print(f"Registered webhook {webhook_id} for board {board_id}")
+    return webhook_id
+
+def _existing_webhook_id(trello, board_id):
+    """The id of the token's webhook for this board and callback URL, or None if it can't be found"""
+    try:
+        webhooks = get_token_webhooks(trello)
+    except Exception as e:
+        print(f"Could not list webhooks for board {board_id}: {str(e)}")
+        return None
+    for webhook in webhooks:
+        if webhook.get("idModel") == board_id and webhook.get("callbackURL") == WEBHOOK_CALLBACK_URL:
+            return webhook.get("id")
+    return None
+
+# Board id -> its pending report timer; a timer removes itself when it fires
+_report_timers = {}
+_report_timers_lock = threading.Lock()
+
+def _schedule_report(board_id):
+    """Regenerate a board's report once its changes settle, so a burst of edits costs one report"""
+    with _report_timers_lock:
+        timer = _report_timers.pop(board_id, None)
+        if timer is not None:
+            timer.cancel()
+        timer = threading.Timer(WEBHOOK_REPORT_DELAY, _precompute_report, args=(board_id,))
+        timer.daemon = True
+        _report_timers[board_id] = timer
+        timer.start()
+
+def _precompute_report(board_id):
+    with _report_timers_lock:
+        # Unless a later change already scheduled the next one
+        if _report_timers.get(board_id) is threading.current_thread():
+            del _report_timers[board_id]
+    snapshot = current_snapshot(board_id)
+    # Cards the webhook couldn't describe are fetched on the next page load, which reports then
+    if snapshot is None or not is_clean(snapshot):
+        return
+    agent.start_board_report((snapshot["board"], snapshot["lists"]))
+
+def handle_webhook(payload):
+    """
+    Apply one webhook delivery to the board's snapshot. Returns a short status string:
+    "applied", "ignored" (not a board change we track) or "no-snapshot" (board not cached here).
+    """
+    action = payload.get("action") or {}
+    board_id = (payload.get("model") or {}).get("id") or ((action.get("data") or {}).get("board") or {}).get("id")
+    if not board_id or action.get("type") not in _SYNC_ACTION_TYPES:
+        return "ignored"
+
+    with board_lock(board_id):
+        snapshot = current_snapshot(board_id)
+        if snapshot is None:
+            return "no-snapshot"
+        # The watermark stays put so the next actions sync fills in any delivery we missed
+        snapshot = apply_actions(snapshot, [action], advance=False)
+        if is_clean(snapshot):
+            snapshot["synced_at"] = time.time()
+        save_snapshot(board_id, snapshot)
+
+    # Reports are cached by content, so the new content's report is made when it's first asked for,
+    # or ahead of time for boards viewed often enough that it soon will be
+    if WEBHOOK_PRECOMPUTE_REPORTS and agent.report_backend_problem() is None and is_popular(board_id):
+        _schedule_report(board_id)
+    return "applied"
+
+def replay(paths, url, callback_url=None):
+    """POST recorded deliveries (one JSON payload per line) to a running app, signed like Trello would"""
+    callback_url = callback_url or url
+    for path in paths:
+        with open(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                body = json.dumps(json.loads(line)).encode("utf-8")
+                response = requests.post(url, data=body, headers={
+                    "Content-Type": "application/json",
+                    "X-Trello-Webhook": sign_payload(body, callback_url)
+                })
+                print(f"{response.status_code} {response.text.strip()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded Trello webhook payloads against a local app")
+    parser.add_argument("payloads", nargs="+", help="files with one webhook payload per line")
+    parser.add_argument("--url", default="http://localhost:5001/webhooks/trello")
+    parser.add_argument("--callback-url", help="URL the signature is computed for, if not --url")
+    args = parser.parse_args()
+    replay(args.payloads, args.url, args.callback_url)
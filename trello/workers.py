@@ -0,0 +1,62 @@
+"""
+Bounded worker pool for fanning out Trello API calls
+"""
+import os
+import threading
+import contextvars
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+# Size of the pool shared by every request in the worker process
+FETCH_WORKERS = int(os.environ.get("TRELLO_FETCH_WORKERS", "16"))
+# Most calls a single Trello user may have in flight at once
+PER_USER_CONCURRENCY = int(os.environ.get("TRELLO_PER_USER_CONCURRENCY", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="trello-fetch")
+# A user's semaphore lasts while calls hold it; one nobody holds is back at full value, so it can go
+_user_slots = weakref.WeakValueDictionary()
+_user_slots_lock = threading.Lock()
+
+def _user_semaphore(user_key):
+    """Return the semaphore limiting concurrent calls for one user"""
+    with _user_slots_lock:
+        semaphore = _user_slots.get(user_key)
+        if semaphore is None:
+            semaphore = _user_slots[user_key] = threading.BoundedSemaphore(PER_USER_CONCURRENCY)
+        return semaphore
+
+def fetch_all(calls, user_key=None):
+    """
+    Run zero-argument callables on the shared pool and return their results in call order.
+    The first call to raise stops any calls not yet started and its exception is re-raised.
+    """
+    calls = list(calls)
+    if len(calls) <= 1:
+        return [call() for call in calls]
+
+    semaphore = _user_semaphore(user_key)
+    failed = threading.Event()
+
+    def _on_done(future):
+        semaphore.release()
+        if not future.cancelled() and future.exception() is not None:
+            failed.set()
+
+    futures = []
+    for call in calls:
+        semaphore.acquire()
+        if failed.is_set():
+            semaphore.release()
+            break
+        # Each call runs in a copy of the caller's context so per-request counters still apply
+        future = _executor.submit(contextvars.copy_context().run, call)
+        future.add_done_callback(_on_done)
+        futures.append(future)
+
+    done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+    for future in pending:
+        future.cancel()
+    for future in futures:
+        if future in done and future.exception() is not None:
+            raise future.exception()
+    return [future.result() for future in futures]